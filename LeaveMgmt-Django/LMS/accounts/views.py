@@ -134,19 +134,22 @@ def logout_view(request: HttpRequest) -> HttpResponse:
 
 
 def users_list(request: HttpRequest) -> HttpResponse:
-    # This view displays a list of all users.
-    employees = Employee.objects.all()
+    # This view displays a list of all users in name order, ?starts=jo filters by name
+    starts = request.GET.get("starts", "")
+    employees = Employee.objects.name_startswith(starts).select_related(
+        "user", "department"
+    )
     return render(
         request,
         "accounts/users_table.html",
-        {"employees": employees, "title": "Users List"},
+        {"employees": employees, "starts": starts, "title": "Users List"},
     )
 
 
 def users_unblock(request, id):
     # This view unblocks a user (makes them active)
     user = get_object_or_404(User, id=id)
-    emp = Employee.objects.filter(user=user).first()
+    emp = request.employees.get(user)
     emp.is_blocked = False
     emp.save()
     user.is_active = True
@@ -158,7 +161,7 @@ def users_unblock(request, id):
 def users_block(request, id):
     # This view blocks a user (makes them inactive).
     user = get_object_or_404(User, id=id)
-    emp = Employee.objects.filter(user=user).first()
+    emp = request.employees.get(user)
     emp.is_blocked = True
     emp.save()
 
@@ -170,7 +173,9 @@ def users_block(request, id):
 
 def users_blocked_list(request: HttpRequest) -> HttpResponse:
     # This view displays a list of all blocked users.
-    blocked_employees = Employee.objects.all_blocked_employees()
+    blocked_employees = Employee.objects.all_blocked_employees().order_by(
+        "sortname", "id"
+    )
     return render(
         request,
         "accounts/all_deleted_users.html",
@@ -0,0 +1,55 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from leave.models import Leave
+
+
+class Command(BaseCommand):
+    help = "Move leaves of closed years from the hot leave table to the archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            type=int,
+            default=None,
+            help="archive leaves that ended before 1st January of this year "
+            "(default: keep the current and previous year)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="leaves moved per transaction",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="only report what would be archived",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = Leave.objects.hot_cutoff()
+        if options["before"]:
+            cutoff = cutoff.replace(year=options["before"])
+        closed = Leave.objects.filter(startdate__lt=cutoff, enddate__lt=cutoff)
+
+        if options["dry_run"]:
+            years = Counter(closed.values_list("startdate__year", flat=True))
+            for year, count in sorted(years.items()):
+                self.stdout.write(f"{year}: {count} leaves")
+            self.stdout.write(
+                self.style.SUCCESS(f"{sum(years.values())} leaves would be archived.")
+            )
+            return
+
+        moved = 0
+        while True:
+            batch = Leave.objects.archive_batch(closed, options["batch_size"])
+            if not batch:
+                break
+            moved += batch
+            self.stdout.write(f"archived {moved} leaves")
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Archived {moved} leaves that ended before {cutoff}.")
+        )
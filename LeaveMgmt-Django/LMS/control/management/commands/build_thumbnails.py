@@ -0,0 +1,83 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import F
+from employee.models import Employee
+from employee.thumbnails import make_thumbnails
+
+
+def build(job):
+    """
+    worker -> (name, error), errors are returned so one bad upload doesn't stop the pool
+    """
+    name, force = job
+    try:
+        make_thumbnails(name, force=force)
+    except (OSError, ValueError) as error:
+        return name, str(error)
+    return name, None
+
+
+class Command(BaseCommand):
+    help = "Build the profile image thumbnails of every employee missing them"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processes",
+            type=int,
+            default=None,
+            help="worker processes resizing images, defaults to the number of CPUs",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=16,
+            help="images handed to a worker at a time",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="rebuild the thumbnails of every image, not only the missing ones",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        employees = (
+            Employee.objects.all_employees()
+            .exclude(image="")
+            .exclude(image__isnull=True)
+        )
+        if not options["force"]:
+            employees = employees.exclude(thumbnail_source=F("image"))
+        # many employees share an image (default.png) -> every file is resized once
+        names = list(employees.order_by().values_list("image", flat=True).distinct())
+        if not names:
+            self.stdout.write(self.style.SUCCESS("All thumbnails are up to date."))
+            return
+
+        # forked workers must not inherit the parent's open database connections
+        connections.close_all()
+        built = failed = 0
+        with multiprocessing.Pool(options["processes"]) as pool:
+            jobs = [(name, options["force"]) for name in names]
+            for name, error in pool.imap_unordered(
+                build, jobs, chunksize=options["chunk_size"]
+            ):
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                    continue
+                built += 1
+                Employee.objects.all_employees().filter(image=name).update(
+                    thumbnail_source=name
+                )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Built thumbnails for {built} images, {failed} failed "
+                f"in {elapsed:.2f}s."
+            )
+        )
@@ -0,0 +1,261 @@
+import csv
+import datetime
+import itertools
+import time
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from leave.manager import ACTIVE_STATUSES, TRANSITIONS
+from leave import summary
+from leave.models import LEAVE_TYPE, Leave, LeaveBalance, LeaveRollup
+
+COLUMNS = ("username", "leavetype", "startdate", "enddate")
+
+# leave types by key and by display name -> "sick" and "Sick Leave" both work
+LEAVE_TYPES = {key: key for key, name in LEAVE_TYPE}
+LEAVE_TYPES.update({name.lower(): key for key, name in LEAVE_TYPE})
+
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        return None
+
+
+def parse_created(value):
+    """
+    "2023-01-02" or "2023-01-02T09:30:00" -> aware datetime, naive ones are
+    taken in the current time zone, unreadable values -> None
+    """
+    try:
+        created = datetime.datetime.fromisoformat(value.strip())
+    except (AttributeError, ValueError):
+        return None
+    if timezone.is_naive(created):
+        created = timezone.make_aware(created)
+    return created
+
+
+class Command(BaseCommand):
+    help = (
+        "Import leaves from a CSV file with the columns "
+        "username,leavetype,startdate,enddate and optional status,reason,created"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_file", type=str, help="CSV file with a header row")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="rows validated and inserted per transaction",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="only validate the file, nothing is written",
+        )
+        parser.add_argument(
+            "--max-errors",
+            type=int,
+            default=20,
+            help="invalid rows printed before the rest are only counted",
+        )
+
+    def handle(self, *args, **options):
+        self.errors = 0
+        self.max_errors = options["max_errors"]
+        imported = skipped = 0
+        started = time.perf_counter()
+
+        with open(options["csv_file"], newline="") as f:
+            reader = csv.DictReader(f)
+            missing = set(COLUMNS) - set(reader.fieldnames or ())
+            if missing:
+                raise CommandError(
+                    "missing columns: {0}".format(", ".join(sorted(missing)))
+                )
+
+            # data rows start on line 2, after the header
+            rows = enumerate(reader, start=2)
+            while True:
+                batch = list(itertools.islice(rows, options["batch_size"]))
+                if not batch:
+                    break
+                leaves = self.without_overlaps(self.validate(batch))
+                if not options["dry_run"]:
+                    leaves = self.insert(leaves)
+                skipped += len(batch) - len(leaves)
+                imported += len(leaves)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{imported} rows {'valid' if options['dry_run'] else 'imported'}, "
+                    f"{imported / elapsed:.0f} rows/sec"
+                )
+
+        elapsed = time.perf_counter() - started
+        verb = "would be imported" if options["dry_run"] else "imported"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{imported} leaves {verb}, {skipped} rows skipped "
+                f"in {elapsed:.2f}s ({imported / elapsed:.0f} rows/sec)."
+            )
+        )
+
+    def error(self, line, message):
+        self.errors += 1
+        if self.errors <= self.max_errors:
+            self.stderr.write(f"line {line}: {message}")
+
+    def validate(self, batch):
+        """
+        (line, row) pairs -> unsaved Leave objects for the valid rows
+        usernames of the whole batch are resolved with one query
+        """
+        users = dict(
+            User.objects.filter(
+                username__in={
+                    (row.get("username") or "").strip() for line, row in batch
+                }
+            ).values_list("username", "id")
+        )
+
+        leaves = []
+        for line, row in batch:
+            username = (row.get("username") or "").strip()
+            leavetype = LEAVE_TYPES.get((row.get("leavetype") or "").strip().lower())
+            startdate = parse_date(row.get("startdate"))
+            enddate = parse_date(row.get("enddate"))
+            status = (row.get("status") or "pending").strip().lower()
+            created = (row.get("created") or "").strip()
+
+            if username not in users:
+                self.error(line, f"unknown user {username!r}")
+            elif leavetype is None:
+                self.error(line, f"unknown leave type {row.get('leavetype')!r}")
+            elif startdate is None or enddate is None:
+                self.error(line, "dates must be YYYY-MM-DD")
+            elif enddate < startdate:
+                self.error(line, "end date is before start date")
+            elif status not in TRANSITIONS:
+                self.error(line, f"unknown status {status!r}")
+            elif created and parse_created(created) is None:
+                self.error(line, "created must be YYYY-MM-DD or an ISO date and time")
+            else:
+                leave = Leave(
+                    user_id=users[username],
+                    leavetype=leavetype,
+                    startdate=startdate,
+                    enddate=enddate,
+                    status=status,
+                    is_approved=status == "approved",
+                    reason=(row.get("reason") or "").strip()[:255] or None,
+                )
+                leave.line = line
+                # keeps the source's place in the created, id keyset order
+                leave.source_created = parse_created(created) if created else None
+                leaves.append(leave)
+        return leaves
+
+    def without_overlaps(self, leaves):
+        """
+        drops pending and approved rows sharing a day with an active leave of
+        the same user, booked already or earlier in the batch
+        the booked ones come from one query for the whole batch, sqlite has no
+        exclusion constraint to catch them
+        """
+        active = [
+            leave
+            for leave in leaves
+            if leave.status in ACTIVE_STATUSES and leave.startdate < leave.enddate
+        ]
+        if not active:
+            return leaves
+        booked = defaultdict(list)
+        for user_id, startdate, enddate in (
+            Leave.objects.filter(
+                user_id__in={leave.user_id for leave in active},
+                status__in=ACTIVE_STATUSES,
+                startdate__lt=max(leave.enddate for leave in active),
+                enddate__gt=min(leave.startdate for leave in active),
+            )
+            .order_by()
+            .values_list("user_id", "startdate", "enddate")
+        ):
+            booked[user_id].append((startdate, enddate))
+
+        # unsaved leaves are unhashable -> by object identity
+        checked = {id(leave) for leave in active}
+        kept = []
+        for leave in leaves:
+            if id(leave) in checked:
+                ranges = booked[leave.user_id]
+                if any(
+                    leave.startdate < end and leave.enddate > start
+                    for start, end in ranges
+                ):
+                    self.error(leave.line, "overlaps another leave of the user")
+                    continue
+                ranges.append((leave.startdate, leave.enddate))
+            kept.append(leave)
+        return kept
+
+    def insert(self, leaves):
+        """
+        bulk_create one batch with its balance and rollup bookings in one transaction
+        when the database refuses the batch (eg. the postgres overlap constraint) the
+        rows are retried one by one so only the offending ones are skipped
+        """
+        try:
+            with transaction.atomic():
+                Leave.objects.bulk_create(leaves)
+                self.keep_created(leaves)
+                self.book(leaves)
+            return leaves
+        except IntegrityError:
+            pass
+
+        inserted = []
+        with transaction.atomic():
+            for leave in leaves:
+                try:
+                    with transaction.atomic():
+                        Leave.objects.bulk_create([leave])
+                except IntegrityError as error:
+                    self.error(leave.line, f"rejected by the database: {error}")
+                else:
+                    inserted.append(leave)
+            self.keep_created(inserted)
+            self.book(inserted)
+        return inserted
+
+    def keep_created(self, leaves):
+        # created is auto_now_add, bulk_create overwrites it -> written back after
+        dated = [leave for leave in leaves if leave.source_created]
+        for leave in dated:
+            leave.created = leave.source_created
+        if dated:
+            Leave.objects.bulk_update(dated, ["created"])
+
+    def book(self, leaves):
+        # bulk_create skips Leave.save -> book the approved days and the rollups here
+        rows = [
+            (
+                leave.status,
+                leave.user_id,
+                leave.leavetype,
+                leave.startdate,
+                leave.enddate,
+            )
+            for leave in leaves
+        ]
+        LeaveBalance.objects.record_transitions(
+            [("pending",) + row[1:] for row in rows if row[0] == "approved"],
+            "approved",
+        )
+        LeaveRollup.objects.record(rows)
+        summary.invalidate()
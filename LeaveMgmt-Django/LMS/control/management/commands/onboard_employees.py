@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from employee.onboarding import Onboarding, OnboardingError, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users and employees from a CSV file or a JSON list with the columns "
+        "username,firstname,lastname,birthday and optional email,othername,"
+        "department,role,startdate,employeetype,employeeid,dateissued"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "file", type=str, help="CSV file with a header row or .json"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="rows validated and inserted per transaction",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="only validate the file, nothing is written",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        onboarding = Onboarding(
+            batch_size=options["batch_size"], dry_run=options["dry_run"]
+        )
+        with open(options["file"], newline="") as f:
+            try:
+                onboarding.run(read_rows(f, options["file"]))
+            except OnboardingError as error:
+                raise CommandError(str(error))
+
+        for line, message in onboarding.errors:
+            self.stderr.write(f"line {line}: {message}")
+        elapsed = time.perf_counter() - started
+        verb = "would be created" if options["dry_run"] else "created"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{onboarding.created} employees {verb}, "
+                f"{len(onboarding.errors)} rows skipped in {elapsed:.2f}s."
+            )
+        )
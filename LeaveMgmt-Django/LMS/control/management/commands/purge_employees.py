@@ -0,0 +1,137 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from employee.models import Employee, EmployeeArchive
+from leave.models import Leave
+
+
+class Command(BaseCommand):
+    help = (
+        "Move employees deleted long ago, and the leaves of their users, to the "
+        "archive tables in small committed batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="purge employees deleted more than this many days ago",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="employees moved per transaction",
+        )
+        parser.add_argument(
+            "--leave-batch-size",
+            type=int,
+            default=1000,
+            help="leaves moved per transaction",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="only report what would be purged",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - datetime.timedelta(days=options["days"])
+        # served by the employee_deleted_idx partial index
+        purgeable = Employee.objects.all_employees().filter(
+            is_deleted=True, deleted__lt=cutoff
+        )
+
+        if options["dry_run"]:
+            employees = purgeable.count()
+            leaves = Leave.objects.filter(
+                user_id__in=self.leave_owners(purgeable.values_list("id", "user_id"))
+            ).count()
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{employees} employees and {leaves} leaves would be archived."
+                )
+            )
+            return
+
+        employees = leaves = 0
+        while True:
+            batch = list(
+                purgeable.order_by("deleted", "id").values_list("id", "user_id")[
+                    : options["batch_size"]
+                ]
+            )
+            if not batch:
+                break
+            # leaves go first, each chunk in its own transaction -> an employee with
+            # years of leaves never holds the lock for long
+            owned = Leave.objects.filter(user_id__in=self.leave_owners(batch))
+            while True:
+                moved = Leave.objects.archive_batch(owned, options["leave_batch_size"])
+                if not moved:
+                    break
+                leaves += moved
+            employees += self.archive([pk for pk, user_id in batch])
+            self.stdout.write(f"archived {employees} employees, {leaves} leaves")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {employees} employees and {leaves} leaves "
+                f"deleted before {cutoff:%Y-%m-%d}."
+            )
+        )
+
+    def leave_owners(self, employees):
+        """
+        (id, user_id) pairs of purged employees -> users whose leaves go with them
+        a user with another employee record keeps their leaves
+        """
+        employees = list(employees)
+        users = {user_id for pk, user_id in employees}
+        kept = (
+            Employee.objects.all_employees()
+            .filter(user_id__in=users)
+            .exclude(id__in=[pk for pk, user_id in employees])
+            .values_list("user_id", flat=True)
+        )
+        return users - set(kept)
+
+    def archive(self, ids):
+        with transaction.atomic():
+            # is_deleted again -> an employee restored meanwhile stays
+            employees = list(
+                Employee.objects.all_employees()
+                .filter(id__in=ids, is_deleted=True)
+                .select_related("department", "role")
+                .select_for_update(of=("self",))
+            )
+            EmployeeArchive.objects.bulk_create(
+                [
+                    EmployeeArchive(
+                        id=employee.id,
+                        user_id=employee.user_id,
+                        firstname=employee.firstname,
+                        lastname=employee.lastname,
+                        othername=employee.othername,
+                        fullname=employee.get_full_name,
+                        employeeid=employee.employeeid,
+                        employeetype=employee.employeetype,
+                        department=employee.department and employee.department.name,
+                        role=employee.role and employee.role.name,
+                        image=employee.image.name if employee.image else None,
+                        birthday=employee.birthday,
+                        startdate=employee.startdate,
+                        dateissued=employee.dateissued,
+                        created=employee.created,
+                        deleted=employee.deleted,
+                    )
+                    for employee in employees
+                ]
+            )
+            Employee.objects.all_employees().filter(
+                id__in=[employee.id for employee in employees]
+            ).delete()
+        return len(employees)
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+from leave.models import LeaveRollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the monthly leave rollups from the leave table and the archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="grouped rows read per round trip",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rows = LeaveRollup.objects.rebuild(chunk_size=options["chunk_size"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {rows} rollup rows in {elapsed:.2f}s.")
+        )
@@ -0,0 +1,65 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from leave import summary
+from leave.models import Leave, LeaveBalance
+from leave.utility import bulk_working_days
+
+
+class Command(BaseCommand):
+    help = "Rebuild the leave balance ledger from approved and archived approved leaves"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="rows per bulk insert",
+        )
+
+    def handle(self, *args, **options):
+        # archived years are rebuilt too -> the reset below clears every year
+        rows = [
+            (row["user"], row["leavetype"], row["startdate"], row["enddate"])
+            for row in Leave.objects.history(
+                "user",
+                "leavetype",
+                "startdate",
+                "enddate",
+                status="approved",
+                startdate__isnull=False,
+            )
+        ]
+
+        used = defaultdict(int)
+        if rows:
+            user_ids, leavetypes, startdates, enddates = zip(*rows)
+            days = bulk_working_days(startdates, enddates).tolist()
+            for user_id, leavetype, startdate, count in zip(
+                user_ids, leavetypes, startdates, days
+            ):
+                used[(user_id, startdate.year, leavetype)] += count
+
+        balances = [
+            LeaveBalance(user_id=user_id, year=year, leavetype=leavetype, used=count)
+            for (user_id, year, leavetype), count in used.items()
+        ]
+
+        # entitled and carried days come from rollover_leave -> only used is rebuilt
+        with transaction.atomic():
+            LeaveBalance.objects.update(used=0)
+            LeaveBalance.objects.bulk_create(
+                balances,
+                batch_size=options["batch_size"],
+                update_conflicts=True,
+                unique_fields=["user", "year", "leavetype"],
+                update_fields=["used"],
+            )
+            summary.invalidate()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt {len(balances)} balances from {len(rows)} approved leaves."
+            )
+        )
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from leave.models import Leave
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancel active leaves that overlap another leave of the same user or end "
+        "before they start, run before the leave_no_overlap migration"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="leaves cancelled per transaction",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="only list the leaves that would be cancelled",
+        )
+
+    def handle(self, *args, **options):
+        ids = Leave.objects.conflicting()
+        if options["dry_run"]:
+            for pk in ids:
+                self.stdout.write(f"leave {pk}")
+            self.stdout.write(
+                self.style.SUCCESS(f"{len(ids)} leaves would be cancelled.")
+            )
+            return
+
+        # bulk_transition books the ledger, rollups and notifications
+        cancelled = 0
+        for start in range(0, len(ids), options["batch_size"]):
+            results = Leave.objects.bulk_transition(
+                ids[start : start + options["batch_size"]], "cancelled"
+            )
+            for pk, result in results.items():
+                if result == "updated":
+                    cancelled += 1
+                    self.stdout.write(f"cancelled leave {pk}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Cancelled {cancelled} overlapping leaves.")
+        )
@@ -0,0 +1,38 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from leave.entitlement import rollover
+
+
+class Command(BaseCommand):
+    help = "Close a leave year -> new entitlements and carried days for the next year"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--year",
+            type=int,
+            default=None,
+            help="year to close (default: last year)",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="only report how many ledger rows would be written",
+        )
+
+    def handle(self, *args, **options):
+        year = options["year"] or datetime.date.today().year - 1
+        started = time.perf_counter()
+        with transaction.atomic():
+            rows = rollover(year, options["dry_run"])
+        elapsed = time.perf_counter() - started
+
+        verb = "would be written" if options["dry_run"] else "written"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Closed {year}: {rows} balances for {year + 1} {verb} "
+                f"in {elapsed:.2f}s."
+            )
+        )
@@ -0,0 +1,177 @@
+import datetime
+import smtplib
+import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from leave.models import LeaveNotification
+
+# the SMTP server is gone -> reconnect, or back off the rest of the batch
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)
+
+
+def retry_delay(attempts: int, backoff: int) -> datetime.timedelta:
+    """
+    exponential backoff -> backoff, 2 * backoff, 4 * backoff ... capped at a day
+    """
+    return datetime.timedelta(seconds=min(backoff * 2 ** (attempts - 1), 86400))
+
+
+class Command(BaseCommand):
+    help = "Deliver queued leave notifications over one reused SMTP connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="notifications claimed per batch",
+        )
+        parser.add_argument(
+            "--claim-timeout",
+            type=int,
+            default=600,
+            help="seconds a claimed batch stays with its worker before it is due again",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="attempts before a notification is marked failed",
+        )
+        parser.add_argument(
+            "--backoff",
+            type=int,
+            default=60,
+            help="seconds before the first retry, doubled on every further attempt",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="keep polling the outbox instead of exiting once it is drained",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5.0,
+            help="seconds between polls with --loop",
+        )
+
+    def handle(self, *args, **options):
+        connection = get_connection(fail_silently=False)
+        sent = failed = 0
+        try:
+            while True:
+                batch_sent, batch_failed, more = self.send_batch(connection, options)
+                sent += batch_sent
+                failed += batch_failed
+                if more:
+                    continue
+                if not options["loop"]:
+                    break
+                time.sleep(options["sleep"])
+        finally:
+            connection.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Sent {sent} notifications, {failed} to retry.")
+        )
+
+    def send_batch(self, connection, options):
+        """
+        claims one batch of due notifications, sends it and records the result,
+        returns (sent, failed, more) -> more is False once nothing is due or the
+        SMTP server cannot be reached
+        no transaction is held open while talking to the SMTP server
+        """
+        batch = self.claim(options)
+        if not batch:
+            return 0, 0, False
+
+        sent, failed, connected = [], [], True
+        try:
+            connection.open()
+        except CONNECTION_ERRORS as error:
+            failed = [(notification, error) for notification in batch]
+            connected = False
+        else:
+            for notification in batch:
+                message = EmailMessage(
+                    notification.subject,
+                    notification.body,
+                    to=[notification.recipient],
+                    connection=connection,
+                )
+                try:
+                    message.send()
+                except CONNECTION_ERRORS as error:
+                    # dropped mid batch -> reconnect for the rest of it
+                    failed.append((notification, error))
+                    connection.close()
+                    try:
+                        connection.open()
+                    except CONNECTION_ERRORS as reconnect_error:
+                        index = batch.index(notification) + 1
+                        failed += [(rest, reconnect_error) for rest in batch[index:]]
+                        connected = False
+                        break
+                except smtplib.SMTPException as error:
+                    failed.append((notification, error))
+                else:
+                    sent.append(notification.pk)
+
+        self.record(sent, failed, options)
+        if failed:
+            self.stderr.write(f"{len(failed)} notifications failed, retrying later")
+        return len(sent), len(failed), connected
+
+    def claim(self, options):
+        """
+        marks one batch of due notifications as sending in a short transaction
+        skip_locked keeps concurrent workers off each other's rows, the claim
+        runs out after --claim-timeout so a dead worker's batch is sent again
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            batch = list(
+                LeaveNotification.objects.due(now).select_for_update(skip_locked=True)[
+                    : options["batch_size"]
+                ]
+            )
+            LeaveNotification.objects.filter(
+                pk__in=[notification.pk for notification in batch]
+            ).update(
+                status=LeaveNotification.SENDING,
+                next_attempt=now + datetime.timedelta(seconds=options["claim_timeout"]),
+            )
+        return batch
+
+    def record(self, sent, failed, options):
+        # sent ones are done, failed ones go back to the queue or give up
+        now = timezone.now()
+        with transaction.atomic():
+            if sent:
+                LeaveNotification.objects.filter(pk__in=sent).update(
+                    status=LeaveNotification.SENT,
+                    attempts=F("attempts") + 1,
+                    sent=now,
+                    last_error="",
+                )
+            for notification, error in failed:
+                attempts = notification.attempts + 1
+                if attempts >= options["max_attempts"]:
+                    notification.status = LeaveNotification.FAILED
+                else:
+                    notification.status = LeaveNotification.QUEUED
+                notification.attempts = attempts
+                notification.next_attempt = now + retry_delay(
+                    attempts, options["backoff"]
+                )
+                notification.last_error = str(error)[:255]
+            LeaveNotification.objects.bulk_update(
+                [notification for notification, error in failed],
+                ["status", "attempts", "next_attempt", "last_error"],
+            )
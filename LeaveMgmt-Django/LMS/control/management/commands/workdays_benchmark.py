@@ -0,0 +1,63 @@
+import datetime
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from leave.utility import bulk_working_days
+
+
+def legacy_working_days(startdate, enddate) -> int:
+    # the per-date loop the dashboard used before leave.utility
+    dates_d = [
+        startdate + datetime.timedelta(x) for x in range((enddate - startdate).days)
+    ]
+    working_day_dates = [
+        x
+        for x in dates_d
+        if datetime.datetime.strptime(x.strftime("%Y-%m-%d"), "%Y-%m-%d").weekday() < 5
+    ]
+    return len(working_day_dates)
+
+
+class Command(BaseCommand):
+    help = "Compare the per-date working day loop with the vectorized leave.utility"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000],
+            help="number of leaves to generate for each run",
+        )
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        base = datetime.date(2023, 1, 1)
+
+        for size in options["sizes"]:
+            startdates = [
+                base + datetime.timedelta(rng.randint(0, 365)) for _ in range(size)
+            ]
+            enddates = [d + datetime.timedelta(rng.randint(1, 21)) for d in startdates]
+
+            started = time.perf_counter()
+            legacy = [legacy_working_days(s, e) for s, e in zip(startdates, enddates)]
+            legacy_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            vectorized = bulk_working_days(startdates, enddates, holidays=[])
+            vectorized_time = time.perf_counter() - started
+
+            if legacy != vectorized.tolist():
+                self.stderr.write(self.style.ERROR(f"{size} leaves: results differ"))
+                continue
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{size} leaves: loop {legacy_time * 1000:.1f} ms, "
+                    f"vectorized {vectorized_time * 1000:.1f} ms, "
+                    f"speedup x{legacy_time / max(vectorized_time, 1e-9):.0f}"
+                )
+            )
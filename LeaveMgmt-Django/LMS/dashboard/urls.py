@@ -8,6 +8,8 @@ urlpatterns = [
     path("welcome/", views.dashboard, name="dashboard"),
     # Employee
     path("employees/all/", views.dashboard_employees, name="employees"),
+    path("employees/search/", views.employees_search, name="employeesearch"),
+    path("employees/onboard/", views.employees_onboard, name="employeesonboard"),
     path("employee/create/", views.dashboard_employees_create, name="employeecreate"),
     path(
         "employee/profile/<int:id>/", views.dashboard_employee_info, name="employeeinfo"
@@ -36,6 +38,10 @@ urlpatterns = [
     path("leaves/rejected/all/", views.leave_rejected_list, name="leavesrejected"),
     path("leave/reject/<int:id>/", views.reject_leave, name="reject"),
     path("leave/unreject/<int:id>/", views.unreject_leave, name="unreject"),
+    path("leaves/bulk/", views.leaves_bulk_action, name="leavesbulk"),
+    path("leaves/occupancy/", views.leaves_occupancy, name="leavesoccupancy"),
+    path("leaves/chart/", views.leaves_chart, name="leaveschart"),
+    path("leaves/export/", views.leaves_export, name="leavesexport"),
     # BIRTHDAY ROUTE
-    # path('birthdays/all/',views.birthday_this_month,name='birthdays'),
+    path("birthdays/all/", views.birthday_this_month, name="birthdays"),
 ]
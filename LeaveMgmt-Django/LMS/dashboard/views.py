@@ -1,11 +1,28 @@
 from django.core.paginator import Paginator
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, HttpRequest, HttpResponseRedirect
+from django.http import (
+    HttpResponse,
+    HttpRequest,
+    HttpResponseRedirect,
+    JsonResponse,
+    StreamingHttpResponse,
+)
+from django.views.decorators.http import require_POST
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db import IntegrityError, transaction
+from django.db.models import IntegerField, OuterRef, Subquery
+from django.urls import reverse
 from django.contrib import messages
 from employee.forms import EmployeeCreateForm
-from leave.models import Leave
+from employee import lookups
+from employee.onboarding import Onboarding, OnboardingError, read_rows
+from employee.search import search, search_ranks
+from employee.utility import code_format
+from leave.manager import TRANSITIONS, employee_field
+from leave.models import Leave, LeaveOverlapError, LeaveRollup
+from leave.pagination import keyset_paginate
+from leave.quota import attach_quotas, get_quota
+from leave.summary import get_summary
 from employee.models import *
 from leave.forms import LeaveCreationForm
 
@@ -21,22 +38,36 @@ def dashboard(request: HttpRequest) -> HttpResponse:
     dataset = dict()
     user = request.user
 
-    print(request.user)
     if not request.user.is_authenticated:
         return redirect("accounts:login")
 
-    employees = Employee.objects.all()
-    leaves = Leave.objects.all_pending_leaves()
+    # counts, balances and birthdays as plain values, cached per user
+    dataset["summary"] = get_summary(user)
+    dataset["title"] = "summary"
 
-    staff_leaves = Leave.objects.filter(user=user)
+    return render(request, "dashboard/dashboard_index.html", dataset)
 
-    dataset["employees"] = employees
-    dataset["leaves"] = leaves
 
-    dataset["staff_leaves"] = staff_leaves
-    dataset["title"] = "summary"
+def birthday_this_month(request: HttpRequest) -> HttpResponse:
+    # Birthdays of this month and the next ?days=30 (up to a year)
+    if not request.user.is_authenticated:
+        return redirect("accounts:login")
 
-    return render(request, "dashboard/dashboard_index.html", dataset)
+    days = request.GET.get("days") or "30"
+    days = min(int(days), 366) if days.isdigit() else 30
+    today = datetime.date.today()
+
+    dataset = dict()
+    dataset["month"] = Employee.objects.birthdays_in_month(today.month).select_related(
+        "department"
+    )
+    dataset["upcoming"] = Employee.objects.upcoming_birthdays(
+        days, today
+    ).select_related("department")
+    dataset["days"] = days
+    dataset["today"] = today
+    dataset["title"] = "birthdays"
+    return render(request, "dashboard/birthdays.html", dataset)
 
 
 def dashboard_employees(request: HttpRequest) -> HttpResponse:
@@ -49,15 +80,30 @@ def dashboard_employees(request: HttpRequest) -> HttpResponse:
         return redirect("/")
 
     dataset = dict()
-    departments = Department.objects.all()
+    departments = lookups.departments()
     employees = Employee.objects.all()
 
+    # ?starts=jo -> name order, filtered on the indexed sort name
+    starts = request.GET.get("starts")
+    if starts is not None:
+        employees = Employee.objects.name_startswith(starts)
+
     # pagination
     query = request.GET.get("search")
     if query:
-        employees = employees.filter(
-            Q(firstname__icontains=query) | Q(lastname__icontains=query)
-        )
+        # indexed token search, see employee.search
+        ranks = search_ranks(query)
+        if ranks is None:
+            employees = employees.none()
+        else:
+            # rank of each matching employee -> best first, like the typeahead
+            rank = ranks.filter(employee_id=OuterRef("pk")).values("rank")[:1]
+            employees = (
+                employees.filter(id__in=Subquery(ranks.values("employee_id")))
+                .annotate(rank=Subquery(rank, output_field=IntegerField()))
+                .order_by("-rank", "id")
+                .select_related("department", "role")
+            )
 
     paginator = Paginator(employees, 10)  # show 10 employee lists per page
 
@@ -66,9 +112,76 @@ def dashboard_employees(request: HttpRequest) -> HttpResponse:
 
     blocked_employees = Employee.objects.all_blocked_employees()
 
+    dataset["employees"] = employees
+    dataset["employees_paginated"] = employees_paginated
+    dataset["departments"] = departments
+    dataset["blocked_employees"] = blocked_employees
+    dataset["query"] = query
+    dataset["starts"] = starts
+    dataset["title"] = "Employees"
     return render(request, "dashboard/employee_app.html", dataset)
 
 
+def employees_search(request: HttpRequest) -> JsonResponse:
+    # Employee typeahead -> ?q=jo do&limit=10, ranked by employee.search
+    if not (
+        request.user.is_authenticated
+        and request.user.is_superuser
+        and request.user.is_staff
+    ):
+        return JsonResponse({"error": "not allowed"}, status=403)
+
+    limit = request.GET.get("limit") or "10"
+    if not limit.isdigit():
+        return JsonResponse({"error": "limit must be a number"}, status=400)
+
+    results = [
+        {
+            "id": employee.id,
+            "name": employee.get_full_name,
+            "employeeid": employee.employeeid,
+            "department": employee.department.name if employee.department else None,
+            "role": employee.role.name if employee.role else None,
+            "url": reverse("dashboard:employeeinfo", args=[employee.id]),
+        }
+        for employee in search(request.GET.get("q", ""), min(int(limit), 50))
+    ]
+    return JsonResponse({"results": results})
+
+
+@require_POST
+def employees_onboard(request: HttpRequest) -> JsonResponse:
+    # Create many employees at once -> a CSV/JSON upload as "file" or a JSON list body
+    if not (
+        request.user.is_authenticated
+        and request.user.is_superuser
+        and request.user.is_staff
+    ):
+        return JsonResponse({"error": "not allowed"}, status=403)
+
+    if request.content_type == "application/json":
+        f, name = io.BytesIO(request.body), "employees.json"
+    elif "file" in request.FILES:
+        f, name = request.FILES["file"], request.FILES["file"].name
+    else:
+        return JsonResponse({"error": "upload a CSV or JSON file"}, status=400)
+
+    onboarding = Onboarding()
+    try:
+        onboarding.run(read_rows(f, name))
+    except OnboardingError as error:
+        return JsonResponse({"error": str(error)}, status=400)
+    return JsonResponse(
+        {
+            "created": onboarding.created,
+            "errors": [
+                {"line": line, "message": message}
+                for line, message in onboarding.errors
+            ],
+        }
+    )
+
+
 def dashboard_employees_create(request: HttpRequest) -> HttpResponseRedirect:
     # Create new employee record
     if not (
@@ -95,15 +208,16 @@ def dashboard_employees_create(request: HttpRequest) -> HttpResponseRedirect:
             instance.birthday = request.POST.get("birthday")
 
             role = request.POST.get("role")
-            role_instance = Role.objects.get(id=role)
+            role_instance = lookups.get(Role, role)
             instance.role = role_instance
 
             instance.startdate = request.POST.get("startdate")
             instance.employeetype = request.POST.get("employeetype")
-            instance.employeeid = request.POST.get("employeeid")
+            instance.employeeid = code_format(request.POST.get("employeeid") or "")
             instance.dateissued = request.POST.get("dateissued")
 
-            instance.save()
+            if not save_employee(request, instance):
+                return redirect("dashboard:employeecreate")
 
             return redirect("dashboard:employees")
         else:
@@ -121,6 +235,28 @@ def dashboard_employees_create(request: HttpRequest) -> HttpResponseRedirect:
     return render(request, "dashboard/employee_create.html", dataset)
 
 
+def save_employee(request: HttpRequest, instance: Employee) -> bool:
+    """
+    saves a create/edit form instance, False with an error message
+    when its employee id already belongs to another record
+    """
+    taken = Employee.objects.employeeid_taken(instance.employeeid, exclude=instance.pk)
+    if not taken:
+        try:
+            # two forms racing for the same id -> the unique constraint decides
+            with transaction.atomic():
+                instance.save()
+            return True
+        except IntegrityError:
+            pass
+    messages.error(
+        request,
+        "Employee ID {0} is already in use".format(instance.employeeid),
+        extra_tags="alert alert-warning alert-dismissible show",
+    )
+    return False
+
+
 def employee_edit_data(request: HttpRequest, id: int) -> HttpResponse:
     # Fetch specific employee record to edit
     if not (
@@ -150,7 +286,7 @@ def employee_edit_data(request: HttpRequest, id: int) -> HttpResponse:
             instance.birthday = request.POST.get("birthday")
 
             department_id = request.POST.get("department")
-            department = Department.objects.get(id=department_id)
+            department = lookups.get(Department, department_id)
             instance.department = department
 
             instance.hometown = request.POST.get("hometown")
@@ -164,19 +300,23 @@ def employee_edit_data(request: HttpRequest, id: int) -> HttpResponse:
             instance.tinnumber = request.POST.get("tinnumber")
 
             role = request.POST.get("role")
-            role_instance = Role.objects.get(id=role)
+            role_instance = lookups.get(Role, role)
             instance.role = role_instance
 
             instance.startdate = request.POST.get("startdate")
             instance.employeetype = request.POST.get("employeetype")
-            instance.employeeid = request.POST.get("employeeid")
+            # employeeid is not on the form -> keep the allocated one
+            instance.employeeid = code_format(
+                request.POST.get("employeeid") or instance.employeeid
+            )
             instance.dateissued = request.POST.get("dateissued")
 
             # now = datetime.datetime.now()
             # instance.created = now
             # instance.updated = now
 
-            instance.save()
+            if not save_employee(request, instance):
+                return redirect("dashboard:edit", id=employee.id)
             messages.success(
                 request,
                 "Account Updated Successfully !!!",
@@ -220,47 +360,51 @@ def dashboard_employee_info(request: HttpRequest, id: int) -> HttpResponse:
 Helper Method
 """
 import calendar
-from dateutil.relativedelta import relativedelta
+import csv
+import io
+import json
 
 
-def get_total_leaves(user, max_allowed_leaves=7):
-    today = datetime.datetime.now()
-    no_of_day_in_current_month = calendar.monthrange(today.year, today.month)[1]
-    first_day, last_day = today.replace(day=1), today.replace(day=1) + relativedelta(
-        days=no_of_day_in_current_month - 1
-    )
-    # no_of_day_in_current_month, first_day.strftime("%Y-%m-%d"), last_day.strftime("%Y-%m-%d")
-    leaves_in_current_month = Leave.objects.filter(
-        user=user, startdate__range=(first_day, last_day), is_approved=True
-    )
-    for lapp in leaves_in_current_month:
-        # dates_d = [datetime.datetime(lapp.startdate + datetime.timedelta(x)) for x in range((lapp.enddate - lapp.startdate).days + 1)]
-        dates_d = [
-            lapp.startdate + datetime.timedelta(x)
-            for x in range((lapp.enddate - lapp.startdate).days + 1)
-        ]
-        working_day_dates = [
-            x
-            for x in dates_d
-            if datetime.datetime.strptime(x.strftime("%Y-%m-%d"), "%Y-%m-%d").weekday()
-            < 5
-        ]
-        print(
-            f"{lapp.user.email} -- {lapp.startdate} --- no. of working days = {len(working_day_dates)}"
+def leave_transition(request: HttpRequest, leave: Leave, transition: str) -> bool:
+    """
+    runs a Leave transition eg. leave_transition(request, leave, "approve_leave")
+    warns the admin when another request already moved the leave on
+    or when the leave would overlap another booked leave
+    """
+    message = "Leave was already updated by another request, please check again"
+    try:
+        won = getattr(leave, transition)
+    except LeaveOverlapError as error:
+        won, message = False, str(error)
+    except ValueError:
+        won = False
+    if not won:
+        messages.error(
+            request,
+            message,
+            extra_tags="alert alert-warning alert-dismissible show",
         )
-    print(leaves_in_current_month)
+    return won
 
 
 def leave_creation(request: HttpRequest) -> HttpResponseRedirect:
     if not request.user.is_authenticated:
         return redirect("accounts:login")
     if request.method == "POST":
-        form = LeaveCreationForm(data=request.POST)
+        form = LeaveCreationForm(data=request.POST, user=request.user)
         if form.is_valid():
             instance = form.save(commit=False)
             user = request.user
             instance.user = user
-            instance.save()
+            try:
+                instance.save()
+            except IntegrityError:  # overlapping request raced past the form check
+                messages.error(
+                    request,
+                    "You already have a leave booked within the selected dates",
+                    extra_tags="alert alert-warning alert-dismissible show",
+                )
+                return redirect("dashboard:createleave")
 
             # print(instance.defaultdays)
             messages.success(
@@ -270,17 +414,20 @@ def leave_creation(request: HttpRequest) -> HttpResponseRedirect:
             )
             return redirect("dashboard:createleave")
 
+        errors = form.non_field_errors()  # overlap or balance problems
         messages.error(
             request,
-            "failed to Request a Leave,please check entry dates",
+            errors[0]
+            if errors
+            else "failed to Request a Leave,please check entry dates",
             extra_tags="alert alert-warning alert-dismissible show",
         )
         return redirect("dashboard:createleave")
 
-    get_total_leaves(request.user)
     dataset = dict()
     form = LeaveCreationForm()
     dataset["form"] = form
+    dataset["quota"] = get_quota(request.user)
     dataset["title"] = "Apply for Leave"
     return render(request, "dashboard/create_leave.html", dataset)
 
@@ -289,11 +436,16 @@ def leaves_list(request: HttpRequest) -> HttpResponse:
     # Display all leave requests in list
     if not (request.user.is_staff and request.user.is_superuser):
         return redirect("/")
-    leaves = Leave.objects.all_pending_leaves()
+    leaves = keyset_paginate(
+        Leave.objects.all_pending_leaves().select_related("user"),
+        request.GET.get("cursor"),
+    )
+    request.employees.attach(leaves.object_list)
+    attach_quotas(leaves.object_list)
     return render(
         request,
         "dashboard/leaves_recent.html",
-        {"leave_list": leaves, "title": "leaves list - pending"},
+        {"leave_list": leaves, "page": leaves, "title": "leaves list - pending"},
     )
 
 
@@ -301,13 +453,15 @@ def leaves_approved_list(request: HttpRequest) -> HttpResponse:
     # Display list of all approved leaves
     if not (request.user.is_superuser and request.user.is_staff):
         return redirect("/")
-    leaves = (
-        Leave.objects.all_approved_leaves()
+    leaves = keyset_paginate(
+        Leave.objects.all_approved_leaves().select_related("user"),
+        request.GET.get("cursor"),
     )  # approved leaves -> calling model manager method
+    request.employees.attach(leaves.object_list)
     return render(
         request,
         "dashboard/leaves_approved.html",
-        {"leave_list": leaves, "title": "approved leave list"},
+        {"leave_list": leaves, "page": leaves, "title": "approved leave list"},
     )
 
 
@@ -317,9 +471,7 @@ def leaves_view(request: HttpRequest, id: int) -> HttpResponse:
         return redirect("/")
 
     leave = get_object_or_404(Leave, id=id)
-    print(leave.user)
-    employee = Employee.objects.filter(user=leave.user).first()
-    print(employee)
+    employee = request.employees.get(leave.user_id)
     return render(
         request,
         "dashboard/leave_detail_view.html",
@@ -336,27 +488,198 @@ def approve_leave(request: HttpRequest, id: int) -> HttpResponseRedirect:
     if not (request.user.is_superuser and request.user.is_authenticated):
         return redirect("/")
     leave = get_object_or_404(Leave, id=id)
-    user = leave.user
-    employee = Employee.objects.filter(user=user).first()
-    leave.approve_leave
+    if leave_transition(request, leave, "approve_leave"):
+        employee = request.employees.get(leave.user_id)
+        messages.error(
+            request,
+            "Leave successfully approved for {0}".format(
+                employee.get_full_name if employee else leave.user
+            ),
+            extra_tags="alert alert-success alert-dismissible show",
+        )
+    return redirect("dashboard:userleaveview", id=id)
 
-    messages.error(
-        request,
-        "Leave successfully approved for {0}".format(employee.get_full_name),
-        extra_tags="alert alert-success alert-dismissible show",
+
+@require_POST
+def leaves_bulk_action(request: HttpRequest) -> JsonResponse:
+    # Approve, reject, cancel or reset many leave requests in one statement
+    if not (request.user.is_superuser and request.user.is_authenticated):
+        return JsonResponse({"error": "not allowed"}, status=403)
+
+    if request.content_type == "application/json":
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({"error": "invalid json"}, status=400)
+        ids, status = data.get("ids", []), data.get("status")
+    else:
+        ids, status = request.POST.getlist("ids"), request.POST.get("status")
+
+    if status not in TRANSITIONS:
+        return JsonResponse({"error": "unknown status {0}".format(status)}, status=400)
+    try:
+        ids = [int(pk) for pk in ids]
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "ids must be integers"}, status=400)
+
+    results = Leave.objects.bulk_transition(ids, status)
+    return JsonResponse(
+        {
+            "status": status,
+            "results": results,
+            "updated": [pk for pk, result in results.items() if result == "updated"],
+            "skipped": [pk for pk, result in results.items() if result != "updated"],
+        }
     )
-    return redirect("dashboard:userleaveview", id=id)
+
+
+def leaves_occupancy(request: HttpRequest) -> JsonResponse:
+    # People out per day -> ?start=2023-07-01&end=2023-07-31&department=<id>
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "not allowed"}, status=403)
+
+    today = datetime.date.today()
+    try:
+        first_day = datetime.date.fromisoformat(
+            request.GET.get("start") or today.replace(day=1).isoformat()
+        )
+        last_day = datetime.date.fromisoformat(
+            request.GET.get("end")
+            or today.replace(
+                day=calendar.monthrange(today.year, today.month)[1]
+            ).isoformat()
+        )
+    except ValueError:
+        return JsonResponse({"error": "dates must be YYYY-MM-DD"}, status=400)
+    if not 0 <= (last_day - first_day).days < 366 * 2:
+        return JsonResponse({"error": "invalid date range"}, status=400)
+
+    dataset = dict()
+    dataset["start"] = first_day.isoformat()
+    dataset["end"] = last_day.isoformat()
+
+    department = request.GET.get("department")
+    if department:
+        if not department.isdigit():
+            return JsonResponse({"error": "unknown department"}, status=400)
+        department = get_object_or_404(Department, id=department)
+        dataset["department"] = department.name
+        dataset["counts"] = Leave.objects.occupancy(first_day, last_day, department)
+        return JsonResponse(dataset)
+
+    by_department = Leave.objects.occupancy_by_department(first_day, last_day)
+    names = lookups.table(Department)
+    dataset["counts"] = Leave.objects.occupancy(first_day, last_day)
+    dataset["departments"] = {
+        (names[pk].name if pk in names else "unassigned"): counts
+        for pk, counts in by_department.items()
+    }
+    return JsonResponse(dataset)
+
+
+def leaves_chart(request: HttpRequest) -> JsonResponse:
+    # Leaves per month for the dashboard charts -> ?year=2023&department=<id>
+    # reads the monthly rollups only, never the leave table
+    if not (request.user.is_superuser and request.user.is_authenticated):
+        return JsonResponse({"error": "not allowed"}, status=403)
+
+    year = request.GET.get("year") or str(datetime.date.today().year)
+    department = request.GET.get("department") or None
+    if not year.isdigit() or (department is not None and not department.isdigit()):
+        return JsonResponse(
+            {"error": "year and department must be numbers"}, status=400
+        )
+    return JsonResponse(LeaveRollup.objects.chart(int(year), department))
+
+
+class Echo:
+    # csv.writer target that hands each row back instead of buffering it
+    def write(self, value):
+        return value
+
+
+# columns of the leave export -> (header, values() lookup)
+# read from the user's active employee record -> one csv row per leave
+EXPORT_EMPLOYEE_FIELDS = {
+    "employee_firstname": "firstname",
+    "employee_lastname": "lastname",
+    "employee_employeeid": "employeeid",
+    "employee_department": "department__name",
+}
+EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("username", "user__username"),
+    ("firstname", "employee_firstname"),
+    ("lastname", "employee_lastname"),
+    ("employee id", "employee_employeeid"),
+    ("department", "employee_department"),
+    ("leave type", "leavetype"),
+    ("start date", "startdate"),
+    ("end date", "enddate"),
+    ("status", "status"),
+    ("reason", "reason"),
+    ("created", "created"),
+)
+
+
+def leaves_export(request: HttpRequest) -> HttpResponse:
+    # Streams leaves as CSV -> ?status=approved&start=2023-01-01&end=2023-12-31&department=<id>
+    if not (request.user.is_superuser and request.user.is_authenticated):
+        return redirect("/")
+
+    status = request.GET.get("status") or None
+    department = request.GET.get("department") or None
+    try:
+        start, end = (
+            datetime.date.fromisoformat(request.GET[key])
+            if request.GET.get(key)
+            else None
+            for key in ("start", "end")
+        )
+    except ValueError:
+        return HttpResponse("dates must be YYYY-MM-DD", status=400)
+    if status is not None and status not in TRANSITIONS:
+        return HttpResponse("unknown status {0}".format(status), status=400)
+    if department is not None and not department.isdigit():
+        return HttpResponse("unknown department", status=400)
+
+    rows = (
+        Leave.objects.filtered(status, start, end, department)
+        .annotate(
+            **{
+                name: employee_field(field)
+                for name, field in EXPORT_EMPLOYEE_FIELDS.items()
+            }
+        )
+        .order_by("id")
+        .values_list(*(lookup for header, lookup in EXPORT_COLUMNS))
+        .iterator(chunk_size=2000)
+    )
+    writer = csv.writer(Echo())
+
+    def stream():
+        yield writer.writerow([header for header, lookup in EXPORT_COLUMNS])
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="leaves.csv"'
+    return response
 
 
 def cancel_leaves_list(request: HttpRequest) -> HttpResponse:
     # Display all cancelled leaves in a list
     if not (request.user.is_superuser and request.user.is_authenticated):
         return redirect("/")
-    leaves = Leave.objects.all_cancel_leaves()
+    leaves = keyset_paginate(
+        Leave.objects.all_cancel_leaves().select_related("user"),
+        request.GET.get("cursor"),
+    )
+    request.employees.attach(leaves.object_list)
     return render(
         request,
         "dashboard/leaves_cancel.html",
-        {"leave_list_cancel": leaves, "title": "Cancel leave list"},
+        {"leave_list_cancel": leaves, "page": leaves, "title": "Cancel leave list"},
     )
 
 
@@ -365,7 +688,7 @@ def unapprove_leave(request: HttpRequest, id: int) -> HttpResponseRedirect:
     if not (request.user.is_authenticated and request.user.is_superuser):
         return redirect("/")
     leave = get_object_or_404(Leave, id=id)
-    leave.unapprove_leave
+    leave_transition(request, leave, "unapprove_leave")
     return redirect("dashboard:leaveslist")  # redirect to unapproved list
 
 
@@ -374,13 +697,12 @@ def cancel_leave(request: HttpRequest, id: int) -> HttpResponseRedirect:
     if not (request.user.is_superuser and request.user.is_authenticated):
         return redirect("/")
     leave = get_object_or_404(Leave, id=id)
-    leave.leaves_cancel
-
-    messages.success(
-        request,
-        "Leave is canceled",
-        extra_tags="alert alert-success alert-dismissible show",
-    )
+    if leave_transition(request, leave, "leaves_cancel"):
+        messages.success(
+            request,
+            "Leave is canceled",
+            extra_tags="alert alert-success alert-dismissible show",
+        )
     return redirect(
         "dashboard:canceleaveslist"
     )  # work on redirecting to instance leave - detail view
@@ -392,14 +714,12 @@ def uncancel_leave(request: HttpRequest, id: int) -> HttpResponseRedirect:
     if not (request.user.is_superuser and request.user.is_authenticated):
         return redirect("/")
     leave = get_object_or_404(Leave, id=id)
-    leave.status = "pending"
-    leave.is_approved = False
-    leave.save()
-    messages.success(
-        request,
-        "Leave is uncanceled,now in pending list",
-        extra_tags="alert alert-success alert-dismissible show",
-    )
+    if leave_transition(request, leave, "uncancel_leave"):
+        messages.success(
+            request,
+            "Leave is uncanceled,now in pending list",
+            extra_tags="alert alert-success alert-dismissible show",
+        )
     return redirect(
         "dashboard:canceleaveslist"
     )  # work on redirecting to instance leave - detail view
@@ -408,9 +728,14 @@ def uncancel_leave(request: HttpRequest, id: int) -> HttpResponseRedirect:
 def leave_rejected_list(request):
     # View list of all rejected leaves
     dataset = dict()
-    leave = Leave.objects.all_rejected_leaves()
+    leave = keyset_paginate(
+        Leave.objects.all_rejected_leaves().select_related("user"),
+        request.GET.get("cursor"),
+    )
+    request.employees.attach(leave.object_list)
 
     dataset["leave_list_rejected"] = leave
+    dataset["page"] = leave
     return render(request, "dashboard/rejected_leaves_list.html", dataset)
 
 
@@ -418,12 +743,12 @@ def reject_leave(request: HttpRequest, id: int) -> HttpResponseRedirect:
     # Reject a leave request
     dataset = dict()
     leave = get_object_or_404(Leave, id=id)
-    leave.reject_leave
-    messages.success(
-        request,
-        "Leave is rejected",
-        extra_tags="alert alert-success alert-dismissible show",
-    )
+    if leave_transition(request, leave, "reject_leave"):
+        messages.success(
+            request,
+            "Leave is rejected",
+            extra_tags="alert alert-success alert-dismissible show",
+        )
     return redirect("dashboard:leavesrejected")
 
     # return HttpResponse(id)
@@ -432,14 +757,12 @@ def reject_leave(request: HttpRequest, id: int) -> HttpResponseRedirect:
 def unreject_leave(request: HttpRequest, id: int) -> HttpResponseRedirect:
     # Undo rejection of a leave request
     leave = get_object_or_404(Leave, id=id)
-    leave.status = "pending"
-    leave.is_approved = False
-    leave.save()
-    messages.success(
-        request,
-        "Leave is now in pending list ",
-        extra_tags="alert alert-success alert-dismissible show",
-    )
+    if leave_transition(request, leave, "unreject_leave"):
+        messages.success(
+            request,
+            "Leave is now in pending list ",
+            extra_tags="alert alert-success alert-dismissible show",
+        )
 
     return redirect("dashboard:leavesrejected")
 
@@ -449,11 +772,13 @@ def view_my_leave_table(request: HttpRequest) -> HttpResponse:
     # View list of leaves for the logged-in staff member
     if request.user.is_authenticated:
         user = request.user
-        leaves = Leave.objects.filter(user=user)
-        employee = Employee.objects.filter(user=user).first()
-        print(leaves)
+        leaves = keyset_paginate(
+            Leave.objects.filter(user=user), request.GET.get("cursor")
+        )
+        employee = request.employees.current
         dataset = dict()
         dataset["leave_list"] = leaves
+        dataset["page"] = leaves
         dataset["employee"] = employee
         dataset["title"] = "Leaves List"
     else:
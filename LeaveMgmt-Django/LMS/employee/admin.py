@@ -1,8 +1,16 @@
 from django.contrib import admin
-from employee.models import Role, Department, Employee
+from employee.models import (
+    Role,
+    Department,
+    Employee,
+    EmployeeArchive,
+    EmployeeIdCounter,
+)
 
 
 admin.site.register(Role)
 admin.site.register(Department)
 
 admin.site.register(Employee)
+admin.site.register(EmployeeArchive)
+admin.site.register(EmployeeIdCounter)
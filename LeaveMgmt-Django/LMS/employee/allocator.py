@@ -0,0 +1,104 @@
+import re
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .utility import RGL, code_format
+
+# series used when none is given -> RGL/A0/001
+PREFIX = "A0"
+# numbers are zero padded to this many digits, bigger ones just grow
+DIGITS = 3
+# formatted ids the allocator understands -> RGL/<series>/<number>
+ID_PATTERN = re.compile(r"^{0}/(\w{{2}})/(\d+)$".format(RGL))
+
+
+def get_prefix() -> str:
+    return getattr(settings, "EMPLOYEE_ID_PREFIX", PREFIX).upper()
+
+
+def parse(code) -> Optional[Tuple[str, int]]:
+    """
+    "RGL/A0/091" -> ("A0", 91), ids not following the pattern -> None
+    """
+    match = ID_PATTERN.match(code or "")
+    if not match:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+def format_id(prefix: str, number: int) -> str:
+    """
+    "A0", 91 -> "RGL/A0/091"
+    """
+    return code_format("{0}{1:0{2}d}".format(prefix, number, DIGITS))
+
+
+def highest(prefix: str) -> int:
+    """
+    biggest number handed out in a series, archived employees included so their
+    ids are never reused -> seeds a new counter
+    """
+    from .models import Employee, EmployeeArchive
+
+    start = "{0}/{1}/".format(RGL, prefix)
+    codes = list(
+        Employee.objects.all_employees()
+        .filter(employeeid__startswith=start)
+        .values_list("employeeid", flat=True)
+    )
+    codes += EmployeeArchive.objects.filter(employeeid__startswith=start).values_list(
+        "employeeid", flat=True
+    )
+    return max((parsed[1] for parsed in map(parse, codes) if parsed), default=0)
+
+
+def create_counter(prefix: str, last: int = 0) -> None:
+    """
+    counter of a new series, starting after the ids already in use
+    two workers may get here at once -> one insert wins, the other is ignored
+    """
+    from .models import EmployeeIdCounter
+
+    EmployeeIdCounter.objects.bulk_create(
+        [EmployeeIdCounter(prefix=prefix, last=max(last, highest(prefix)))],
+        ignore_conflicts=True,
+    )
+
+
+def allocate(count: int = 1, prefix: Optional[str] = None) -> List[str]:
+    """
+    reserves count consecutive ids of a series -> allocate(3) -> ["RGL/A0/001", ..]
+    the counter row is bumped with UPDATE .. SET last = last + count, the row lock
+    it takes queues concurrent allocations until the transaction ends
+    """
+    from .models import EmployeeIdCounter
+
+    prefix = (prefix or get_prefix()).upper()
+    counter = EmployeeIdCounter.objects.filter(prefix=prefix)
+    with transaction.atomic():
+        if not counter.update(last=F("last") + count):
+            create_counter(prefix)
+            counter.update(last=F("last") + count)
+        last = counter.values_list("last", flat=True).get()
+    return [format_id(prefix, number) for number in range(last - count + 1, last + 1)]
+
+
+def observe(codes: Iterable[str]) -> None:
+    """
+    moves counters past ids typed in by hand, so allocate never hands them out
+    """
+    from .models import EmployeeIdCounter
+
+    highest_numbers = {}
+    for parsed in map(parse, codes):
+        if parsed:
+            prefix, number = parsed
+            highest_numbers[prefix] = max(number, highest_numbers.get(prefix, 0))
+    for prefix, number in highest_numbers.items():
+        counter = EmployeeIdCounter.objects.filter(prefix=prefix)
+        if not counter.exists():
+            create_counter(prefix, number)
+        counter.filter(last__lt=number).update(last=number)
@@ -3,3 +3,14 @@ from django.apps import AppConfig
 
 class EmployeeConfig(AppConfig):
     name = "employee"
+
+    def ready(self):
+        # role and department changes invalidate the cached lookup tables
+        from django.db.models.signals import post_delete, post_save
+
+        from .lookups import invalidate
+        from .models import Department, Role
+
+        for model in (Role, Department):
+            post_save.connect(invalidate, sender=model, dispatch_uid="lookups")
+            post_delete.connect(invalidate, sender=model, dispatch_uid="lookups")
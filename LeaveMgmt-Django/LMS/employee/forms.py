@@ -1,8 +1,50 @@
 from django import forms
+from django.core.exceptions import ValidationError
+from django.forms.models import ModelChoiceIterator
+from employee import lookups
 from employee.models import Role, Department, Employee
 from django.contrib.auth.models import User
 
 
+class CachedChoiceIterator(ModelChoiceIterator):
+    # choices from the process local lookup table instead of a query per render
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in lookups.table(self.queryset.model).values():
+            yield self.choice(obj)
+
+    def __len__(self):
+        empty = self.field.empty_label is not None
+        return len(lookups.table(self.queryset.model)) + empty
+
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(
+            lookups.table(self.queryset.model)
+        )
+
+
+class CachedModelChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField of a small lookup model (Role, Department) served by
+    employee.lookups -> rendering and validating it runs no query
+    """
+
+    iterator = CachedChoiceIterator
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        obj = lookups.get(self.queryset.model, value)
+        if obj is None:
+            raise ValidationError(
+                self.error_messages["invalid_choice"],
+                code="invalid_choice",
+                params={"value": value},
+            )
+        return obj
+
+
 # EMPLoYEE
 class EmployeeCreateForm(forms.ModelForm):
     image = forms.ImageField(
@@ -20,3 +62,7 @@ class EmployeeCreateForm(forms.ModelForm):
             "dateissued",
         ]
         widgets = {"bio": forms.Textarea(attrs={"cols": 5, "rows": 5})}
+        field_classes = {
+            "role": CachedModelChoiceField,
+            "department": CachedModelChoiceField,
+        }
@@ -0,0 +1,72 @@
+from typing import Dict, List
+
+from django.db import transaction
+from hrsuit import versions
+
+# bumped by the Role/Department signals, shared through the django cache so every
+# worker process notices a change made in another one
+VERSION_KEY = "employee:lookups:version"
+
+# process local copies -> {model label: {pk: instance}} valid for _version
+_tables: Dict[str, Dict] = {}
+_version = None
+
+
+def get_version() -> int:
+    return versions.get_version(VERSION_KEY)
+
+
+def bump() -> None:
+    versions.bump(VERSION_KEY)
+
+
+def invalidate(**kwargs) -> None:
+    """
+    post_save / post_delete receiver of Role and Department -> drops the local
+    copies of every process, bumped again on commit so no process keeps rows it
+    read before the change was visible
+    """
+    global _version
+    _tables.clear()
+    _version = None
+    bump()
+    transaction.on_commit(bump)
+
+
+def table(model) -> Dict:
+    """
+    {pk: instance} of a small lookup model in Meta.ordering, read from the
+    database once per version -> table(Role)
+    """
+    global _version
+    version = get_version()
+    if version != _version:
+        _tables.clear()
+        _version = version
+    label = model._meta.label
+    if label not in _tables:
+        _tables[label] = {obj.pk: obj for obj in model.objects.all()}
+    return _tables[label]
+
+
+def get(model, pk):
+    """
+    cached instance of model by pk, strings from forms work -> get(Role, "3")
+    None when pk is empty or unknown
+    """
+    try:
+        return table(model).get(int(pk))
+    except (TypeError, ValueError):
+        return None
+
+
+def roles() -> List:
+    from .models import Role
+
+    return list(table(Role).values())
+
+
+def departments() -> List:
+    from .models import Department
+
+    return list(table(Department).values())
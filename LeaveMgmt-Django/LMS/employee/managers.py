@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 from django.db import models
 import datetime
 
@@ -22,3 +22,96 @@ class EmployeeManager(models.Manager):
         Employee.objects.all_blocked_employees() -> returns list of blocked employees ie.is_blocked = True
         """
         return super().get_queryset().filter(is_blocked=True)
+
+    def name_startswith(self, prefix: str):
+        """
+        Employee.objects.name_startswith("jo") -> active employees whose full name
+        starts with prefix, case and accents ignored, in name order
+        """
+        from .search import normalize, prefix_match
+
+        prefix = " ".join(normalize(prefix))
+        employees = self.get_queryset()
+        if prefix:
+            employees = employees.filter(prefix_match(prefix, "sortname"))
+        return employees.order_by("sortname", "id")
+
+    def upcoming_birthdays(self, days: int = 30, today=None):
+        """
+        Employee.objects.upcoming_birthdays(7) -> active employees with a birthday in
+        the next days (today included), soonest first, one query on birthday_key
+        a window wrapping from December into January looks up its month-days with
+        IN, a single index range can't cover both ends of the year
+        """
+        from .utility import month_day
+
+        today = today or datetime.date.today()
+        days = max(days, 1)
+        employees = self.get_queryset()
+        if days >= 366:
+            return employees.order_by("birthday_key", "sortname")
+
+        last = today + datetime.timedelta(days=days - 1)
+        start, end = month_day(today), month_day(last)
+        if start <= end:
+            # february 29th sorts between the 28th and march 1st -> always in range
+            return employees.filter(
+                birthday_key__gte=start, birthday_key__lte=end
+            ).order_by("birthday_key", "sortname")
+
+        keys = {month_day(today + datetime.timedelta(days=n)) for n in range(days)}
+        if 228 in keys and 301 in keys:
+            keys.add(229)
+        return (
+            employees.filter(birthday_key__in=sorted(keys))
+            .annotate(
+                wrapped=models.Case(
+                    models.When(birthday_key__lt=start, then=models.Value(1)),
+                    default=models.Value(0),
+                    output_field=models.IntegerField(),
+                )
+            )
+            .order_by("wrapped", "birthday_key", "sortname")
+        )
+
+    def birthdays_in_month(self, month: int):
+        """
+        Employee.objects.birthdays_in_month(7) -> active employees born in July
+        """
+        return (
+            self.get_queryset()
+            .filter(
+                birthday_key__gte=month * 100 + 1, birthday_key__lte=month * 100 + 31
+            )
+            .order_by("birthday_key", "sortname")
+        )
+
+    def employeeid_taken(self, employeeid: str, exclude=None) -> bool:
+        """
+        Employee.objects.employeeid_taken("RGL/A0/007") -> True when any record,
+        deleted ones included, already holds the id, exclude -> pk being edited
+        """
+        employees = self.all_employees().filter(employeeid=employeeid)
+        if exclude is not None:
+            employees = employees.exclude(pk=exclude)
+        return bool(employeeid) and employees.exists()
+
+    def for_user(self, user):
+        """
+        Employee.objects.for_user(user) -> latest active employee record of user or None
+        """
+        return self.get_queryset().filter(user=user).first()
+
+    def for_users(self, users) -> Dict[int, "models.Model"]:
+        """
+        Employee.objects.for_users(users) -> {user_id: employee} in a single query
+        users can be User instances or ids, users without an employee are left out
+        """
+        user_ids = {getattr(user, "pk", user) for user in users}
+        employees: Dict[int, "models.Model"] = {}
+        if not user_ids:
+            return employees
+        for employee in self.get_queryset().filter(user_id__in=user_ids):
+            # same record .first() picks -> first one in Meta.ordering
+            employees.setdefault(employee.user_id, employee)
+        return employees
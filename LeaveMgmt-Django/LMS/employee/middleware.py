@@ -0,0 +1,68 @@
+from typing import Dict, Iterable, Optional
+
+from employee.models import Employee
+
+
+class EmployeeResolver:
+    """
+    Request scoped User -> Employee lookups, every user is fetched at most once.
+
+    request.employees.current          -> employee of request.user
+    request.employees.get(user)        -> employee of any user
+    request.employees.get_many(users)  -> {user_id: employee}, one query for the misses
+    request.employees.attach(leaves)   -> sets leave.employee on every leave
+    """
+
+    def __init__(self, user=None):
+        self.user = user
+        self._employees: Dict[int, Optional[Employee]] = {}
+
+    @classmethod
+    def for_request(cls, request) -> "EmployeeResolver":
+        resolver = getattr(request, "employees", None)
+        if resolver is None:
+            resolver = cls(getattr(request, "user", None))
+            request.employees = resolver
+        return resolver
+
+    @property
+    def current(self) -> Optional[Employee]:
+        if self.user is None or not self.user.is_authenticated:
+            return None
+        return self.get(self.user)
+
+    def get(self, user) -> Optional[Employee]:
+        user_id = getattr(user, "pk", user)
+        return self.get_many([user_id]).get(user_id)
+
+    def get_many(self, users: Iterable) -> Dict[int, Optional[Employee]]:
+        user_ids = {getattr(user, "pk", user) for user in users}
+        missing = user_ids.difference(self._employees)
+        if missing:
+            found = Employee.objects.for_users(missing)
+            for user_id in missing:
+                self._employees[user_id] = found.get(user_id)
+        return {user_id: self._employees[user_id] for user_id in user_ids}
+
+    def attach(self, leaves):
+        """
+        resolves the employees of a list of leaves with one query, returns the leaves
+        """
+        leaves = list(leaves)
+        employees = self.get_many(leave.user_id for leave in leaves)
+        for leave in leaves:
+            leave.employee = employees[leave.user_id]
+        return leaves
+
+
+class EmployeeMiddleware:
+    """
+    Adds request.employees (EmployeeResolver), nothing is queried until it is used
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        EmployeeResolver.for_request(request)
+        return self.get_response(request)
@@ -0,0 +1,106 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:20
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# frozen copy of employee.search -> the migration must not change with it
+NAME = 3
+EMPLOYEEID = 3
+DEPARTMENT = 1
+ROLE = 1
+TOKEN_LENGTH = 64
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [word[:TOKEN_LENGTH] for word in re.findall(r"\w+", text.lower())]
+
+
+def id_terms(terms):
+    terms = [term[3:] if term.startswith("rgl") else term for term in terms]
+    return [term for term in terms if term]
+
+
+def employee_tokens(employee):
+    tokens = set()
+    for name in (employee.firstname, employee.lastname, employee.othername):
+        tokens.update((token, NAME) for token in normalize(name))
+    if employee.employeeid:
+        parts = id_terms(normalize(employee.employeeid))
+        tokens.update((token, EMPLOYEEID) for token in parts + ["".join(parts)])
+    if employee.department_id:
+        tokens.update(
+            (token, DEPARTMENT) for token in normalize(employee.department.name)
+        )
+    if employee.role_id:
+        tokens.update((token, ROLE) for token in normalize(employee.role.name))
+    return {(token, weight) for token, weight in tokens if token}
+
+
+def index_existing_employees(apps, schema_editor):
+    Employee = apps.get_model("employee", "Employee")
+    EmployeeSearchToken = apps.get_model("employee", "EmployeeSearchToken")
+    employees = (
+        Employee.objects.filter(is_deleted=False)
+        .select_related("department", "role")
+        .order_by("id")
+    )
+    tokens = []
+    for employee in employees.iterator(chunk_size=2000):
+        tokens.extend(
+            EmployeeSearchToken(employee_id=employee.pk, token=token, weight=weight)
+            for token, weight in employee_tokens(employee)
+        )
+        if len(tokens) >= 2000:
+            EmployeeSearchToken.objects.bulk_create(tokens)
+            tokens = []
+    EmployeeSearchToken.objects.bulk_create(tokens)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("employee", "0002_auto_20200904_1545"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmployeeSearchToken",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(max_length=64)),
+                ("weight", models.PositiveSmallIntegerField(default=1)),
+                (
+                    "employee",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_tokens",
+                        to="employee.employee",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Employee Search Token",
+                "verbose_name_plural": "Employee Search Tokens",
+                "indexes": [
+                    models.Index(
+                        fields=["token", "employee", "weight"],
+                        name="employee_search_token_idx",
+                        opclasses=["varchar_pattern_ops", "int4_ops", "int2_ops"],
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(index_existing_employees, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:26
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+# frozen copies of employee.search.normalize and employee.utility.full_name
+def normalize(text):
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [word[:64] for word in re.findall(r"\w+", text.lower())]
+
+
+def full_name(firstname, lastname, othername):
+    if (firstname and lastname) or othername is None:
+        return firstname + " " + lastname
+    elif othername:
+        return firstname + " " + lastname + " " + othername
+    return ""
+
+
+def backfill_names(apps, schema_editor):
+    Employee = apps.get_model("employee", "Employee")
+    employees = Employee.objects.only("firstname", "lastname", "othername")
+    batch = []
+    for employee in employees.order_by("id").iterator(chunk_size=2000):
+        employee.fullname = full_name(
+            employee.firstname, employee.lastname, employee.othername
+        )
+        employee.sortname = " ".join(normalize(employee.fullname))
+        batch.append(employee)
+        if len(batch) >= 2000:
+            Employee.objects.bulk_update(batch, ["fullname", "sortname"])
+            batch = []
+    Employee.objects.bulk_update(batch, ["fullname", "sortname"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("employee", "0003_employeesearchtoken"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="employee",
+            name="fullname",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                max_length=380,
+                verbose_name="Full Name",
+            ),
+        ),
+        migrations.AddField(
+            model_name="employee",
+            name="sortname",
+            field=models.CharField(
+                blank=True,
+                default="",
+                editable=False,
+                max_length=380,
+                verbose_name="Sort Name",
+            ),
+        ),
+        migrations.RunPython(backfill_names, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                fields=["sortname"],
+                name="employee_sortname_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("employee", "0004_employee_names"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="employee",
+            name="thumbnail_source",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=255
+            ),
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_deleted(apps, schema_editor):
+    # employees deleted before the column existed count as deleted when last updated
+    Employee = apps.get_model("employee", "Employee")
+    Employee.objects.filter(is_deleted=True, deleted__isnull=True).update(
+        deleted=models.F("updated")
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("employee", "0005_employee_thumbnail_source"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmployeeArchive",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False)),
+                (
+                    "firstname",
+                    models.CharField(max_length=125, verbose_name="Firstname"),
+                ),
+                ("lastname", models.CharField(max_length=125, verbose_name="Lastname")),
+                ("othername", models.CharField(blank=True, max_length=125, null=True)),
+                (
+                    "fullname",
+                    models.CharField(
+                        blank=True, max_length=380, verbose_name="Full Name"
+                    ),
+                ),
+                ("employeeid", models.CharField(blank=True, max_length=10, null=True)),
+                ("employeetype", models.CharField(max_length=15, null=True)),
+                ("department", models.CharField(blank=True, max_length=125, null=True)),
+                ("role", models.CharField(blank=True, max_length=125, null=True)),
+                ("image", models.CharField(blank=True, max_length=255, null=True)),
+                ("birthday", models.DateField(null=True)),
+                ("startdate", models.DateField(null=True)),
+                ("dateissued", models.DateField(null=True)),
+                ("created", models.DateTimeField(null=True)),
+                ("deleted", models.DateTimeField(null=True)),
+                ("archived", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Archived Employee",
+                "verbose_name_plural": "Archived Employees",
+                "ordering": ["-archived"],
+            },
+        ),
+        migrations.AddField(
+            model_name="employee",
+            name="deleted",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Deleted"
+            ),
+        ),
+        migrations.RunPython(backfill_deleted, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["-created"],
+                name="employee_active_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                condition=models.Q(("is_blocked", True)),
+                fields=["sortname"],
+                name="employee_blocked_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                condition=models.Q(("is_deleted", True)),
+                fields=["deleted"],
+                name="employee_deleted_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="employeearchive",
+            name="user",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:43
+
+from django.db import migrations, models
+from django.db.models.functions import ExtractDay, ExtractMonth
+
+
+def backfill_birthday_key(apps, schema_editor):
+    Employee = apps.get_model("employee", "Employee")
+    Employee.objects.filter(birthday__isnull=False).update(
+        birthday_key=ExtractMonth("birthday") * 100 + ExtractDay("birthday")
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("employee", "0006_employee_purge"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="employee",
+            name="birthday_key",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_birthday_key, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["birthday_key"],
+                name="employee_birthday_idx",
+            ),
+        ),
+    ]
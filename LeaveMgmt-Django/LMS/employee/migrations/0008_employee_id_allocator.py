@@ -0,0 +1,109 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:55
+
+import re
+
+from django.conf import settings
+from django.db import migrations, models
+
+# frozen copy of employee.allocator -> the migration must not change with it
+ID_PATTERN = re.compile(r"^RGL/(\w{2})/(\d+)$")
+
+
+def parse(code):
+    match = ID_PATTERN.match(code or "")
+    if not match:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+def format_id(prefix, number):
+    return "RGL/{0}/{1:03d}".format(prefix, number)
+
+
+def dedupe_and_seed(apps, schema_editor):
+    """
+    later holders of a duplicated id get the next free number of its series,
+    then every series gets a counter starting after its highest number
+    """
+    Employee = apps.get_model("employee", "Employee")
+    EmployeeArchive = apps.get_model("employee", "EmployeeArchive")
+    EmployeeIdCounter = apps.get_model("employee", "EmployeeIdCounter")
+
+    rows = list(
+        Employee.objects.exclude(employeeid="")
+        .exclude(employeeid__isnull=True)
+        .order_by("id")
+        .values_list("id", "employeeid")
+    )
+    codes = [code for pk, code in rows]
+    codes += EmployeeArchive.objects.exclude(employeeid__isnull=True).values_list(
+        "employeeid", flat=True
+    )
+    last = {}
+    for parsed in map(parse, codes):
+        if parsed:
+            last[parsed[0]] = max(parsed[1], last.get(parsed[0], 0))
+
+    seen = set()
+    for pk, code in rows:
+        if code not in seen:
+            seen.add(code)
+            continue
+        prefix = (
+            parse(code) or (getattr(settings, "EMPLOYEE_ID_PREFIX", "A0").upper(),)
+        )[0]
+        last[prefix] = last.get(prefix, 0) + 1
+        Employee.objects.filter(pk=pk).update(
+            employeeid=format_id(prefix, last[prefix])
+        )
+
+    EmployeeIdCounter.objects.bulk_create(
+        [
+            EmployeeIdCounter(prefix=prefix, last=number)
+            for prefix, number in last.items()
+        ]
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("employee", "0007_employee_birthday_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmployeeIdCounter",
+            fields=[
+                (
+                    "prefix",
+                    models.CharField(max_length=8, primary_key=True, serialize=False),
+                ),
+                ("last", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "verbose_name": "Employee ID Counter",
+                "verbose_name_plural": "Employee ID Counters",
+            },
+        ),
+        migrations.AlterField(
+            model_name="employee",
+            name="employeeid",
+            field=models.CharField(
+                blank=True, max_length=16, null=True, verbose_name="Employee ID Number"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="employeearchive",
+            name="employeeid",
+            field=models.CharField(blank=True, max_length=16, null=True),
+        ),
+        migrations.RunPython(dedupe_and_seed, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="employee",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("employeeid", ""), _negated=True),
+                fields=("employeeid",),
+                name="employee_employeeid_unique",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.3 on 2026-10-18 15:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("employee", "0008_employee_id_allocator"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="employee",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["sortname", "id"],
+                name="employee_name_order_idx",
+            ),
+        ),
+    ]
@@ -1,7 +1,11 @@
 import datetime
 
-from employee.utility import code_format
+from employee.allocator import allocate, observe
+from employee.search import index_employees, normalize
+from employee.thumbnails import make_thumbnails, thumbnail_urls
+from employee.utility import code_format, full_name, month_day
 from django.db import models
+from django.utils import timezone
 from employee.managers import EmployeeManager
 from django.utils.translation import gettext as _
 from django.contrib.auth.models import User
@@ -29,6 +33,11 @@ class Role(models.Model):
     def __str__(self) -> str:
         return self.name
 
+    # Employees are searched by role name -> refresh their search tokens
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        index_employees(self.employee_set.all())
+
 
 # Define the Department model
 class Department(models.Model):
@@ -49,6 +58,11 @@ class Department(models.Model):
     def __str__(self) -> str:
         return self.name
 
+    # Employees are searched by department name -> refresh their search tokens
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        index_employees(self.employee_set.all())
+
 
 # Define the Employee mode
 class Employee(models.Model):
@@ -111,6 +125,8 @@ class Employee(models.Model):
         _("Othername (optional)"), max_length=125, null=True, blank=True
     )
     birthday = models.DateField(_("Birthday"), blank=False, null=False)
+    # month * 100 + day of birthday, set in save -> indexed for upcoming birthdays
+    birthday_key = models.PositiveSmallIntegerField(default=0, editable=False)
 
     department = models.ForeignKey(
         Department,
@@ -133,8 +149,21 @@ class Employee(models.Model):
         blank=False,
         null=True,
     )
+    # RGL/<series>/<number>, handed out by employee.allocator when left blank
     employeeid = models.CharField(
-        _("Employee ID Number"), max_length=10, null=True, blank=True
+        _("Employee ID Number"), max_length=16, null=True, blank=True
+    )
+    # stored copies of get_full_name, set in save -> sortname is lowercased and
+    # accent free for ordering and "starts with" lookups in the database
+    fullname = models.CharField(
+        _("Full Name"), max_length=380, default="", blank=True, editable=False
+    )
+    sortname = models.CharField(
+        _("Sort Name"), max_length=380, default="", blank=True, editable=False
+    )
+    # image name the thumbnails were built from, see employee.thumbnails
+    thumbnail_source = models.CharField(
+        max_length=255, default="", blank=True, editable=False
     )
 
     dateissued = models.DateField(
@@ -152,6 +181,8 @@ class Employee(models.Model):
         help_text="button to toggle employee deleted and undelete",
         default=False,
     )
+    # when is_deleted was set, purge_employees archives long deleted employees
+    deleted = models.DateTimeField(_("Deleted"), null=True, blank=True, editable=False)
 
     created = models.DateTimeField(
         verbose_name=_("Created"), auto_now_add=True, null=True
@@ -166,26 +197,65 @@ class Employee(models.Model):
         verbose_name = _("Employee")
         verbose_name_plural = _("Employees")
         ordering = ["-created"]
+        indexes = [
+            # prefix LIKE of EmployeeManager.name_startswith, pattern ops on postgres
+            # can't serve ORDER BY -> the name order has its own index below
+            models.Index(
+                fields=["sortname"],
+                name="employee_sortname_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+            # ORDER BY sortname, id of active employees
+            models.Index(
+                fields=["sortname", "id"],
+                name="employee_name_order_idx",
+                condition=models.Q(is_deleted=False),
+            ),
+            # partial indexes matching the EmployeeManager filters, they only hold
+            # the rows each filter keeps
+            models.Index(
+                fields=["-created"],
+                name="employee_active_idx",
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=["sortname"],
+                name="employee_blocked_idx",
+                condition=models.Q(is_blocked=True),
+            ),
+            models.Index(
+                fields=["deleted"],
+                name="employee_deleted_idx",
+                condition=models.Q(is_deleted=True),
+            ),
+            # EmployeeManager.upcoming_birthdays range scans
+            models.Index(
+                fields=["birthday_key"],
+                name="employee_birthday_idx",
+                condition=models.Q(is_deleted=False),
+            ),
+        ]
+        constraints = [
+            # blank ids are left alone, every formatted id belongs to one employee
+            models.UniqueConstraint(
+                fields=["employeeid"],
+                condition=~models.Q(employeeid=""),
+                name="employee_employeeid_unique",
+            ),
+        ]
 
     # String representation of each instance of this model
     def __str__(self) -> str:
         return self.get_full_name
 
-    # Compute the full name of the employee
+    # Full name as stored by save, computed for unsaved employees
     @property
     def get_full_name(self) -> str:
-        fullname = ""
-        firstname = self.firstname
-        lastname = self.lastname
-        othername = self.othername
-
-        if (firstname and lastname) or othername is None:
-            fullname = firstname + " " + lastname
-            return fullname
-        elif othername:
-            fullname = firstname + " " + lastname + " " + othername
-            return fullname
-        return fullname
+        return self.fullname or self.compose_full_name()
+
+    # Compute the full name of the employee
+    def compose_full_name(self) -> str:
+        return full_name(self.firstname, self.lastname, self.othername)
 
     # Compute the age of the employee
     @property
@@ -196,10 +266,22 @@ class Employee(models.Model):
             return current_year - dateofbirth_year
         return 0
 
-    # Check if the employee can apply for leave (to be implemented)
+    # Check if the employee is still within this year's leave request quota
     @property
-    def can_apply_leave(self):
-        return None
+    def can_apply_leave(self) -> bool:
+        from leave.quota import get_quota
+
+        return get_quota(self.user_id).can_apply()
+
+    # Keep the stored display name and sort key in step with the name fields
+    def set_names(self) -> None:
+        self.fullname = self.compose_full_name()
+        self.sortname = " ".join(normalize(self.fullname))
+
+    # Keep the stored month and day of the birthday in step, forms pass strings
+    def set_birthday_key(self) -> None:
+        self.birthday = self._meta.get_field("birthday").to_python(self.birthday)
+        self.birthday_key = month_day(self.birthday)
 
     # Override the save method to process the employee ID in a specific way before saving
 
@@ -214,5 +296,107 @@ class Employee(models.Model):
         self.employeeid = (
             data  # pass the new code to the employee_id as its orifinal or actual code
         )
+        if not self.employeeid and self._state.adding:
+            self.employeeid = allocate()[0]
+        elif self.employeeid:
+            observe([self.employeeid])
+        self.set_names()
+        self.set_birthday_key()
+        if not self.is_deleted:
+            self.deleted = None
+        elif self.deleted is None:
+            self.deleted = timezone.now()
         super().save(*args, **kwargs)  # call the parent save method
         # print(self.employeeid)
+        index_employees([self])
+        self.build_thumbnails()
+
+    # Build the thumbnails of a new profile image, build_thumbnails backfills failures
+    def build_thumbnails(self) -> None:
+        if not self.image or self.image.name == self.thumbnail_source:
+            return
+        try:
+            make_thumbnails(self.image.name)
+        except (OSError, ValueError):
+            return
+        self.thumbnail_source = self.image.name
+        Employee.objects.all_employees().filter(pk=self.pk).update(
+            thumbnail_source=self.thumbnail_source
+        )
+
+    # {"small": {"webp": url, "jpeg": url}, "medium": {...}} of the profile image
+    @property
+    def thumbnails(self):
+        return thumbnail_urls(
+            self.image, bool(self.image) and self.image.name == self.thumbnail_source
+        )
+
+
+# Long deleted employees moved out of the employee table by purge_employees,
+# keeps the original id and the names they were known by
+class EmployeeArchive(models.Model):
+    id = models.IntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
+    firstname = models.CharField(_("Firstname"), max_length=125)
+    lastname = models.CharField(_("Lastname"), max_length=125)
+    othername = models.CharField(max_length=125, null=True, blank=True)
+    fullname = models.CharField(_("Full Name"), max_length=380, blank=True)
+    employeeid = models.CharField(max_length=16, null=True, blank=True)
+    employeetype = models.CharField(max_length=15, null=True)
+    department = models.CharField(max_length=125, null=True, blank=True)
+    role = models.CharField(max_length=125, null=True, blank=True)
+    image = models.CharField(max_length=255, null=True, blank=True)
+    birthday = models.DateField(null=True)
+    startdate = models.DateField(null=True)
+    dateissued = models.DateField(null=True)
+
+    created = models.DateTimeField(null=True)
+    deleted = models.DateTimeField(null=True)
+    archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Archived Employee")
+        verbose_name_plural = _("Archived Employees")
+        ordering = ["-archived"]
+
+    def __str__(self) -> str:
+        return self.fullname
+
+
+# Last number handed out per employee id series -> employee.allocator
+class EmployeeIdCounter(models.Model):
+    prefix = models.CharField(max_length=8, primary_key=True)
+    last = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = _("Employee ID Counter")
+        verbose_name_plural = _("Employee ID Counters")
+
+    def __str__(self) -> str:
+        return "{0} -> {1}".format(self.prefix, self.last)
+
+
+# Normalized name, employee id, department and role words of an employee, searched by
+# prefix through an index on token -> employee.search
+class EmployeeSearchToken(models.Model):
+    employee = models.ForeignKey(
+        Employee, on_delete=models.CASCADE, related_name="search_tokens"
+    )
+    token = models.CharField(max_length=64)
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        verbose_name = _("Employee Search Token")
+        verbose_name_plural = _("Employee Search Tokens")
+        indexes = [
+            # token first for the prefix range, employee and weight cover the ranking
+            # postgres needs pattern ops for LIKE 'term%', other databases ignore them
+            models.Index(
+                fields=["token", "employee", "weight"],
+                name="employee_search_token_idx",
+                opclasses=["varchar_pattern_ops", "int4_ops", "int2_ops"],
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return self.token
@@ -0,0 +1,239 @@
+import csv
+import io
+import itertools
+import json
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_date
+from leave import summary
+
+from . import lookups
+from .allocator import allocate, observe
+from .models import Department, Employee, Role
+from .search import index_employees
+from .utility import code_formats
+
+COLUMNS = ("username", "firstname", "lastname", "birthday")
+OPTIONAL_COLUMNS = (
+    "email",
+    "othername",
+    "department",
+    "role",
+    "startdate",
+    "employeetype",
+    "employeeid",
+    "dateissued",
+)
+EMPLOYEETYPES = {key.lower(): key for key, name in Employee.EMPLOYEETYPE}
+
+
+class OnboardingError(ValueError):
+    """
+    the file itself is unusable -> wrong format or missing columns
+    """
+
+
+def read_rows(f, name: str = "") -> Iterator[Tuple[int, Dict]]:
+    """
+    (line, row) pairs of a CSV file with a header row or a JSON list of objects
+    CSV lines start at 2 after the header, JSON records are numbered from 1
+    """
+    if name.lower().endswith(".json"):
+        try:
+            records = json.load(f)
+        except ValueError as error:
+            raise OnboardingError("invalid JSON: {0}".format(error))
+        if not isinstance(records, list) or not all(
+            isinstance(record, dict) for record in records
+        ):
+            raise OnboardingError("JSON must be a list of objects")
+        missing = set(COLUMNS) - set().union(*records) if records else set()
+        rows = enumerate(records, start=1)
+    else:
+        if isinstance(f.read(0), bytes):
+            f = io.TextIOWrapper(f, encoding="utf-8-sig", newline="")
+        reader = csv.DictReader(f)
+        missing = set(COLUMNS) - set(reader.fieldnames or ())
+        rows = enumerate(reader, start=2)
+    if missing:
+        raise OnboardingError("missing columns: {0}".format(", ".join(sorted(missing))))
+    return rows
+
+
+def lookup(model) -> Dict[str, int]:
+    """
+    {"finance": 3, "3": 3} -> departments and roles by lowercased name and by id
+    """
+    table = {}
+    for pk, obj in lookups.table(model).items():
+        table.setdefault(obj.name.strip().lower(), pk)
+        table[str(pk)] = pk
+    return table
+
+
+def text(row: Dict, column: str) -> str:
+    value = row.get(column)
+    return "" if value is None else str(value).strip()
+
+
+def to_date(value: str):
+    try:
+        return parse_date(value) if value else None
+    except ValueError:
+        return None
+
+
+class Onboarding:
+    """
+    creates users and employees from rows in batches -> Onboarding().run(rows)
+    a batch costs a fixed number of queries however many rows it has, bad rows
+    are collected in errors as (line, message) and the rest of the batch goes in
+    """
+
+    def __init__(self, batch_size: int = 500, dry_run: bool = False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.created = 0
+        self.errors: List[Tuple[int, str]] = []
+
+    def run(self, rows: Iterable[Tuple[int, Dict]]) -> int:
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            employees = self.validate(batch)
+            if not self.dry_run:
+                employees = self.insert(employees)
+            self.created += len(employees)
+        return self.created
+
+    def error(self, line: int, message: str) -> None:
+        self.errors.append((line, message))
+
+    def validate(self, batch) -> List[Employee]:
+        """
+        (line, row) pairs -> unsaved employees, each carrying its unsaved user
+        departments and roles come from employee.lookups, taken usernames and
+        employee ids are read once per batch
+        """
+        departments = lookup(Department)
+        roles = lookup(Role)
+        codes = code_formats([text(row, "employeeid") for line, row in batch])
+        usernames = {text(row, "username") for line, row in batch}
+        taken_usernames = set(
+            User.objects.filter(username__in=usernames).values_list(
+                "username", flat=True
+            )
+        )
+        taken_codes = set(
+            Employee.objects.all_employees()
+            .filter(employeeid__in={code for code in codes if code})
+            .values_list("employeeid", flat=True)
+        )
+
+        employees = []
+        for (line, row), code in zip(batch, codes):
+            username = text(row, "username")
+            department = text(row, "department").lower()
+            role = text(row, "role").lower()
+            employeetype = text(row, "employeetype").lower()
+            birthday = to_date(text(row, "birthday"))
+            startdate = to_date(text(row, "startdate"))
+            dateissued = to_date(text(row, "dateissued"))
+
+            if not username:
+                self.error(line, "username is required")
+            elif username in taken_usernames:
+                self.error(line, f"username {username!r} is taken")
+            elif not (text(row, "firstname") and text(row, "lastname")):
+                self.error(line, "firstname and lastname are required")
+            elif birthday is None:
+                self.error(line, "birthday must be YYYY-MM-DD")
+            elif (text(row, "startdate") and startdate is None) or (
+                text(row, "dateissued") and dateissued is None
+            ):
+                self.error(line, "dates must be YYYY-MM-DD")
+            elif department and department not in departments:
+                self.error(line, f"unknown department {text(row, 'department')!r}")
+            elif role and role not in roles:
+                self.error(line, f"unknown role {text(row, 'role')!r}")
+            elif employeetype and employeetype not in EMPLOYEETYPES:
+                self.error(line, f"unknown employee type {text(row, 'employeetype')!r}")
+            elif text(row, "employeeid") and not code:
+                self.error(line, "employee id must have at least 5 characters")
+            elif code in taken_codes:
+                self.error(line, f"employee id {code!r} is taken")
+            else:
+                taken_usernames.add(username)
+                if code:
+                    taken_codes.add(code)
+                user = User(username=username, email=text(row, "email"))
+                # new starters set their password through a reset, hashing one
+                # per row would cost more than the whole insert
+                user.set_unusable_password()
+                employee = Employee(
+                    firstname=text(row, "firstname"),
+                    lastname=text(row, "lastname"),
+                    othername=text(row, "othername") or None,
+                    birthday=birthday,
+                    startdate=startdate,
+                    dateissued=dateissued,
+                    department_id=departments.get(department),
+                    role_id=roles.get(role),
+                    employeetype=EMPLOYEETYPES.get(employeetype, Employee.FULL_TIME),
+                    # already formatted for the batch, bulk_create skips Employee.save
+                    employeeid=code,
+                )
+                employee.set_names()
+                employee.set_birthday_key()
+                employee.new_user = user
+                employee.line = line
+                employees.append(employee)
+        return employees
+
+    def insert(self, employees: List[Employee]) -> List[Employee]:
+        """
+        bulk_create the users and employees of a batch in one transaction, rows
+        without an employee id get a block of allocated ones
+        when the database refuses the batch (eg. a username taken meanwhile) the
+        rows are retried one by one so only the offending ones are skipped
+        """
+        # ids come from their own short transaction, a rejected batch only leaves
+        # gaps in the series
+        observe(employee.employeeid for employee in employees)
+        blank = [employee for employee in employees if not employee.employeeid]
+        for employee, code in zip(blank, allocate(len(blank)) if blank else []):
+            employee.employeeid = code
+
+        try:
+            with transaction.atomic():
+                self.create(employees)
+            return employees
+        except IntegrityError:
+            pass
+
+        created = []
+        for employee in employees:
+            # the failed batch may have handed out primary keys -> insert afresh
+            employee.pk = employee.new_user.pk = None
+            employee._state.adding = employee.new_user._state.adding = True
+            try:
+                with transaction.atomic():
+                    self.create([employee])
+            except IntegrityError as error:
+                self.error(employee.line, f"rejected by the database: {error}")
+            else:
+                created.append(employee)
+        return created
+
+    def create(self, employees: List[Employee]) -> None:
+        users = User.objects.bulk_create([employee.new_user for employee in employees])
+        for employee, user in zip(employees, users):
+            employee.user_id = user.pk
+        Employee.objects.bulk_create(employees)
+        # bulk_create skips Employee.save -> index the names for search here
+        index_employees(employees)
+        summary.invalidate()
@@ -0,0 +1,152 @@
+import re
+import unicodedata
+from typing import Iterable, List, Set, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Max, Q, Value, When
+
+from .utility import RGL
+
+# how much a token counts towards the rank, by the field it came from
+NAME = 3
+EMPLOYEEID = 3
+DEPARTMENT = 1
+ROLE = 1
+
+# terms after the first few are ignored, every term costs one CASE in the query
+MAX_TERMS = 4
+# longest token kept -> matches EmployeeSearchToken.token max_length
+TOKEN_LENGTH = 64
+# highest unicode code point, tokens starting with "jo" sort in ["jo", "jo\U0010ffff")
+# under a bytewise collation
+PREFIX_END = "\U0010ffff"
+
+
+def normalize(text) -> List[str]:
+    """
+    "Zoë O'Neil" -> ["zoe", "o", "neil"], accents dropped, lowercased
+    """
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return [word[:TOKEN_LENGTH] for word in re.findall(r"\w+", text.lower())]
+
+
+def id_terms(terms: List[str]) -> List[str]:
+    """
+    drops the RGL every employee id starts with (see code_format), as a token it
+    would match every employee -> ["rgl", "a0", "091"] -> ["a0", "091"]
+    """
+    prefix = RGL.lower()
+    terms = [term[len(prefix) :] if term.startswith(prefix) else term for term in terms]
+    return [term for term in terms if term]
+
+
+def employee_tokens(employee) -> Set[Tuple[str, int]]:
+    """
+    {(token, weight)} for an employee, a token found in two fields keeps both weights
+    employee ids are indexed whole and in parts -> "RGL/A0/091" gives "a0091",
+    "a0" and "091"
+    """
+    tokens = set()
+    for name in (employee.firstname, employee.lastname, employee.othername):
+        tokens.update((token, NAME) for token in normalize(name))
+    if employee.employeeid:
+        parts = id_terms(normalize(employee.employeeid))
+        tokens.update((token, EMPLOYEEID) for token in parts + ["".join(parts)])
+    if employee.department_id:
+        tokens.update(
+            (token, DEPARTMENT) for token in normalize(employee.department.name)
+        )
+    if employee.role_id:
+        tokens.update((token, ROLE) for token in normalize(employee.role.name))
+    return {(token, weight) for token, weight in tokens if token}
+
+
+def index_employees(employees: Iterable) -> int:
+    """
+    rewrites the search tokens of employees -> call after saving them
+    deleted employees keep no tokens, so searches never see them
+    returns the number of tokens written
+    """
+    from .models import Employee, EmployeeSearchToken
+
+    employees = list(employees)
+    ids = [employee.pk for employee in employees]
+    # department and role names in one query instead of one per employee
+    employees = Employee.objects.filter(pk__in=ids).select_related("department", "role")
+
+    tokens = [
+        EmployeeSearchToken(employee=employee, token=token, weight=weight)
+        for employee in employees
+        for token, weight in employee_tokens(employee)
+    ]
+    with transaction.atomic():
+        EmployeeSearchToken.objects.filter(employee_id__in=ids).delete()
+        EmployeeSearchToken.objects.bulk_create(tokens, batch_size=2000)
+    return len(tokens)
+
+
+def prefix_match(term: str, field: str = "token") -> Q:
+    """
+    field starts with term, written so an index on field is range scanned
+    postgres -> LIKE 'term%' on a varchar_pattern_ops index, other databases
+    compare bytewise -> field >= term AND field < term + PREFIX_END
+    """
+    if connection.vendor == "postgresql":
+        return Q(**{field + "__startswith": term})
+    return Q(**{field + "__gte": term, field + "__lt": term + PREFIX_END})
+
+
+def search_ranks(query: str):
+    """
+    EmployeeSearchToken rows grouped per employee with a rank, best first
+    every term of the query must prefix one of the employee's tokens, an exact
+    token match counts double -> .values_list("employee_id", "rank")
+    None when the query has no searchable terms
+    """
+    from .models import EmployeeSearchToken
+
+    terms = list(dict.fromkeys(id_terms(normalize(query))))[:MAX_TERMS]
+    if not terms:
+        return None
+
+    prefixes = [prefix_match(term) for term in terms]
+    matches = Q()
+    for prefix in prefixes:
+        matches |= prefix
+
+    scores = {
+        "term{0}".format(position): Max(
+            Case(
+                When(token=term, then=2 * F("weight")),
+                When(prefix, then=F("weight")),
+                default=Value(0),
+                output_field=IntegerField(),
+            )
+        )
+        for position, (term, prefix) in enumerate(zip(terms, prefixes))
+    }
+    ranks = (
+        EmployeeSearchToken.objects.filter(matches)
+        .values("employee_id")
+        .annotate(**scores)
+        .filter(**{"{0}__gt".format(name): 0 for name in scores})
+    )
+    rank = Value(0)
+    for name in scores:
+        rank = rank + F(name)
+    return ranks.annotate(rank=rank).order_by("-rank", "employee_id")
+
+
+def search(query: str, limit: int = 10) -> List:
+    """
+    active employees matching query, best first -> search("jo do")
+    """
+    from .models import Employee
+
+    ranks = search_ranks(query)
+    if ranks is None:
+        return []
+    ids = list(ranks.values_list("employee_id", flat=True)[:limit])
+    employees = Employee.objects.select_related("department", "role").in_bulk(ids)
+    return [employees[pk] for pk in ids if pk in employees]
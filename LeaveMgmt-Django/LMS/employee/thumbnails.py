@@ -0,0 +1,75 @@
+import io
+import os
+from typing import Dict
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# square variants of the profile image -> label: edge in pixels
+SIZES = {"small": 64, "medium": 256}
+# format -> file extension, webp for browsers that take it, jpeg as the fallback
+FORMATS = {"webp": "webp", "jpeg": "jpg"}
+QUALITY = 80
+# variants live next to the uploads -> thumbs/profiles/<name>_<edge>.<ext>
+THUMBS_DIR = "thumbs"
+
+
+def variant_name(name: str, label: str, fmt: str) -> str:
+    """
+    "profiles/jane.png", "small", "webp" -> "thumbs/profiles/jane_64.webp"
+    """
+    stem = os.path.splitext(name)[0]
+    return "{0}/{1}_{2}.{3}".format(THUMBS_DIR, stem, SIZES[label], FORMATS[fmt])
+
+
+def variant_names(name: str):
+    return [variant_name(name, label, fmt) for label in SIZES for fmt in FORMATS]
+
+
+def make_thumbnails(name: str, force: bool = False) -> str:
+    """
+    writes every size and format of the image stored as name, returns name
+    uploads never reuse a name, so existing variants are kept unless force
+    runs inside the build_thumbnails worker processes -> storage only, no database
+    """
+    storage = default_storage
+    if not force and all(storage.exists(path) for path in variant_names(name)):
+        return name
+
+    with storage.open(name, "rb") as f:
+        image = Image.open(f)
+        image.load()
+    # phone photos are stored sideways with an EXIF orientation
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+
+    for label, edge in SIZES.items():
+        thumb = ImageOps.fit(image, (edge, edge), Image.LANCZOS)
+        for fmt in FORMATS:
+            mode = "RGBA" if has_alpha and fmt == "webp" else "RGB"
+            buffer = io.BytesIO()
+            thumb.convert(mode).save(buffer, format=fmt.upper(), quality=QUALITY)
+            path = variant_name(name, label, fmt)
+            if storage.exists(path):
+                storage.delete(path)
+            storage.save(path, ContentFile(buffer.getvalue()))
+    return name
+
+
+def thumbnail_urls(image, ready: bool) -> Dict[str, Dict[str, str]]:
+    """
+    {"small": {"webp": url, "jpeg": url}, "medium": {...}} for a FieldFile
+    every entry is the original image url until the variants are built
+    """
+    if not image:
+        return {}
+    if not ready:
+        return {label: {fmt: image.url for fmt in FORMATS} for label in SIZES}
+    return {
+        label: {
+            fmt: default_storage.url(variant_name(image.name, label, fmt))
+            for fmt in FORMATS
+        }
+        for label in SIZES
+    }
@@ -35,3 +35,36 @@ def code_format(raw_data) -> str:
 
     else:
         return ""
+
+
+def code_formats(raw_codes) -> list:
+    """
+    code_format over a whole batch, blanks stay blank and duplicates are
+    formatted once -> ["A0091", None, "a0091"] -> ["RGL/A0/091", "", "RGL/A0/091"]
+    """
+    formatted = {raw: code_format(raw) for raw in set(raw_codes) if raw}
+    return [formatted.get(raw, "") if raw else "" for raw in raw_codes]
+
+
+def full_name(firstname, lastname, othername) -> str:
+    """
+    eg. John, Doe, None -> John Doe
+    """
+    fullname = ""
+    if (firstname and lastname) or othername is None:
+        fullname = firstname + " " + lastname
+        return fullname
+    elif othername:
+        fullname = firstname + " " + lastname + " " + othername
+        return fullname
+    return fullname
+
+
+def month_day(date) -> int:
+    """
+    birthday -> month * 100 + day, sorts by the calendar whatever the year
+    eg. 1990-12-31 -> 1231, None -> 0
+    """
+    if not date:
+        return 0
+    return date.month * 100 + date.day
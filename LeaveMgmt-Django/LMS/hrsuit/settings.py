@@ -26,6 +26,15 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 
 
+# Leave Settings
+LEAVE_WEEKMASK = "1111100"  # Mon..Sun, 1 -> working day
+LEAVE_HOLIDAYS: List[str] = []  # public holidays eg. "2023-12-25"
+LEAVE_MAX_REQUESTS = 7  # pending + approved requests per user and year
+
+# Employee Settings
+EMPLOYEE_ID_PREFIX = "A0"  # series of allocated ids -> RGL/A0/001
+
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -57,6 +66,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "employee.middleware.EmployeeMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -103,6 +113,19 @@ if (
     DATABASES["default"]["ENGINE"] = "django.db.backends.sqlite3"
     DATABASES["default"]["NAME"] = ":memory:"
 
+# Shared by every worker process on the host -> employee.lookups keeps its
+# version key here, point it at memcached or redis when running on several hosts
+# entries are pickles -> keep CACHE_DIR out of static_cdn and anything served
+CACHE_DIR = os.path.join(os.path.dirname(BASE_DIR), "cache")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": CACHE_DIR,
+    }
+}
+if "test" in sys.argv or "test_coverage" in sys.argv:
+    CACHES["default"] = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
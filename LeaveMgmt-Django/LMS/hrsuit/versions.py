@@ -0,0 +1,22 @@
+import time
+
+from django.core.cache import cache
+
+
+def get_version(key: str) -> int:
+    """
+    shared version stored under key in the django cache, created on first read
+    versions are nanosecond timestamps -> a key lost from the cache comes back
+    with a value no process has seen, never an old one
+    """
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.add(key, version, timeout=None)
+        version = cache.get(key, version)
+    return version
+
+
+def bump(key: str) -> None:
+    # set, not incr -> BaseCache.incr writes the key back with the default timeout
+    cache.set(key, time.time_ns(), timeout=None)
@@ -1,8 +1,18 @@
 from django.contrib import admin
-from .models import Leave
+from .models import (
+    Leave,
+    LeaveArchive,
+    LeaveBalance,
+    LeaveNotification,
+    LeaveRollup,
+)
 
 # from .models import Comment
 
 
 admin.site.register(Leave)
+admin.site.register(LeaveBalance)
+admin.site.register(LeaveArchive)
+admin.site.register(LeaveNotification)
+admin.site.register(LeaveRollup)
 # admin.site.register(Comment)
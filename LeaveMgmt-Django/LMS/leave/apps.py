@@ -3,3 +3,18 @@ from django.apps import AppConfig
 
 class LeaveConfig(AppConfig):
     name = "leave"
+
+    def ready(self):
+        # leave, balance and employee writes expire the cached dashboard summaries
+        from django.db.models.signals import post_delete, post_save, pre_delete
+        from employee.models import Employee
+
+        from .models import Leave, LeaveBalance
+        from .summary import invalidate
+
+        for model in (Leave, LeaveBalance, Employee):
+            post_save.connect(invalidate, sender=model, dispatch_uid="summary")
+            post_delete.connect(invalidate, sender=model, dispatch_uid="summary")
+
+        # deleted leaves leave the rollups, archived ones are kept there
+        pre_delete.connect(Leave.forget_deleted, sender=Leave, dispatch_uid="rollup")
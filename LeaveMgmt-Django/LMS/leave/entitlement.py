@@ -0,0 +1,186 @@
+import datetime
+from typing import Dict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import (
+    Case,
+    CharField,
+    DateTimeField,
+    F,
+    FloatField,
+    IntegerField,
+    Max,
+    OuterRef,
+    Q,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, Round
+from django.utils import timezone
+from employee.models import Employee
+
+from . import summary
+from .models import DAYS, LEAVE_TYPE, CASUAL, LeaveBalance
+
+# share of the full entitlement per Employee.employeetype
+EMPLOYEETYPE_FACTORS = {
+    Employee.FULL_TIME: 1.0,
+    Employee.PART_TIME: 0.5,
+    Employee.CONTRACT: 1.0,
+    Employee.INTERN: 0.5,
+}
+
+# unused days a leave type may take into the next year, types not listed carry nothing
+CARRY_FORWARD = {CASUAL: 5}
+
+
+def get_employeetype_factors() -> Dict[str, float]:
+    return getattr(settings, "LEAVE_EMPLOYEETYPE_FACTORS", EMPLOYEETYPE_FACTORS)
+
+
+def get_carry_forward() -> Dict[str, int]:
+    return getattr(settings, "LEAVE_CARRY_FORWARD", CARRY_FORWARD)
+
+
+def get_entitlements() -> Dict[str, int]:
+    """
+    full yearly days per leave type, settings.LEAVE_ENTITLEMENTS overrides DAYS
+    """
+    entitlements = {leavetype: DAYS for leavetype, name in LEAVE_TYPE}
+    entitlements.update(getattr(settings, "LEAVE_ENTITLEMENTS", {}))
+    return entitlements
+
+
+def share(year: int):
+    """
+    expression on Employee -> part of the full entitlement for year
+    share = employeetype factor * months employed in year / 12, employees starting
+    during the year accrue from their start month, later starters get nothing
+    """
+    first_day = datetime.date(year, 1, 1)
+    factor = Case(
+        *(
+            When(employeetype=employeetype, then=Value(value))
+            for employeetype, value in get_employeetype_factors().items()
+        ),
+        default=Value(1.0),
+        output_field=FloatField(),
+    )
+    months = Case(
+        When(Q(startdate__isnull=True) | Q(startdate__lt=first_day), then=Value(12)),
+        When(startdate__year=year, then=Value(13) - F("startdate__month")),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    return factor * months / Value(12.0)
+
+
+def employee_shares(year: int):
+    """
+    Employee queryset annotated with share(year)
+    one row per user, the latest active employee record
+    """
+    latest = (
+        Employee.objects.order_by()
+        .values("user_id")
+        .annotate(latest=Max("id"))
+        .values("latest")
+    )
+    return Employee.objects.filter(id__in=latest).order_by().annotate(share=share(year))
+
+
+def carried_days(year: int, leavetype: str):
+    """
+    days of leavetype each user carries out of year, a correlated lookup on the
+    ledger's unique key -> unused days = entitled + carried - used, capped
+    users without a ledger row for year carry their year's entitlement, capped
+    """
+    cap = get_carry_forward().get(leavetype, 0)
+    if cap <= 0:
+        return Value(0)
+    unused = (
+        LeaveBalance.objects.filter(
+            user_id=OuterRef("user_id"), year=year, leavetype=leavetype
+        )
+        .order_by()
+        .annotate(
+            carry=Least(
+                Greatest(F("entitled") + F("carried") - F("used"), Value(0)),
+                Value(cap),
+            )
+        )
+        .values("carry")
+    )
+    # no ledger row -> nothing was booked in year, the whole entitlement is unused
+    entitled = Cast(Round(share(year) * get_entitlements()[leavetype]), IntegerField())
+    return Coalesce(Subquery(unused), Least(entitled, Value(cap)))
+
+
+def rollover(year: int, dry_run: bool = False) -> int:
+    """
+    closes year -> writes entitled and carried days of year + 1 for every active
+    employee and leave type into the LeaveBalance ledger, used days are kept
+    one INSERT .. SELECT .. ON CONFLICT statement per leave type, no rows go
+    through python; returns the number of ledger rows written
+    """
+    next_year = year + 1
+    employees = employee_shares(next_year)
+    if dry_run:
+        return employees.count() * len(get_entitlements())
+
+    table = LeaveBalance._meta.db_table
+    quote = connection.ops.quote_name
+    columns = ", ".join(
+        quote(LeaveBalance._meta.get_field(name).column)
+        for name in (
+            "user",
+            "year",
+            "leavetype",
+            "entitled",
+            "carried",
+            "used",
+            "updated",
+        )
+    )
+    written = 0
+    now = timezone.now()
+    with connection.cursor() as cursor:
+        for leavetype, days in get_entitlements().items():
+            # annotations are selected in the order they are added -> matches columns
+            rows = employees.annotate(
+                new_year=Value(next_year, output_field=IntegerField()),
+                new_leavetype=Value(leavetype, output_field=CharField()),
+                new_entitled=Cast(Round(F("share") * days), IntegerField()),
+                new_carried=carried_days(year, leavetype),
+                new_used=Value(0, output_field=IntegerField()),
+                new_updated=Value(now, output_field=DateTimeField()),
+            ).values_list(
+                "user_id",
+                "new_year",
+                "new_leavetype",
+                "new_entitled",
+                "new_carried",
+                "new_used",
+                "new_updated",
+            )
+            select, params = rows.query.sql_with_params()
+            cursor.execute(
+                "INSERT INTO {0} ({1}) {2} "
+                "ON CONFLICT ({3}, {4}, {5}) DO UPDATE SET "
+                "{6} = EXCLUDED.{6}, {7} = EXCLUDED.{7}".format(
+                    quote(table),
+                    columns,
+                    select,
+                    quote("user_id"),
+                    quote("year"),
+                    quote("leavetype"),
+                    quote("entitled"),
+                    quote("carried"),
+                ),
+                params,
+            )
+            written += cursor.rowcount
+    summary.invalidate()
+    return written
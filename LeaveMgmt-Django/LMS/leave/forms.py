@@ -1,5 +1,7 @@
 from django import forms
 from .models import Leave
+from .quota import get_quota
+from .utility import working_days
 import datetime
 from typing import Any
 
@@ -26,6 +28,11 @@ class LeaveCreationForm(forms.ModelForm):
             "created",
         ]
 
+    def __init__(self, *args, user=None, **kwargs):
+        # user is optional, when given the request is checked against the balance ledger
+        self.user = user
+        super().__init__(*args, **kwargs)
+
     # Clean (validate) the 'enddate' field
     def clean_enddate(self) -> Any:
         # Grab the 'enddate' and 'startdate' fields from the cleaned data
@@ -43,3 +50,36 @@ class LeaveCreationForm(forms.ModelForm):
             raise forms.ValidationError("Selected dates are wrong")
         # If everything checks out, return the end date as it is.
         return enddate
+
+    # Check the request against the user's booked leaves and remaining balance
+    def clean(self) -> Any:
+        cleaned_data = super().clean()
+        startdate = cleaned_data.get("startdate")
+        enddate = cleaned_data.get("enddate")
+        leavetype = cleaned_data.get("leavetype")
+
+        if self.user is None or self.errors or not (startdate and enddate):
+            return cleaned_data
+
+        if Leave.objects.overlapping(self.user, startdate, enddate).exists():
+            raise forms.ValidationError(
+                "You already have a leave booked within the selected dates"
+            )
+
+        quota = get_quota(self.user, startdate.year)
+        if not quota.can_apply():
+            raise forms.ValidationError(
+                "You have reached the limit of {0} leave requests for {1}".format(
+                    quota.total_requests, startdate.year
+                )
+            )
+
+        # approved days from the ledger, pending requests still hold theirs
+        remaining = quota.days_left(leavetype)
+        if working_days(startdate, enddate) > remaining:
+            raise forms.ValidationError(
+                "Not enough leave days left, {0} day(s) remaining".format(
+                    max(remaining, 0)
+                )
+            )
+        return cleaned_data
@@ -1,5 +1,68 @@
-from django.db import models
+from collections import defaultdict
+from contextvars import ContextVar
+from django.db import IntegrityError, connection, models, transaction
+from django.utils import timezone
+from . import summary
+from .utility import bulk_working_days, occupancy_counts
 import datetime
+import itertools
+
+# years kept in the hot leave table -> current and previous year, older ones are archived
+HOT_YEARS = 2
+
+# columns copied from Leave into LeaveArchive, the archive keeps the leave id
+ARCHIVE_FIELDS = (
+    "id",
+    "user_id",
+    "startdate",
+    "enddate",
+    "leavetype",
+    "reason",
+    "defaultdays",
+    "status",
+    "is_approved",
+    "updated",
+    "created",
+)
+
+# True while archive_batch deletes moved rows -> archived leaves keep their rollup counts
+archiving = ContextVar("archiving", default=False)
+
+# statuses that hold the dates of a leave, cancelled and rejected leaves free them
+ACTIVE_STATUSES = ("pending", "approved")
+
+# target status -> statuses a leave may move from, same rules as the Leave properties
+TRANSITIONS = {
+    "approved": ("pending", "cancelled", "rejected"),
+    "rejected": ("pending", "approved", "cancelled"),
+    "cancelled": ("pending", "approved", "rejected"),
+    "pending": ("approved", "cancelled", "rejected"),
+}
+
+
+def employee_field(field: str, user: str = "user") -> models.Subquery:
+    """
+    field of the user's active employee record, the one Employee.objects.for_user
+    picks -> annotating it keeps one row per leave where a user__employee join
+    repeats the leave for every record of the user, deleted ones included
+    """
+    from employee.models import Employee
+
+    return models.Subquery(
+        Employee.objects.filter(user=models.OuterRef(user)).values(field)[:1]
+    )
+
+
+def ensure_archive_partition(year: int) -> None:
+    # postgres keeps one archive partition per year of startdate
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS leave_leavearchive_{0} "
+            "PARTITION OF leave_leavearchive "
+            "FOR VALUES FROM ('{0}-01-01') TO ('{1}-01-01')".format(year, year + 1)
+        )
 
 
 class LeaveManager(models.Manager):
@@ -10,6 +73,299 @@ class LeaveManager(models.Manager):
         """
         return super().get_queryset()
 
+    def transition(self, pk, from_status, to_status) -> bool:
+        """
+        compare and set -> UPDATE leave SET status, is_approved, updated
+        WHERE id = pk AND status = from_status
+        returns True when this call made the change, False if the row moved on
+        """
+        updated = (
+            super()
+            .get_queryset()
+            .filter(pk=pk, status=from_status)
+            .update(
+                status=to_status,
+                is_approved=to_status == "approved",
+                updated=timezone.now(),
+            )
+        )
+        return updated == 1
+
+    def bulk_transition(self, ids, to_status):
+        """
+        moves every leave in ids that may go to to_status with one conditional
+        UPDATE per old status and books the balance deltas in the same transaction
+        returns {id: "updated" | "skipped" | "not found"}
+        """
+        from .models import LeaveBalance, LeaveNotification, LeaveRollup
+
+        allowed = TRANSITIONS[to_status]
+        with transaction.atomic():
+            rows = list(
+                super()
+                .get_queryset()
+                .select_for_update()
+                .filter(pk__in=ids)
+                .order_by()
+                .values_list(
+                    "id", "status", "user_id", "leavetype", "startdate", "enddate"
+                )
+            )
+            candidates = self.without_overlaps(
+                [row for row in rows if row[1] in allowed], to_status
+            )
+            moving = []
+            now = timezone.now()
+            by_status = defaultdict(list)
+            for row in candidates:
+                by_status[row[1]].append(row)
+            for old_status, group in by_status.items():
+                moving += self._move(group, old_status, to_status, now)
+            if moving:
+                LeaveBalance.objects.record_transitions(
+                    [row[1:] for row in moving], to_status
+                )
+                LeaveRollup.objects.record_transitions(
+                    [row[1:] for row in moving], to_status
+                )
+                LeaveNotification.objects.queue_transitions(
+                    [(row[0], row[2], row[3], row[4], row[5]) for row in moving],
+                    to_status,
+                )
+                summary.invalidate()
+
+        results = {pk: "not found" for pk in ids}
+        results.update({row[0]: "skipped" for row in rows})
+        results.update({row[0]: "updated" for row in moving})
+        return results
+
+    def _move(self, group, old_status, to_status, now):
+        """
+        compare and set of rows read with old_status -> the rows this call moved
+        select_for_update does not lock on sqlite, another request may have
+        moved some, on postgres a concurrent booking may hold their dates
+        """
+        pks = [row[0] for row in group]
+        try:
+            with transaction.atomic():
+                moved = (
+                    super()
+                    .get_queryset()
+                    .filter(pk__in=pks, status=old_status)
+                    .update(
+                        status=to_status,
+                        is_approved=to_status == "approved",
+                        updated=now,
+                    )
+                )
+        except IntegrityError:
+            # exclusion constraint -> row by row, the overlapping ones are skipped
+            if len(group) == 1:
+                return []
+            return [
+                row
+                for part in group
+                for row in self._move([part], old_status, to_status, now)
+            ]
+        if moved == len(group):
+            return group
+        won = set(
+            super()
+            .get_queryset()
+            .filter(pk__in=pks, status=to_status, updated=now)
+            .values_list("id", flat=True)
+        )
+        return [row for row in group if row[0] in won]
+
+    def conflicting(self):
+        """
+        ids of active leaves the no overlap constraint would reject, oldest kept:
+        reversed dates, then per user every leave sharing a day with one kept
+        before it (approved ones are kept first)
+        """
+        rows = (
+            super()
+            .get_queryset()
+            .filter(status__in=ACTIVE_STATUSES)
+            .exclude(startdate=None)
+            .exclude(enddate=None)
+            .order_by("user_id", "-is_approved", "id")
+            .values_list("id", "user_id", "startdate", "enddate")
+        )
+        conflicting, kept = [], defaultdict(list)
+        for pk, user_id, startdate, enddate in rows.iterator():
+            if startdate == enddate:
+                continue  # empty range -> overlaps nothing
+            if startdate > enddate or any(
+                startdate < end and enddate > start for start, end in kept[user_id]
+            ):
+                conflicting.append(pk)
+            else:
+                kept[user_id].append((startdate, enddate))
+        return conflicting
+
+    def without_overlaps(self, rows, to_status):
+        """
+        drops rows (id, status, user_id, ...) that would book dates already taken
+        only cancelled/rejected rows moving to pending/approved take dates again,
+        they are checked against booked leaves and the rows kept before them
+        """
+        if to_status not in ACTIVE_STATUSES:
+            return rows
+        kept, booked = [], defaultdict(list)
+        for row in rows:
+            pk, status, user_id, _, startdate, enddate = row
+            if status not in ACTIVE_STATUSES and startdate and enddate:
+                if any(
+                    startdate < end and enddate > start
+                    for start, end in booked[user_id]
+                ) or (
+                    self.overlapping(user_id, startdate, enddate)
+                    .exclude(pk=pk)
+                    .exists()
+                ):
+                    continue
+                booked[user_id].append((startdate, enddate))
+            kept.append(row)
+        return kept
+
+    def overlapping(self, user, startdate, enddate):
+        """
+        active leaves of user that share a day with [startdate, enddate)
+        enddate is the day back at work -> Leave.objects.overlapping(user, start, end).exists()
+        """
+        return (
+            super()
+            .get_queryset()
+            .filter(
+                user=user,
+                startdate__lt=enddate,
+                enddate__gt=startdate,
+                status__in=ACTIVE_STATUSES,
+            )
+            .order_by()
+        )
+
+    def occupancy(self, first_day, last_day, department=None):
+        """
+        number of people on approved leave for each day from first_day to last_day
+        department -> only employees of that department, None -> whole company
+        """
+        leaves = self.approved_between(first_day, last_day)
+        if department is not None:
+            leaves = leaves.alias(department=employee_field("department")).filter(
+                department=department
+            )
+        starts = list(leaves.values_list("startdate").annotate(n=models.Count("id")))
+        ends = list(leaves.values_list("enddate").annotate(n=models.Count("id")))
+        return self._sweep(starts, ends, first_day, last_day)
+
+    def occupancy_by_department(self, first_day, last_day):
+        """
+        {department_id: daily counts} grouped through Leave.user -> Employee.department
+        """
+        leaves = self.approved_between(first_day, last_day).annotate(
+            department=employee_field("department")
+        )
+        grouped = defaultdict(lambda: ([], []))
+        for position, field in enumerate(("startdate", "enddate")):
+            rows = leaves.values_list("department", field).annotate(
+                n=models.Count("id")
+            )
+            for department_id, day, count in rows:
+                grouped[department_id][position].append((day, count))
+        return {
+            department_id: self._sweep(starts, ends, first_day, last_day)
+            for department_id, (starts, ends) in grouped.items()
+        }
+
+    def _sweep(self, starts, ends, first_day, last_day):
+        # starts/ends -> (date, number of leaves) rows grouped by the database
+        startdates, start_weights = zip(*starts) if starts else ((), ())
+        enddates, end_weights = zip(*ends) if ends else ((), ())
+        return occupancy_counts(
+            startdates, enddates, first_day, last_day, start_weights, end_weights
+        ).tolist()
+
+    def approved_between(self, first_day, last_day):
+        """
+        approved leaves with at least one day out between first_day and last_day
+        """
+        return (
+            super()
+            .get_queryset()
+            .filter(
+                status="approved",
+                startdate__lte=last_day,
+                enddate__gt=first_day,
+            )
+            .order_by()
+        )
+
+    def hot_cutoff(self) -> datetime.date:
+        """
+        first day kept in the hot table, leaves that ended before it belong in the archive
+        """
+        return datetime.date(datetime.date.today().year - HOT_YEARS + 1, 1, 1)
+
+    def archive_batch(self, leaves, batch_size: int = 1000) -> int:
+        """
+        moves the first batch_size leaves of a queryset to LeaveArchive in one
+        transaction, returns the number moved -> call until it returns 0
+        """
+        from .models import LeaveArchive
+
+        with transaction.atomic():
+            batch = list(
+                leaves.order_by("id")
+                .select_for_update()
+                .values(*ARCHIVE_FIELDS)[:batch_size]
+            )
+            if not batch:
+                return 0
+            for year in {row["startdate"].year for row in batch if row["startdate"]}:
+                ensure_archive_partition(year)
+            LeaveArchive.objects.bulk_create([LeaveArchive(**row) for row in batch])
+            token = archiving.set(True)
+            try:
+                super().get_queryset().filter(
+                    id__in=[row["id"] for row in batch]
+                ).delete()
+            finally:
+                archiving.reset(token)
+            summary.invalidate()
+        return len(batch)
+
+    def history(self, *fields, **filters):
+        """
+        hot and archived leaves together as values rows
+        Leave.objects.history("id", "status", "startdate", user=user)
+        """
+        from .models import LeaveArchive
+
+        fields = fields or ("id", "user", "startdate", "enddate", "leavetype", "status")
+        hot = super().get_queryset().filter(**filters).order_by().values(*fields)
+        cold = LeaveArchive.objects.filter(**filters).order_by().values(*fields)
+        return hot.union(cold, all=True)
+
+    def filtered(self, status=None, start=None, end=None, department=None):
+        """
+        leaves by status and startdate range (inclusive), optionally one department
+        -> Leave.objects.filtered("approved", date(2023, 1, 1), date(2023, 12, 31))
+        """
+        leaves = super().get_queryset()
+        if status:
+            leaves = leaves.filter(status=status)
+        if start:
+            leaves = leaves.filter(startdate__gte=start)
+        if end:
+            leaves = leaves.filter(startdate__lte=end)
+        if department:
+            leaves = leaves.alias(department=employee_field("department")).filter(
+                department=department
+            )
+        return leaves
+
     def all_pending_leaves(self):
         """
         gets all pending leaves -> Leave.objects.all_pending_leaves()
@@ -38,3 +394,284 @@ class LeaveManager(models.Manager):
 
         """
         return super().get_queryset().filter(startdate__year=datetime.date.today().year)
+
+
+class LeaveBalanceManager(models.Manager):
+    def record(self, user_id, year, leavetype, days):
+        """
+        adds days (negative to give back) to the ledger row -> LeaveBalance.objects.record(...)
+        call inside the transaction that changes the leave status
+        """
+        if not days or year is None:
+            return
+        balance, created = self.get_or_create(
+            user_id=user_id, year=year, leavetype=leavetype
+        )
+        self.filter(pk=balance.pk).update(used=models.F("used") + days)
+
+    def record_transition(self, leave, old_status, new_status):
+        """
+        only approved leaves consume days, so only moves into or out of approved count
+        """
+        if (old_status == "approved") == (new_status == "approved"):
+            return
+        days = leave.leave_days if leave.startdate and leave.enddate else 0
+        if old_status == "approved":
+            days = -days
+        year = leave.startdate.year if leave.startdate else None
+        self.record(leave.user_id, year, leave.leavetype, days)
+
+    def record_transitions(self, rows, to_status):
+        """
+        rows -> (old_status, user_id, leavetype, startdate, enddate) of leaves moved to
+        to_status, deltas are summed per ledger row before writing
+        """
+        flipped = [
+            row
+            for row in rows
+            if (row[0] == "approved") != (to_status == "approved") and row[3] and row[4]
+        ]
+        if not flipped:
+            return
+        old_statuses, user_ids, leavetypes, startdates, enddates = zip(*flipped)
+        sign = 1 if to_status == "approved" else -1
+
+        deltas = defaultdict(int)
+        days = bulk_working_days(startdates, enddates).tolist()
+        for user_id, leavetype, startdate, count in zip(
+            user_ids, leavetypes, startdates, days
+        ):
+            deltas[(user_id, startdate.year, leavetype)] += sign * count
+        for (user_id, year, leavetype), count in deltas.items():
+            self.record(user_id, year, leavetype, count)
+
+    def for_user(self, user, year=None):
+        """
+        ledger rows of a user for a year (default current year)
+        """
+        year = year or datetime.date.today().year
+        return super().get_queryset().filter(user=user, year=year)
+
+    def remaining(self, user, year, leavetype) -> int:
+        """
+        days left for (user, year, leavetype) -> one lookup on the unique key
+        """
+        balance = (
+            super()
+            .get_queryset()
+            .filter(user=user, year=year, leavetype=leavetype)
+            .values_list("entitled", "carried", "used")
+            .first()
+        )
+        if balance is None:
+            return self.model._meta.get_field("entitled").default
+        entitled, carried, used = balance
+        return entitled + carried - used
+
+
+class LeaveNotificationManager(models.Manager):
+    def queue_transitions(self, rows, to_status):
+        """
+        rows -> (leave_id, user_id, leavetype, startdate, enddate) of leaves moved to
+        to_status, one outbox row per leave whose user has an email address
+        call inside the transaction that changes the leave status, the
+        send_notifications command delivers them later
+        """
+        from django.contrib.auth.models import User
+
+        rows = list(rows)
+        emails = dict(
+            User.objects.filter(pk__in={row[1] for row in rows})
+            .exclude(email="")
+            .values_list("id", "email")
+        )
+        self.bulk_create(
+            [
+                self.model(
+                    leave_id=leave_id,
+                    recipient=emails[user_id],
+                    subject="Your {0} leave is {1}".format(leavetype, to_status),
+                    body=(
+                        "Your {0} leave from {1} to {2} is now {3}.".format(
+                            leavetype, startdate, enddate, to_status
+                        )
+                    ),
+                )
+                for leave_id, user_id, leavetype, startdate, enddate in rows
+                if user_id in emails
+            ]
+        )
+
+    def due(self, now=None):
+        """
+        queued notifications whose next attempt is due, oldest first
+        sending ones are claimed by a worker until next_attempt -> due again once
+        that claim ran out, the worker died before recording the result
+        """
+        return (
+            super()
+            .get_queryset()
+            .filter(
+                status__in=("queued", "sending"),
+                next_attempt__lte=now or timezone.now(),
+            )
+            .order_by("next_attempt", "id")
+        )
+
+
+class LeaveRollupManager(models.Manager):
+    def record(self, rows, sign=1):
+        """
+        rows -> (status, user_id, leavetype, startdate, enddate) of leaves added
+        (sign=1) or taken away (sign=-1), summed per rollup row before writing
+        a leave counts in the month of its startdate, department is the user's current one
+        call inside the transaction that writes the leave
+        """
+        rows = [row for row in rows if row[3] and row[4]]
+        if not rows:
+            return
+        from employee.models import Employee
+
+        departments = {
+            user_id: employee.department_id
+            for user_id, employee in Employee.objects.for_users(
+                {row[1] for row in rows}
+            ).items()
+        }
+        statuses, user_ids, leavetypes, startdates, enddates = zip(*rows)
+        days = bulk_working_days(startdates, enddates).tolist()
+
+        deltas = defaultdict(lambda: [0, 0])
+        for status, user_id, leavetype, startdate, count in zip(
+            statuses, user_ids, leavetypes, startdates, days
+        ):
+            key = (
+                startdate.year,
+                startdate.month,
+                departments.get(user_id),
+                leavetype,
+                status,
+            )
+            deltas[key][0] += sign
+            deltas[key][1] += sign * count
+
+        for (year, month, department_id, leavetype, status), (
+            leaves,
+            count,
+        ) in deltas.items():
+            rollup, created = self.get_or_create(
+                year=year,
+                month=month,
+                department_id=department_id,
+                leavetype=leavetype,
+                status=status,
+            )
+            self.filter(pk=rollup.pk).update(
+                leaves=models.F("leaves") + leaves, days=models.F("days") + count
+            )
+
+    def record_transitions(self, rows, to_status):
+        """
+        rows -> (old_status, user_id, leavetype, startdate, enddate) of leaves moved
+        to to_status, each leave leaves its old status bucket for the new one
+        """
+        rows = list(rows)
+        self.record(rows, sign=-1)
+        self.record([(to_status,) + tuple(row[1:]) for row in rows])
+
+    def rebuild(self, chunk_size=2000) -> int:
+        """
+        recomputes every rollup row from the leave table and the archive
+        returns the number of rollup rows written
+        """
+        from .models import Leave, LeaveArchive
+
+        # the database groups identical date ranges, numpy counts the working days
+        totals = defaultdict(lambda: [0, 0])
+        for model in (Leave, LeaveArchive):
+            rows = (
+                model.objects.filter(startdate__isnull=False, enddate__isnull=False)
+                .annotate(department=employee_field("department"))
+                .order_by()
+                .values_list(
+                    "startdate",
+                    "enddate",
+                    "department",
+                    "leavetype",
+                    "status",
+                )
+                .annotate(n=models.Count("id"))
+                .iterator(chunk_size=chunk_size)
+            )
+            while True:
+                chunk = list(itertools.islice(rows, chunk_size))
+                if not chunk:
+                    break
+                startdates, enddates = zip(*((row[0], row[1]) for row in chunk))
+                days = bulk_working_days(startdates, enddates).tolist()
+                for (
+                    startdate,
+                    enddate,
+                    department_id,
+                    leavetype,
+                    status,
+                    n,
+                ), count in zip(chunk, days):
+                    key = (
+                        startdate.year,
+                        startdate.month,
+                        department_id,
+                        leavetype,
+                        status,
+                    )
+                    totals[key][0] += n
+                    totals[key][1] += n * count
+
+        with transaction.atomic():
+            super().get_queryset().delete()
+            self.bulk_create(
+                [
+                    self.model(
+                        year=year,
+                        month=month,
+                        department_id=department_id,
+                        leavetype=leavetype,
+                        status=status,
+                        leaves=leaves,
+                        days=count,
+                    )
+                    for (year, month, department_id, leavetype, status), (
+                        leaves,
+                        count,
+                    ) in totals.items()
+                ],
+                batch_size=chunk_size,
+            )
+        return len(totals)
+
+    def chart(self, year, department=None):
+        """
+        {"months": [1..12], "statuses": {status: leaves per month},
+        "leavetypes": {leavetype: leaves per month}, "days": working days per month}
+        read from the rollup rows of one year only
+        """
+        rollups = super().get_queryset().filter(year=year)
+        if department is not None:
+            rollups = rollups.filter(department=department)
+
+        statuses = defaultdict(lambda: [0] * 12)
+        leavetypes = defaultdict(lambda: [0] * 12)
+        days = [0] * 12
+        for month, leavetype, status, leaves, count in rollups.values_list(
+            "month", "leavetype", "status", "leaves", "days"
+        ):
+            statuses[status][month - 1] += leaves
+            leavetypes[leavetype][month - 1] += leaves
+            days[month - 1] += count
+        return {
+            "year": year,
+            "months": list(range(1, 13)),
+            "statuses": dict(statuses),
+            "leavetypes": dict(leavetypes),
+            "days": days,
+        }
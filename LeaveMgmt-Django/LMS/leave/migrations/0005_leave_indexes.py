@@ -0,0 +1,40 @@
+# Generated by Django 4.2.3 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("leave", "0004_alter_leave_leavetype"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["-created"],
+                name="leave_pending_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(
+                fields=["status", "-created"], name="leave_status_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(fields=["startdate"], name="leave_startdate_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(
+                fields=["user", "-created"], name="leave_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(fields=["user", "status"], name="leave_user_status_idx"),
+        ),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.3 on 2026-10-18 12:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("leave", "0005_leave_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaveBalance",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField(verbose_name="Year")),
+                (
+                    "leavetype",
+                    models.CharField(
+                        choices=[
+                            ("sick", "Sick Leave"),
+                            ("casual", "Casual Leave"),
+                            ("emergency", "Emergency Leave"),
+                            ("study", "Study Leave"),
+                            ("maternity", "Maternity Leave"),
+                        ],
+                        default="sick",
+                        max_length=25,
+                    ),
+                ),
+                (
+                    "entitled",
+                    models.PositiveIntegerField(
+                        default=30, verbose_name="Leave days per year"
+                    ),
+                ),
+                (
+                    "used",
+                    models.IntegerField(default=0, verbose_name="Approved leave days"),
+                ),
+                ("updated", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Leave Balance",
+                "verbose_name_plural": "Leave Balances",
+                "ordering": ["-year", "leavetype"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="leavebalance",
+            constraint=models.UniqueConstraint(
+                fields=("user", "year", "leavetype"), name="leave_balance_unique"
+            ),
+        ),
+    ]
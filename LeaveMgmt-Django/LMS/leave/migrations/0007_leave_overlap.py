@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 12:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("leave", "0006_leavebalance"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(
+                fields=["user", "startdate", "enddate"], name="leave_user_dates_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.3 on 2026-10-18 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("leave", "0007_leave_overlap"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(
+                fields=["status", "startdate", "enddate"], name="leave_status_dates_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.3 on 2026-10-18 12:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("leave", "0008_leave_status_dates_idx"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="leave",
+            name="leave_pending_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="leave",
+            name="leave_status_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="leave",
+            name="leave_user_created_idx",
+        ),
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["-created", "-id"],
+                name="leave_pending_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(
+                fields=["status", "-created", "-id"], name="leave_status_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="leave",
+            index=models.Index(
+                fields=["user", "-created", "-id"], name="leave_user_created_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 4.2.3 on 2026-10-18 12:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def partition_archive_by_year(apps, schema_editor):
+    # postgres only -> rebuild the archive as a table partitioned by startdate,
+    # archive_leaves adds one partition per year, rows without dates go to default
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP TABLE leave_leavearchive")
+    schema_editor.execute(
+        """
+        CREATE TABLE leave_leavearchive (
+            id integer NOT NULL,
+            startdate date NULL,
+            enddate date NULL,
+            leavetype varchar(25) NULL,
+            reason varchar(255) NULL,
+            defaultdays integer NULL CHECK (defaultdays >= 0),
+            status varchar(12) NOT NULL,
+            is_approved boolean NOT NULL,
+            updated timestamp with time zone NOT NULL,
+            created timestamp with time zone NOT NULL,
+            archived timestamp with time zone NOT NULL,
+            user_id integer NOT NULL REFERENCES auth_user (id)
+                DEFERRABLE INITIALLY DEFERRED
+        ) PARTITION BY RANGE (startdate)
+        """
+    )
+    schema_editor.execute(
+        "CREATE TABLE leave_leavearchive_default "
+        "PARTITION OF leave_leavearchive DEFAULT"
+    )
+    schema_editor.execute("CREATE INDEX leavearchive_id ON leave_leavearchive (id)")
+    schema_editor.execute(
+        "CREATE INDEX leavearchive_user_start_idx "
+        "ON leave_leavearchive (user_id, startdate)"
+    )
+    schema_editor.execute(
+        "CREATE INDEX leavearchive_status_idx ON leave_leavearchive (status, startdate)"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("leave", "0009_leave_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaveArchive",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False)),
+                ("startdate", models.DateField(null=True, verbose_name="Start Date")),
+                ("enddate", models.DateField(null=True, verbose_name="End Date")),
+                (
+                    "leavetype",
+                    models.CharField(
+                        choices=[
+                            ("sick", "Sick Leave"),
+                            ("casual", "Casual Leave"),
+                            ("emergency", "Emergency Leave"),
+                            ("study", "Study Leave"),
+                            ("maternity", "Maternity Leave"),
+                        ],
+                        max_length=25,
+                        null=True,
+                    ),
+                ),
+                ("reason", models.CharField(blank=True, max_length=255, null=True)),
+                ("defaultdays", models.PositiveIntegerField(blank=True, null=True)),
+                ("status", models.CharField(max_length=12)),
+                ("is_approved", models.BooleanField(default=False)),
+                ("updated", models.DateTimeField()),
+                ("created", models.DateTimeField()),
+                ("archived", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived Leave",
+                "verbose_name_plural": "Archived Leaves",
+                "ordering": ["-created"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "startdate"], name="leavearchive_user_start_idx"
+                    ),
+                    models.Index(
+                        fields=["status", "startdate"], name="leavearchive_status_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(partition_archive_by_year, migrations.RunPython.noop),
+    ]
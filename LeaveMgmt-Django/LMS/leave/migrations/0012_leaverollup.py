@@ -0,0 +1,76 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("employee", "0002_auto_20200904_1545"),
+        ("leave", "0011_leavenotification"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaveRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField(verbose_name="Year")),
+                ("month", models.PositiveSmallIntegerField(verbose_name="Month")),
+                (
+                    "leavetype",
+                    models.CharField(
+                        choices=[
+                            ("sick", "Sick Leave"),
+                            ("casual", "Casual Leave"),
+                            ("emergency", "Emergency Leave"),
+                            ("study", "Study Leave"),
+                            ("maternity", "Maternity Leave"),
+                        ],
+                        max_length=25,
+                        null=True,
+                    ),
+                ),
+                ("status", models.CharField(max_length=12)),
+                ("leaves", models.IntegerField(default=0, verbose_name="Leaves")),
+                ("days", models.IntegerField(default=0, verbose_name="Working days")),
+                (
+                    "department",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="employee.department",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Leave Rollup",
+                "verbose_name_plural": "Leave Rollups",
+                "ordering": ["-year", "-month"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="leaverollup",
+            constraint=models.UniqueConstraint(
+                fields=("year", "month", "department", "leavetype", "status"),
+                name="leave_rollup_unique",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="leaverollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("department__isnull", True)),
+                fields=("year", "month", "leavetype", "status"),
+                name="leave_rollup_unassigned_unique",
+            ),
+        ),
+    ]
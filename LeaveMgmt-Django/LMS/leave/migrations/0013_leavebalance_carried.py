@@ -0,0 +1,19 @@
+# Generated by Django 4.2.3 on 2026-10-18 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("leave", "0012_leaverollup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="leavebalance",
+            name="carried",
+            field=models.IntegerField(
+                default=0, verbose_name="Days carried from last year"
+            ),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:02
+
+from django.db import migrations
+
+ACTIVE_STATUSES = ("pending", "approved")
+
+
+def conflicting(Leave):
+    # frozen copy of LeaveManager.conflicting
+    rows = (
+        Leave.objects.filter(status__in=ACTIVE_STATUSES)
+        .exclude(startdate=None)
+        .exclude(enddate=None)
+        .order_by("user_id", "-is_approved", "id")
+        .values_list("id", "user_id", "startdate", "enddate")
+    )
+    ids, kept = [], {}
+    for pk, user_id, startdate, enddate in rows.iterator():
+        if startdate == enddate:
+            continue
+        ranges = kept.setdefault(user_id, [])
+        if startdate > enddate or any(
+            startdate < end and enddate > start for start, end in ranges
+        ):
+            ids.append(pk)
+        else:
+            ranges.append((startdate, enddate))
+    return ids
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    """
+    postgres only -> sqlite relies on leave_user_dates_idx and the form check
+    existing rows are checked by ADD CONSTRAINT, overlaps were never blocked
+    before -> stops with the ids instead of changing leaves behind the ledger
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_constraint WHERE conname = 'leave_no_overlap_excl'"
+        )
+        if cursor.fetchone():
+            return
+    ids = conflicting(apps.get_model("leave", "Leave"))
+    if ids:
+        raise RuntimeError(
+            "{0} active leaves overlap another leave of their user or end before "
+            "they start, first ids: {1}. 'python manage.py resolve_leave_overlaps "
+            "--dry-run' lists them all, run it without --dry-run to cancel them "
+            "and migrate again.".format(len(ids), ", ".join(map(str, ids[:50])))
+        )
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+    schema_editor.execute(
+        "ALTER TABLE leave_leave ADD CONSTRAINT leave_no_overlap_excl "
+        "EXCLUDE USING gist "
+        "(user_id WITH =, daterange(startdate, enddate, '[)') WITH &&) "
+        "WHERE (status IN ('pending', 'approved') "
+        "AND startdate IS NOT NULL AND enddate IS NOT NULL)"
+    )
+
+
+def remove_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "ALTER TABLE leave_leave DROP CONSTRAINT IF EXISTS leave_no_overlap_excl"
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("leave", "0013_leavebalance_carried"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_exclusion_constraint, remove_exclusion_constraint),
+    ]
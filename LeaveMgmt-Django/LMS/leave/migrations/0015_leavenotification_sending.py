@@ -0,0 +1,26 @@
+# Generated by Django 4.2.3 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("leave", "0014_leave_no_overlap"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="leavenotification",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Queued"),
+                    ("sending", "Sending"),
+                    ("sent", "Sent"),
+                    ("failed", "Failed"),
+                ],
+                default="queued",
+                max_length=12,
+            ),
+        ),
+    ]
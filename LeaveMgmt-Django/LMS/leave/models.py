@@ -1,7 +1,17 @@
-from django.db import models
-from .manager import LeaveManager
+from django.db import IntegrityError, models, transaction
+from .manager import (
+    ACTIVE_STATUSES,
+    archiving,
+    LeaveManager,
+    LeaveBalanceManager,
+    LeaveNotificationManager,
+    LeaveRollupManager,
+)
+from . import summary
+from .utility import working_days
 from django.utils.translation import gettext as _
 from django.contrib.auth.models import User
+from employee.models import Department
 from django.utils import timezone
 from datetime import datetime
 
@@ -25,6 +35,12 @@ LEAVE_TYPE = (
 DAYS = 30
 
 
+class LeaveOverlapError(ValueError):
+    """
+    a cancelled or rejected leave can't be booked again -> its dates are taken
+    """
+
+
 # Create a Leave model
 class Leave(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, default=1)
@@ -72,15 +88,81 @@ class Leave(models.Model):
         verbose_name = _("Leave")
         verbose_name_plural = _("Leaves")
         ordering = ["-created"]  # recent objects
+        # Indexes matching the LeaveManager predicates and the dashboard lookups
+        indexes = [
+            # pending queue is the hottest list -> partial index ordered for FIFO
+            models.Index(
+                fields=["-created", "-id"],
+                name="leave_pending_created_idx",
+                condition=models.Q(status="pending"),
+            ),
+            # approved/cancelled/rejected lists -> filter on status, order by created
+            models.Index(
+                fields=["status", "-created", "-id"], name="leave_status_created_idx"
+            ),
+            # current_year_leaves -> startdate__year becomes a startdate range
+            models.Index(fields=["startdate"], name="leave_startdate_idx"),
+            # Leave.objects.filter(user=...) ordered by Meta.ordering, id breaks ties for
+            # keyset pagination
+            models.Index(
+                fields=["user", "-created", "-id"], name="leave_user_created_idx"
+            ),
+            models.Index(fields=["user", "status"], name="leave_user_status_idx"),
+            # occupancy sweep -> covers the approved date ranges without a table lookup
+            models.Index(
+                fields=["status", "startdate", "enddate"], name="leave_status_dates_idx"
+            ),
+            # overlap probe -> LeaveManager.overlapping, postgres adds an exclusion constraint
+            models.Index(
+                fields=["user", "startdate", "enddate"], name="leave_user_dates_idx"
+            ),
+        ]
 
     # __str__ method to represent the Leave object as a string
     def __str__(self) -> str:
         return "{0} - {1}".format(self.leavetype, self.user)
 
+    def rollup_row(self):
+        return (self.status, self.user_id, self.leavetype, self.startdate, self.enddate)
+
+    @staticmethod
+    def forget_deleted(sender, instance, **kwargs):
+        # pre_delete -> the user's employee record still exists on cascades
+        if not archiving.get():
+            LeaveRollup.objects.record([instance.rollup_row()], sign=-1)
+
+    def save(self, *args, **kwargs):
+        # keeps LeaveRollup in step -> the old row is taken out, the new one added
+        for field in ("startdate", "enddate"):
+            # leaves created with "2023-07-24" strings are bucketed by their date
+            setattr(
+                self, field, self._meta.get_field(field).to_python(getattr(self, field))
+            )
+        with transaction.atomic():
+            old = None
+            if self.pk is not None and not self._state.adding:
+                old = (
+                    Leave.objects.filter(pk=self.pk)
+                    .values_list(
+                        "status", "user_id", "leavetype", "startdate", "enddate"
+                    )
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            if old != self.rollup_row():
+                if old is not None:
+                    LeaveRollup.objects.record([old], sign=-1)
+                LeaveRollup.objects.record([self.rollup_row()])
+
     @property
     def can_apply_leave(self) -> bool:
-        num_leaves = Leave.objects.filter(employee=self).count()
-        return num_leaves < 7
+        """
+        the user is still within the yearly request quota of this leave's year
+        """
+        from .quota import get_quota
+
+        year = self.startdate.year if self.startdate else None
+        return get_quota(self.user_id, year).can_apply()
 
     @property
     def pretty_leave(self) -> str:
@@ -88,64 +170,277 @@ class Leave(models.Model):
         This provides a pretty representation of the leave object.
         """
         leave = self.leavetype
-        user = self.user
-        employee = user.employee_set.first().get_full_name
+        employee = self.employee.get_full_name if self.employee else self.user
         return "{0} - {1}".format(employee, leave)
 
+    @property
+    def employee(self):
+        """
+        Employee of the leave user, set in bulk by EmployeeResolver.attach on list pages
+        """
+        if "_employee" not in self.__dict__:
+            self._employee = self.user.employee_set.first()
+        return self._employee
+
+    @employee.setter
+    def employee(self, employee) -> None:
+        self._employee = employee
+
     @property
     def leave_days(self) -> int:
         """
-        This property calculates the number of leave days based on start and end dates.
+        This property calculates the number of working days between start and end dates.
         """
-        days_count = ""
-        startdate = self.startdate
-        enddate = self.enddate
-        if startdate > enddate:
-            return 0
-        dates = enddate - startdate
-        return dates.days
+        return working_days(self.startdate, self.enddate)
 
     @property
     def leave_approved(self) -> bool:
         return self.is_approved == True
 
+    def set_status(self, status: str) -> bool:
+        """
+        Moves the leave from the status read on this instance to status with a
+        single conditional UPDATE and books the balance delta in the same transaction.
+        Returns False when another request changed the leave first, raises
+        LeaveOverlapError when a cancelled or rejected leave would overlap a booked one.
+        """
+        old_status = self.status
+        try:
+            with transaction.atomic():
+                if self.rebooks(old_status, status) and self.overlaps_booked():
+                    raise LeaveOverlapError("This leave overlaps another booked leave.")
+                won = Leave.objects.transition(self.pk, old_status, status)
+                if won:
+                    LeaveBalance.objects.record_transition(self, old_status, status)
+                    LeaveRollup.objects.record_transitions(
+                        [(old_status,) + self.rollup_row()[1:]], status
+                    )
+                    LeaveNotification.objects.queue_transitions(
+                        [
+                            (
+                                self.pk,
+                                self.user_id,
+                                self.leavetype,
+                                self.startdate,
+                                self.enddate,
+                            )
+                        ],
+                        status,
+                    )
+                    summary.invalidate()
+        except IntegrityError as error:
+            if not self.rebooks(old_status, status):
+                raise
+            # postgres exclusion constraint -> a concurrent request booked the dates
+            raise LeaveOverlapError(
+                "This leave overlaps another booked leave."
+            ) from error
+        if won:
+            self.status = status
+            self.is_approved = status == "approved"
+        return won
+
+    @staticmethod
+    def rebooks(old_status: str, status: str) -> bool:
+        # cancelled/rejected -> pending/approved takes the dates again
+        return status in ACTIVE_STATUSES and old_status not in ACTIVE_STATUSES
+
+    def overlaps_booked(self) -> bool:
+        if not (self.startdate and self.enddate):
+            return False
+        return (
+            Leave.objects.overlapping(self.user_id, self.startdate, self.enddate)
+            .exclude(pk=self.pk)
+            .exists()
+        )
+
     # These properties handle the approval, disapproval, cancellation, and rejection of leaves
     @property
-    def approve_leave(self):
+    def approve_leave(self) -> bool:
         if self.status == "approved":
             raise ValueError("This leave request has already been approved.")
-        else:
-            self.is_approved = True
-            self.status = "approved"
-            self.save()
+        return self.set_status("approved")
 
     @property
-    def unapprove_leave(self):
+    def unapprove_leave(self) -> bool:
         if self.status != "approved":
             raise ValueError("This leave request is not currently approved.")
-        else:
-            self.is_approved = False
-            self.status = "pending"
-            self.save()
+        return self.set_status("pending")
 
     @property
-    def leaves_cancel(self):
+    def leaves_cancel(self) -> bool:
         if self.status == "cancelled":
             raise ValueError("This leave request has already been cancelled.")
-        else:
-            self.is_approved = False
-            self.status = "cancelled"
-            self.save()
+        return self.set_status("cancelled")
+
+    @property
+    def uncancel_leave(self) -> bool:
+        if self.status != "cancelled":
+            raise ValueError("This leave request is not currently cancelled.")
+        return self.set_status("pending")
 
     @property
-    def reject_leave(self):
+    def reject_leave(self) -> bool:
         if self.status == "rejected":
             raise ValueError("This leave request has already been rejected.")
-        else:
-            self.is_approved = False
-            self.status = "rejected"
-            self.save()
+        return self.set_status("rejected")
+
+    @property
+    def unreject_leave(self) -> bool:
+        if self.status != "rejected":
+            raise ValueError("This leave request is not currently rejected.")
+        return self.set_status("pending")
 
     @property
     def is_rejected(self) -> bool:
         return self.status == "rejected"
+
+
+# Running balance per user, year and leave type -> updated on every status change
+class LeaveBalance(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    year = models.PositiveSmallIntegerField(verbose_name=_("Year"))
+    leavetype = models.CharField(choices=LEAVE_TYPE, max_length=25, default=SICK)
+    entitled = models.PositiveIntegerField(
+        verbose_name=_("Leave days per year"), default=DAYS
+    )
+    carried = models.IntegerField(
+        verbose_name=_("Days carried from last year"), default=0
+    )
+    used = models.IntegerField(verbose_name=_("Approved leave days"), default=0)
+
+    updated = models.DateTimeField(auto_now=True, auto_now_add=False)
+
+    objects = LeaveBalanceManager()
+
+    class Meta:
+        verbose_name = _("Leave Balance")
+        verbose_name_plural = _("Leave Balances")
+        ordering = ["-year", "leavetype"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "year", "leavetype"], name="leave_balance_unique"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return "{0} - {1} {2}".format(self.user, self.leavetype, self.year)
+
+    @property
+    def remaining(self) -> int:
+        return self.entitled + self.carried - self.used
+
+
+# Leaves of closed years moved out of the hot table by the archive_leaves command
+# postgres stores this table partitioned by year of startdate (see migration 0010)
+class LeaveArchive(models.Model):
+    id = models.IntegerField(primary_key=True)  # keeps the original Leave id
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    startdate = models.DateField(verbose_name=_("Start Date"), null=True)
+    enddate = models.DateField(verbose_name=_("End Date"), null=True)
+    leavetype = models.CharField(choices=LEAVE_TYPE, max_length=25, null=True)
+    reason = models.CharField(max_length=255, null=True, blank=True)
+    defaultdays = models.PositiveIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=12)
+    is_approved = models.BooleanField(default=False)
+
+    updated = models.DateTimeField()
+    created = models.DateTimeField()
+    archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("Archived Leave")
+        verbose_name_plural = _("Archived Leaves")
+        ordering = ["-created"]
+        indexes = [
+            models.Index(
+                fields=["user", "startdate"], name="leavearchive_user_start_idx"
+            ),
+            models.Index(
+                fields=["status", "startdate"], name="leavearchive_status_idx"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return "{0} - {1}".format(self.leavetype, self.user)
+
+
+# Outbox of leave emails -> written in the transaction of the status change,
+# delivered in batches by the send_notifications command
+class LeaveNotification(models.Model):
+    QUEUED = "queued"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATUS = (
+        (QUEUED, "Queued"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    )
+
+    leave = models.ForeignKey(Leave, on_delete=models.SET_NULL, null=True, blank=True)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+
+    status = models.CharField(max_length=12, choices=STATUS, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=255, blank=True, default="")
+
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    objects = LeaveNotificationManager()
+
+    class Meta:
+        verbose_name = _("Leave Notification")
+        verbose_name_plural = _("Leave Notifications")
+        ordering = ["-created"]
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt"], name="leavenotification_due_idx"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return "{0} - {1}".format(self.recipient, self.subject)
+
+
+# Leaves and working days per month, department, leave type and status -> kept up to
+# date on every leave write, the dashboard charts read only from here
+class LeaveRollup(models.Model):
+    year = models.PositiveSmallIntegerField(verbose_name=_("Year"))
+    month = models.PositiveSmallIntegerField(verbose_name=_("Month"))
+    department = models.ForeignKey(
+        Department, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    leavetype = models.CharField(choices=LEAVE_TYPE, max_length=25, null=True)
+    status = models.CharField(max_length=12)
+    leaves = models.IntegerField(verbose_name=_("Leaves"), default=0)
+    days = models.IntegerField(verbose_name=_("Working days"), default=0)
+
+    objects = LeaveRollupManager()
+
+    class Meta:
+        verbose_name = _("Leave Rollup")
+        verbose_name_plural = _("Leave Rollups")
+        ordering = ["-year", "-month"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["year", "month", "department", "leavetype", "status"],
+                name="leave_rollup_unique",
+            ),
+            # NULL never equals NULL in a unique index -> one row for no department
+            models.UniqueConstraint(
+                fields=["year", "month", "leavetype", "status"],
+                condition=models.Q(department__isnull=True),
+                name="leave_rollup_unassigned_unique",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return "{0}-{1:02d} {2} {3}".format(
+            self.year, self.month, self.leavetype, self.status
+        )
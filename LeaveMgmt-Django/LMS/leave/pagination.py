@@ -0,0 +1,96 @@
+from typing import List, Optional
+
+from django.core import signing
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# leaves are listed newest first -> Leave.Meta.ordering, id breaks ties
+ORDERING = ("-created", "-id")
+SALT = "leave.pagination"
+PER_PAGE = 25
+
+
+class KeysetPage:
+    """
+    One page of leaves found by a (created, id) cursor instead of an OFFSET.
+    next_token / previous_token are opaque, signed cursors for ?cursor=
+    """
+
+    def __init__(self, object_list: List, next_token=None, previous_token=None):
+        self.object_list = object_list
+        self.next_token = next_token
+        self.previous_token = previous_token
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_token is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.previous_token is not None
+
+    @property
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+
+def make_token(leave, direction: str) -> str:
+    return signing.dumps([leave.created.isoformat(), leave.pk, direction], salt=SALT)
+
+
+def read_token(token: Optional[str]):
+    """
+    token -> (created, id, direction) or None for the first page / a bad token
+    """
+    if not token:
+        return None
+    try:
+        created, pk, direction = signing.loads(token, salt=SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        return None
+    created = parse_datetime(created)
+    if created is None or direction not in ("next", "previous"):
+        return None
+    return created, pk, direction
+
+
+def keyset_paginate(queryset, token: Optional[str] = None, per_page: int = PER_PAGE):
+    """
+    keyset_paginate(Leave.objects.all_pending_leaves(), request.GET.get("cursor"))
+    reads per_page + 1 rows past the cursor, no COUNT(*) and no OFFSET
+    """
+    cursor = read_token(token)
+
+    if cursor is None:
+        rows = list(queryset.order_by(*ORDERING)[: per_page + 1])
+        has_more, has_before = len(rows) > per_page, False
+        rows = rows[:per_page]
+    else:
+        created, pk, direction = cursor
+        if direction == "next":
+            # (created, id) < cursor, written so the index can range scan on created
+            rows = list(
+                queryset.filter(created__lte=created)
+                .filter(Q(created__lt=created) | Q(id__lt=pk))
+                .order_by(*ORDERING)[: per_page + 1]
+            )
+            has_more, has_before = len(rows) > per_page, True
+            rows = rows[:per_page]
+        else:
+            rows = list(
+                queryset.filter(created__gte=created)
+                .filter(Q(created__gt=created) | Q(id__gt=pk))
+                .order_by("created", "id")[: per_page + 1]
+            )
+            has_before, has_more = len(rows) > per_page, True
+            rows = rows[:per_page][::-1]
+
+    next_token = make_token(rows[-1], "next") if rows and has_more else None
+    previous_token = make_token(rows[0], "previous") if rows and has_before else None
+    return KeysetPage(rows, next_token, previous_token)
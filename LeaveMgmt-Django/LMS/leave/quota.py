@@ -0,0 +1,155 @@
+import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+
+from .manager import ACTIVE_STATUSES
+from .models import Leave, LeaveBalance
+from .utility import bulk_working_days
+
+# leave requests a user may have pending or approved per year
+MAX_REQUESTS = 7
+
+
+def get_max_requests() -> int:
+    return getattr(settings, "LEAVE_MAX_REQUESTS", MAX_REQUESTS)
+
+
+class Quota:
+    """
+    Pending and approved leave of one user in one year, per leave type.
+    requests     -> {leavetype: number of requests}
+    pending_days -> {leavetype: working days of pending requests}, the ledger
+                    only books approved days
+    """
+
+    def __init__(self, user_id: int, year: int):
+        self.user_id = user_id
+        self.year = year
+        self.requests: Dict[str, int] = {}
+        self.pending_days: Dict[str, int] = {}
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    @property
+    def remaining_requests(self) -> int:
+        return max(get_max_requests() - self.total_requests, 0)
+
+    def can_apply(self) -> bool:
+        """
+        another request fits the yearly request limit
+        """
+        return self.total_requests < get_max_requests()
+
+    def days_left(self, leavetype: str) -> int:
+        """
+        working days of leavetype still free -> ledger remaining minus pending days
+        """
+        remaining = LeaveBalance.objects.remaining(self.user_id, self.year, leavetype)
+        return remaining - self.pending_days.get(leavetype, 0)
+
+
+def get_quotas(users: Iterable, years: Iterable[int]) -> Dict[Tuple[int, int], Quota]:
+    """
+    {(user_id, year): Quota} for every user and year with one grouped query
+    """
+    user_ids = {getattr(user, "pk", user) for user in users}
+    years = set(years)
+    quotas = {
+        (user_id, year): Quota(user_id, year) for user_id in user_ids for year in years
+    }
+    if not quotas:
+        return quotas
+
+    # active requests are few per user and year (get_max_requests) -> plain rows,
+    # pending ones also need their working days the ledger has not booked yet
+    rows = list(
+        Leave.objects.filter(
+            user_id__in=user_ids,
+            status__in=ACTIVE_STATUSES,
+            startdate__gte=datetime.date(min(years), 1, 1),
+            startdate__lt=datetime.date(max(years) + 1, 1, 1),
+        )
+        .order_by()
+        .values_list("user_id", "leavetype", "status", "startdate", "enddate")
+    )
+    pending = [row for row in rows if row[2] == "pending" and row[4]]
+    days = bulk_working_days([row[3] for row in pending], [row[4] for row in pending])
+    for user_id, leavetype, status, startdate, enddate in rows:
+        quota = quotas.get((user_id, startdate.year))
+        if quota is not None:
+            quota.requests[leavetype] = quota.requests.get(leavetype, 0) + 1
+    for (user_id, leavetype, status, startdate, enddate), count in zip(
+        pending, days.tolist()
+    ):
+        quota = quotas.get((user_id, startdate.year))
+        if quota is not None:
+            quota.pending_days[leavetype] = quota.pending_days.get(leavetype, 0) + count
+    return quotas
+
+    rows = (
+        Leave.objects.filter(
+            user_id__in=user_ids,
+            status__in=ACTIVE_STATUSES,
+            startdate__gte=datetime.date(min(years), 1, 1),
+            startdate__lt=datetime.date(max(years) + 1, 1, 1),
+        )
+        .order_by()
+        .values("user_id", "leavetype", year=ExtractYear("startdate"))
+        .annotate(requests=Count("id"))
+    )
+    for row in rows:
+        quota = quotas.get((row["user_id"], row["year"]))
+        if quota is None:
+            continue
+        quota.requests[row["leavetype"]] = row["requests"]
+
+    # pending requests hold days the ledger has not booked yet
+    pending = list(
+        Leave.objects.filter(
+            user_id__in=user_ids,
+            status="pending",
+            startdate__gte=datetime.date(min(years), 1, 1),
+            startdate__lt=datetime.date(max(years) + 1, 1, 1),
+        )
+        .exclude(enddate=None)
+        .order_by()
+        .values_list("user_id", "leavetype", "startdate", "enddate")
+    )
+    if pending:
+        user_ids, leavetypes, startdates, enddates = zip(*pending)
+        days = bulk_working_days(startdates, enddates).tolist()
+        for user_id, leavetype, startdate, count in zip(
+            user_ids, leavetypes, startdates, days
+        ):
+            quota = quotas.get((user_id, startdate.year))
+            if quota is not None:
+                quota.pending_days[leavetype] = (
+                    quota.pending_days.get(leavetype, 0) + count
+                )
+    return quotas
+
+
+def get_quota(user, year: Optional[int] = None) -> Quota:
+    """
+    Quota of a single user, default current year
+    """
+    year = year or datetime.date.today().year
+    return get_quotas([user], [year])[(getattr(user, "pk", user), year)]
+
+
+def attach_quotas(leaves):
+    """
+    sets leave.quota (the user's quota for the leave year) on a list of leaves,
+    one query for the whole list
+    """
+    leaves = list(leaves)
+    this_year = datetime.date.today().year
+    years = {leave.startdate.year if leave.startdate else this_year for leave in leaves}
+    quotas = get_quotas({leave.user_id for leave in leaves}, years)
+    for leave in leaves:
+        year = leave.startdate.year if leave.startdate else this_year
+        leave.quota = quotas[(leave.user_id, year)]
+    return leaves
@@ -0,0 +1,90 @@
+import datetime
+from typing import Dict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from hrsuit import versions
+
+# bumped on every leave, employee and balance write -> all cached summaries expire
+VERSION_KEY = "leave:summary:version"
+# summaries also age out on their own, a missed invalidation is never permanent
+TIMEOUT = 300
+STATUSES = ("pending", "approved", "rejected", "cancelled")
+# the dashboard widget's window
+BIRTHDAY_DAYS = 7
+
+
+def get_version() -> int:
+    return versions.get_version(VERSION_KEY)
+
+
+def bump() -> None:
+    versions.bump(VERSION_KEY)
+
+
+def invalidate(**kwargs) -> None:
+    """
+    expires the dashboard summary of every user, usable as a signal receiver
+    bumped again on commit so a summary read before the write is visible is dropped
+    """
+    bump()
+    transaction.on_commit(bump)
+
+
+def counts(user) -> Dict:
+    """
+    two queries -> active employees, and leaves by status for the company and user
+    {"employees": 12, "leaves": {"pending": 3, .., "total": 40},
+     "mine": {"pending": 1, .., "total": 4}}
+    """
+    from employee.models import Employee
+
+    from .models import Leave
+
+    mine = Q(user_id=user.pk)
+    aggregates = {"total": Count("id"), "mine_total": Count("id", filter=mine)}
+    for status in STATUSES:
+        aggregates[status] = Count("id", filter=Q(status=status))
+        aggregates["mine_" + status] = Count("id", filter=mine & Q(status=status))
+    row = Leave.objects.order_by().aggregate(**aggregates)
+    return {
+        "employees": Employee.objects.count(),
+        "leaves": {key: row[key] for key in STATUSES + ("total",)},
+        "mine": {key: row["mine_" + key] for key in STATUSES + ("total",)},
+    }
+
+
+def compute(user, today=None) -> Dict:
+    """
+    everything the dashboard shows as plain values, safe to cache
+    """
+    from employee.models import Employee
+
+    from .models import LeaveBalance
+
+    today = today or datetime.date.today()
+    summary = counts(user)
+    summary["balances"] = [
+        {"leavetype": balance.get_leavetype_display(), "remaining": balance.remaining}
+        for balance in LeaveBalance.objects.for_user(user, today.year)
+    ]
+    summary["birthdays"] = [
+        {"name": employee.get_full_name, "birthday": employee.birthday}
+        for employee in Employee.objects.upcoming_birthdays(BIRTHDAY_DAYS, today)
+    ]
+    return summary
+
+
+def get_summary(user) -> Dict:
+    """
+    compute(user) cached per user -> a warm dashboard reads no table
+    the key holds the date as birthdays and balances move with it
+    """
+    today = datetime.date.today()
+    key = "leave:summary:{0}:{1}:{2}".format(get_version(), user.pk, today)
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute(user, today)
+        cache.set(key, summary, TIMEOUT)
+    return summary
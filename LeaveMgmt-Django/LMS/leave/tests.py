@@ -22,8 +22,16 @@ class LeaveModelTest(TestCase):
 
     # Test 1: Check if the correct number of leave days is calculated
     def test_leave_days(self):
+        self.leave.startdate = date(2023, 7, 24)  # Monday
+        self.leave.enddate = date(2023, 7, 28)  # back on Friday
         self.assertEqual(self.leave.leave_days, 4)
 
+    # Test 1b: Check that weekends are not counted as leave days
+    def test_leave_days_skip_weekend(self):
+        self.leave.startdate = date(2023, 7, 27)  # Thursday
+        self.leave.enddate = date(2023, 8, 1)  # back on Tuesday
+        self.assertEqual(self.leave.leave_days, 3)
+
     # Test 2: Check if the leave is approved correctly
     def test_approve_leave(self):
         self.leave.approve_leave
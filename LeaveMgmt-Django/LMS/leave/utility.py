@@ -0,0 +1,118 @@
+import datetime
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+
+# Mon..Sun, 1 -> working day (numpy busday weekmask format)
+WEEKMASK = "1111100"
+
+
+def get_weekmask() -> str:
+    """
+    working week from settings.LEAVE_WEEKMASK, default Monday - Friday
+    """
+    return getattr(settings, "LEAVE_WEEKMASK", WEEKMASK)
+
+
+def get_holidays() -> Sequence[datetime.date]:
+    """
+    public holidays from settings.LEAVE_HOLIDAYS, never counted as leave days
+    """
+    return getattr(settings, "LEAVE_HOLIDAYS", ())
+
+
+def _busday_count(startdates, enddates, weekmask=None, holidays=None) -> np.ndarray:
+    starts = np.array(startdates, dtype="datetime64[D]")
+    ends = np.array(enddates, dtype="datetime64[D]")
+    counts = np.zeros(starts.shape, dtype=np.int64)
+
+    # rows with a missing date count as zero days
+    valid = ~(np.isnat(starts) | np.isnat(ends))
+    if valid.any():
+        counts[valid] = np.busday_count(
+            starts[valid],
+            ends[valid],
+            weekmask=weekmask or get_weekmask(),
+            holidays=np.array(
+                get_holidays() if holidays is None else holidays,
+                dtype="datetime64[D]",
+            ),
+        )
+    # startdate after enddate -> 0, same as the old leave_days behaviour
+    return np.clip(counts, 0, None)
+
+
+def working_days(
+    startdate: Optional[datetime.date],
+    enddate: Optional[datetime.date],
+    weekmask: Optional[str] = None,
+    holidays: Optional[Iterable[datetime.date]] = None,
+) -> int:
+    """
+    eg. Mon 2023-07-24 -> Mon 2023-07-31 = 5
+    enddate is the day the employee is back at work, so it is not counted
+    """
+    return int(_busday_count([startdate], [enddate], weekmask, holidays)[0])
+
+
+def bulk_working_days(
+    startdates: Sequence[Optional[datetime.date]],
+    enddates: Sequence[Optional[datetime.date]],
+    weekmask: Optional[str] = None,
+    holidays: Optional[Iterable[datetime.date]] = None,
+) -> np.ndarray:
+    """
+    working days for many (startdate, enddate) pairs in one numpy call
+    """
+    return _busday_count(startdates, enddates, weekmask, holidays)
+
+
+def queryset_working_days(
+    queryset, weekmask: Optional[str] = None, holidays=None
+) -> Dict[int, int]:
+    """
+    {leave.id: working days} for a Leave queryset, fetched in a single query
+    """
+    rows = list(queryset.values_list("id", "startdate", "enddate"))
+    if not rows:
+        return {}
+    ids, startdates, enddates = zip(*rows)
+    counts = _busday_count(startdates, enddates, weekmask, holidays)
+    return dict(zip(ids, counts.tolist()))
+
+
+def total_working_days(queryset, weekmask: Optional[str] = None, holidays=None) -> int:
+    """
+    sum of working days over a Leave queryset
+    """
+    return sum(queryset_working_days(queryset, weekmask, holidays).values())
+
+
+def occupancy_counts(
+    startdates: Sequence[datetime.date],
+    enddates: Sequence[datetime.date],
+    first_day: datetime.date,
+    last_day: datetime.date,
+    start_weights: Optional[Sequence[int]] = None,
+    end_weights: Optional[Sequence[int]] = None,
+) -> np.ndarray:
+    """
+    people out on each day of [first_day, last_day] for leaves [startdate, enddate)
+    difference array sweep -> +1 on the first day out, -1 on the day back, cumsum
+    weights let callers pass pre-grouped (date, count) rows instead of single leaves
+    """
+    days = (last_day - first_day).days + 1
+    if days <= 0:
+        return np.zeros(0, dtype=np.int64)
+
+    origin = np.datetime64(first_day, "D")
+
+    def offsets(dates):
+        dates = np.array(dates, dtype="datetime64[D]")
+        return np.clip((dates - origin).astype(np.int64), 0, days)
+
+    diff = np.bincount(
+        offsets(startdates), weights=start_weights, minlength=days + 1
+    ) - np.bincount(offsets(enddates), weights=end_weights, minlength=days + 1)
+    return np.cumsum(diff[:days]).astype(np.int64)
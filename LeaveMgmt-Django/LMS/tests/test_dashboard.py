@@ -1,14 +1,23 @@
+import csv
 import datetime
+import json
 import os
 from django.test import Client, TestCase
 from django.contrib.auth.models import User
 from employee.models import Department, Employee, Role
-from leave.models import Leave
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from leave.models import Leave, LeaveBalance, LeaveRollup
+from leave.summary import counts, get_summary
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.forms.models import model_to_dict
+from django.contrib.messages import get_messages
 
 
 class DashboardTest(TestCase):
@@ -196,3 +205,493 @@ class AdditionalDashboardTest3(DashboardTest):
     def test_dashboard_leave_rejected_list_view_unauthenticated(self):
         response = self.client.get(reverse("dashboard:leavesrejected"))
         self.assertEqual(response.status_code, 200)
+
+
+class LeaveTransitionViewTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            "admin",
+            "admin@example.com",
+            "adminpassword",
+            is_staff=True,
+            is_superuser=True,
+        )
+        self.user = User.objects.create_user("john", "john@example.com", "johnpassword")
+        Employee.objects.create(
+            user=self.user, firstname="John", lastname="Doe", birthday="1990-01-01"
+        )
+        self.leave = Leave.objects.create(
+            user=self.user, startdate="2023-07-24", enddate="2023-07-28"
+        )
+        self.client.login(username="admin", password="adminpassword")
+
+    def test_approve_then_stale_approve(self):
+        url = reverse("dashboard:userleaveapprove", kwargs={"id": self.leave.id})
+        self.client.get(url)
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, "approved")
+
+        response = self.client.get(url)  # second admin clicks approve as well
+        self.assertEqual(response.status_code, 302)
+        messages = [str(message) for message in get_messages(response.wsgi_request)]
+        self.assertIn("already updated", messages[-1])
+
+    def test_uncancel_and_unreject_views(self):
+        self.client.get(
+            reverse("dashboard:userleavecancel", kwargs={"id": self.leave.id})
+        )
+        self.client.get(
+            reverse("dashboard:userleaveuncancel", kwargs={"id": self.leave.id})
+        )
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, "pending")
+
+        self.client.get(reverse("dashboard:reject", kwargs={"id": self.leave.id}))
+        self.client.get(reverse("dashboard:unreject", kwargs={"id": self.leave.id}))
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, "pending")
+
+
+class LeaveBulkActionTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(
+            "admin",
+            "admin@example.com",
+            "adminpassword",
+            is_staff=True,
+            is_superuser=True,
+        )
+        self.user = User.objects.create_user("john", "john@example.com", "johnpassword")
+        self.leaves = [
+            Leave.objects.create(
+                user=self.user,
+                startdate=datetime.date(2023, 7, 24),
+                enddate=datetime.date(2023, 7, 28),
+            )
+            for _ in range(3)
+        ]
+        self.url = reverse("dashboard:leavesbulk")
+
+    def post(self, ids, status):
+        return self.client.post(
+            self.url,
+            data=json.dumps({"ids": ids, "status": status}),
+            content_type="application/json",
+        )
+
+    def test_bulk_approve_reports_skipped(self):
+        self.leaves[0].approve_leave
+        self.client.login(username="admin", password="adminpassword")
+        ids = [leave.id for leave in self.leaves] + [9999]
+
+        response = self.post(ids, "approved")
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["updated"], ids[1:3])
+        self.assertEqual(data["skipped"], [ids[0], 9999])
+        self.assertEqual(data["results"][str(ids[0])], "skipped")
+        self.assertEqual(data["results"]["9999"], "not found")
+        self.assertEqual(Leave.objects.all_approved_leaves().count(), 3)
+        balance = LeaveBalance.objects.get(user=self.user, year=2023)
+        self.assertEqual(balance.used, 12)
+
+    def test_bulk_form_post_and_bad_status(self):
+        self.client.login(username="admin", password="adminpassword")
+        response = self.client.post(
+            self.url, data={"ids": [self.leaves[0].id], "status": "rejected"}
+        )
+        self.assertEqual(response.json()["updated"], [self.leaves[0].id])
+        self.assertEqual(self.post([self.leaves[0].id], "deleted").status_code, 400)
+
+    def test_bulk_requires_superuser(self):
+        self.client.login(username="john", password="johnpassword")
+        self.assertEqual(self.post([self.leaves[0].id], "approved").status_code, 403)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+
+class LeaveOccupancyTest(TestCase):
+    def setUp(self):
+        self.sales = Department.objects.create(name="sales")
+        self.it = Department.objects.create(name="it")
+        for username, department, start, end in [
+            ("john", self.sales, datetime.date(2023, 7, 3), datetime.date(2023, 7, 6)),
+            ("jane", self.sales, datetime.date(2023, 6, 28), datetime.date(2023, 7, 2)),
+            ("jim", self.it, datetime.date(2023, 7, 5), datetime.date(2023, 7, 20)),
+        ]:
+            user = User.objects.create_user(username, password="password")
+            Employee.objects.create(
+                user=user,
+                firstname=username,
+                lastname="Doe",
+                birthday="1990-01-01",
+                department=department,
+            )
+            Leave.objects.create(
+                user=user, startdate=start, enddate=end, status="approved"
+            )
+        # pending leaves are not counted
+        Leave.objects.create(
+            user=user,
+            startdate=datetime.date(2023, 7, 1),
+            enddate=datetime.date(2023, 7, 5),
+        )
+        self.first_day = datetime.date(2023, 7, 1)
+        self.last_day = datetime.date(2023, 7, 7)
+
+    def test_occupancy_company(self):
+        counts = Leave.objects.occupancy(self.first_day, self.last_day)
+        self.assertEqual(counts, [1, 0, 1, 1, 2, 1, 1])
+
+    def test_occupancy_department(self):
+        counts = Leave.objects.occupancy(self.first_day, self.last_day, self.sales)
+        self.assertEqual(counts, [1, 0, 1, 1, 1, 0, 0])
+        grouped = Leave.objects.occupancy_by_department(self.first_day, self.last_day)
+        self.assertEqual(grouped[self.it.id], [0, 0, 0, 0, 1, 1, 1])
+
+    def test_deleted_employee_records_not_counted(self):
+        # jim moved from sales to it, the old record is soft deleted
+        Employee.objects.create(
+            user=User.objects.get(username="jim"),
+            firstname="jim",
+            lastname="Doe",
+            birthday="1990-01-01",
+            department=self.sales,
+            is_deleted=True,
+        )
+        counts = Leave.objects.occupancy(self.first_day, self.last_day, self.sales)
+        self.assertEqual(counts, [1, 0, 1, 1, 1, 0, 0])
+        grouped = Leave.objects.occupancy_by_department(self.first_day, self.last_day)
+        self.assertEqual(grouped[self.sales.id], [1, 0, 1, 1, 1, 0, 0])
+        self.assertEqual(grouped[self.it.id], [0, 0, 0, 0, 1, 1, 1])
+
+    def test_occupancy_endpoint(self):
+        self.client.login(username="john", password="password")
+        url = reverse("dashboard:leavesoccupancy")
+        data = self.client.get(url, {"start": "2023-07-01", "end": "2023-07-07"}).json()
+        self.assertEqual(data["counts"], [1, 0, 1, 1, 2, 1, 1])
+        self.assertEqual(data["departments"]["it"], [0, 0, 0, 0, 1, 1, 1])
+
+        data = self.client.get(
+            url,
+            {"start": "2023-07-01", "end": "2023-07-07", "department": self.it.id},
+        ).json()
+        self.assertEqual(data["department"], "it")
+        self.assertEqual(
+            self.client.get(
+                url, {"start": "2023-07-07", "end": "2023-07-01"}
+            ).status_code,
+            400,
+        )
+
+
+class LeaveListPaginationTest(TestCase):
+    def test_pending_list_pages(self):
+        User.objects.create_user(
+            "admin", password="password", is_staff=True, is_superuser=True
+        )
+        user = User.objects.create_user("john", password="password")
+        Leave.objects.bulk_create([Leave(user=user) for _ in range(30)])
+        self.client.login(username="admin", password="password")
+
+        response = self.client.get(reverse("dashboard:leaveslist"))
+        page = response.context["page"]
+        self.assertEqual(len(page), 25)
+        self.assertContains(response, "?cursor=")
+
+        response = self.client.get(
+            reverse("dashboard:leaveslist"), {"cursor": page.next_token}
+        )
+        self.assertEqual(len(response.context["page"]), 5)
+        self.assertFalse(response.context["page"].has_next)
+
+    def test_approved_list_counts_the_page_only(self):
+        User.objects.create_user(
+            "admin", password="password", is_staff=True, is_superuser=True
+        )
+        user = User.objects.create_user("john", password="password")
+        Leave.objects.bulk_create(
+            [Leave(user=user, status="approved", is_approved=True) for _ in range(30)]
+        )
+        self.client.login(username="admin", password="password")
+
+        response = self.client.get(reverse("dashboard:approvedleaveslist"))
+        self.assertContains(response, "Showing <span>25</span> approved leave(s)")
+        self.assertNotContains(response, "Total")
+
+
+class LeaveRollupTest(TestCase):
+    def setUp(self):
+        self.sales = Department.objects.create(name="sales")
+        self.it = Department.objects.create(name="it")
+        self.leaves = []
+        for username, department in [("john", self.sales), ("jim", self.it)]:
+            user = User.objects.create_user(username, password="password")
+            Employee.objects.create(
+                user=user,
+                firstname=username,
+                lastname="Doe",
+                birthday="1990-01-01",
+                department=department,
+            )
+            for month in (1, 2, 2):
+                start = datetime.date(2023, month, 6 if len(self.leaves) % 2 else 13)
+                self.leaves.append(
+                    Leave.objects.create(
+                        user=user, startdate=start, enddate=start.replace(day=20)
+                    )
+                )
+        # no employee profile -> unassigned department
+        self.leaves.append(
+            Leave.objects.create(
+                user=User.objects.create_user("nobody", password="password"),
+                startdate=datetime.date(2023, 3, 1),
+                enddate=datetime.date(2023, 3, 3),
+            )
+        )
+        self.admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+
+    def snapshot(self):
+        return sorted(
+            LeaveRollup.objects.exclude(leaves=0).values_list(
+                "year", "month", "department", "leavetype", "status", "leaves", "days"
+            ),
+            key=str,
+        )
+
+    def test_incremental_matches_rebuild(self):
+        self.leaves[0].approve_leave
+        self.leaves[1].leaves_cancel
+        Leave.objects.bulk_transition(
+            [leave.pk for leave in self.leaves[2:5]], "rejected"
+        )
+        self.leaves[5].startdate = datetime.date(2023, 4, 3)
+        self.leaves[5].enddate = datetime.date(2023, 4, 5)
+        self.leaves[5].save()
+
+        incremental = self.snapshot()
+        call_command("rebuild_rollups", stdout=StringIO())
+        self.assertEqual(incremental, self.snapshot())
+
+        sales_jan = LeaveRollup.objects.get(
+            year=2023, month=1, department=self.sales, status="approved"
+        )
+        self.assertEqual((sales_jan.leaves, sales_jan.days), (1, 5))
+        self.assertEqual(
+            LeaveRollup.objects.get(month=3, department__isnull=True).leaves, 1
+        )
+
+    def test_rebuild_keeps_archived_leaves(self):
+        call_command("archive_leaves", before=2024, stdout=StringIO())
+        self.assertFalse(Leave.objects.exists())
+        call_command("rebuild_rollups", stdout=StringIO())
+        self.assertEqual(
+            sum(LeaveRollup.objects.values_list("leaves", flat=True)),
+            len(self.leaves),
+        )
+
+    def test_archive_keeps_rollups(self):
+        before = self.snapshot()
+        call_command("archive_leaves", before=2024, stdout=StringIO())
+        self.assertEqual(before, self.snapshot())
+
+    def test_deleted_leaves_leave_rollups(self):
+        self.leaves[0].delete()
+        # deleting jim cascades to his employee record and leaves
+        User.objects.get(username="jim").delete()
+        incremental = self.snapshot()
+        call_command("rebuild_rollups", stdout=StringIO())
+        self.assertEqual(incremental, self.snapshot())
+        self.assertEqual(
+            sum(LeaveRollup.objects.values_list("leaves", flat=True)),
+            len(self.leaves) - 4,
+        )
+
+    def test_rebuild_ignores_deleted_employee_records(self):
+        # john moved from it to sales, the old record is soft deleted
+        Employee.objects.create(
+            user=User.objects.get(username="john"),
+            firstname="john",
+            lastname="Doe",
+            birthday="1990-01-01",
+            department=self.it,
+            is_deleted=True,
+        )
+        self.leaves[0].approve_leave
+        incremental = self.snapshot()
+        call_command("rebuild_rollups", stdout=StringIO())
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_chart_endpoint_reads_rollups_only(self):
+        self.client.login(username="admin", password="password")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("dashboard:leaveschart"), {"year": 2023})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('"leave_leave"' in q["sql"] for q in queries))
+        chart = response.json()
+        self.assertEqual(chart["statuses"]["pending"][:3], [2, 4, 1])
+
+        response = self.client.get(
+            reverse("dashboard:leaveschart"), {"year": 2023, "department": self.it.id}
+        )
+        self.assertEqual(response.json()["statuses"]["pending"][:3], [1, 2, 0])
+
+    def test_chart_endpoint_admin_only(self):
+        self.client.login(username="john", password="password")
+        response = self.client.get(reverse("dashboard:leaveschart"))
+        self.assertEqual(response.status_code, 403)
+
+
+class LeaveExportTest(TestCase):
+    def setUp(self):
+        self.sales = Department.objects.create(name="sales")
+        user = User.objects.create_user("john", password="password")
+        Employee.objects.create(
+            user=user,
+            firstname="John",
+            lastname="Doe",
+            birthday="1990-01-01",
+            department=self.sales,
+        )
+        other = User.objects.create_user("jane", password="password")
+        for owner, month, status in [
+            (user, 1, "approved"),
+            (user, 3, "pending"),
+            (other, 3, "approved"),
+        ]:
+            Leave.objects.create(
+                user=owner,
+                startdate=datetime.date(2023, month, 6),
+                enddate=datetime.date(2023, month, 10),
+                status=status,
+            )
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+
+    def export(self, **params):
+        response = self.client.get(reverse("dashboard:leavesexport"), params)
+        self.assertTrue(response.streaming)
+        return list(
+            csv.reader(b"".join(response.streaming_content).decode().splitlines())
+        )
+
+    def test_export_all(self):
+        rows = self.export()
+        self.assertEqual(rows[0][:3], ["id", "username", "firstname"])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][1:6], ["john", "John", "Doe", rows[1][4], "sales"])
+        # no employee profile -> empty name and department
+        self.assertEqual(rows[3][1:4], ["jane", "", ""])
+
+    def test_export_filters(self):
+        self.assertEqual(len(self.export(status="approved")), 3)
+        self.assertEqual(len(self.export(start="2023-02-01", end="2023-03-31")), 3)
+        rows = self.export(status="approved", department=self.sales.id)
+        self.assertEqual([row[1] for row in rows[1:]], ["john"])
+
+    def test_export_ignores_deleted_employee_records(self):
+        Employee.objects.create(
+            user=User.objects.get(username="john"),
+            firstname="Johnny",
+            lastname="Doe",
+            birthday="1990-01-01",
+            department=self.sales,
+            is_deleted=True,
+        )
+        rows = self.export()
+        self.assertEqual(len(rows), 4)
+        self.assertEqual([row[2] for row in rows[1:3]], ["John", "John"])
+        rows = self.export(department=self.sales.id)
+        self.assertEqual(len(rows), 3)
+
+    def test_export_bad_filters(self):
+        response = self.client.get(reverse("dashboard:leavesexport"), {"start": "x"})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse("dashboard:leavesexport"), {"status": "x"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_admin_only(self):
+        self.client.login(username="john", password="password")
+        response = self.client.get(reverse("dashboard:leavesexport"))
+        self.assertEqual(response.status_code, 302)
+
+
+class DashboardSummaryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.john = User.objects.create_user("john", password="password")
+        self.jane = User.objects.create_user("jane", password="password")
+        for user in (self.john, self.jane):
+            Employee.objects.create(
+                user=user,
+                firstname=user.username,
+                lastname="Doe",
+                birthday="1990-01-01",
+            )
+        self.leaves = [
+            Leave.objects.create(
+                user=owner,
+                startdate=datetime.date(2023, month, 6),
+                enddate=datetime.date(2023, month, 10),
+                status=status,
+            )
+            for owner, month, status in [
+                (self.john, 1, "approved"),
+                (self.john, 3, "pending"),
+                (self.jane, 3, "pending"),
+                (self.jane, 5, "rejected"),
+            ]
+        ]
+        self.client.login(username="john", password="password")
+
+    def test_counts_in_two_queries(self):
+        with self.assertNumQueries(2):
+            summary = counts(self.john)
+        self.assertEqual(summary["employees"], 2)
+        self.assertEqual(
+            summary["leaves"],
+            {"pending": 2, "approved": 1, "rejected": 1, "cancelled": 0, "total": 4},
+        )
+        self.assertEqual(
+            summary["mine"],
+            {"pending": 1, "approved": 1, "rejected": 0, "cancelled": 0, "total": 2},
+        )
+
+    def test_warm_dashboard_reads_no_table(self):
+        self.client.get(reverse("dashboard:dashboard"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("dashboard:dashboard"))
+        self.assertContains(response, "Total Leaves: 2")
+        # only the session and user lookups of the auth middleware are left
+        for query in queries.captured_queries:
+            self.assertNotIn("leave_", query["sql"])
+            self.assertNotIn("employee_", query["sql"])
+
+    def test_summary_cached_per_user(self):
+        self.assertEqual(get_summary(self.john)["mine"]["total"], 2)
+        with self.assertNumQueries(0):
+            get_summary(self.john)
+        self.assertEqual(get_summary(self.jane)["mine"]["total"], 2)
+
+    def test_leave_writes_invalidate(self):
+        get_summary(self.john)
+        Leave.objects.create(
+            user=self.john,
+            startdate=datetime.date(2023, 7, 3),
+            enddate=datetime.date(2023, 7, 4),
+        )
+        self.assertEqual(get_summary(self.john)["leaves"]["pending"], 3)
+
+        self.leaves[1].set_status("approved")
+        self.assertEqual(get_summary(self.john)["mine"]["approved"], 2)
+
+        Leave.objects.bulk_transition([self.leaves[2].pk], "cancelled")
+        self.assertEqual(get_summary(self.john)["leaves"]["cancelled"], 1)
+
+    def test_employee_writes_invalidate(self):
+        get_summary(self.john)
+        employee = Employee.objects.get(user=self.jane)
+        employee.is_deleted = True
+        employee.save()
+        self.assertEqual(get_summary(self.john)["employees"], 1)
@@ -1,12 +1,35 @@
 import datetime
 import unittest
-from django.test import TestCase
-from employee.models import Role, Department, Employee
+import threading
+import time
+from unittest.mock import patch
+from django.db import IntegrityError, OperationalError, connections
+from django.test import TestCase, TransactionTestCase
+from employee.models import Role, Department, Employee, EmployeeArchive
 from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
-from employee.utility import check_code_length, code_format
+from employee.utility import check_code_length, code_format, code_formats
 from django.conf import settings
+from django.core.exceptions import ValidationError
+import io
 import os
+import shutil
+import tempfile
+from django.core.management import call_command
+from django.test import override_settings
+from PIL import Image
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils import timezone
+from employee import lookups
+from employee.forms import EmployeeCreateForm
+from employee.middleware import EmployeeResolver
+from employee.allocator import allocate
+from employee.search import search, search_ranks
+from employee.thumbnails import SIZES, variant_name
+from leave.models import Leave, LeaveArchive
 
 
 class RoleModelTest(TestCase):
@@ -49,5 +72,798 @@ class TestUtilityFunctions(TestCase):
         self.assertEqual(
             code_format("RGL/A0/091"), "RGL/A0/091"
         )  # test with a valid code with RGL prefix and slashes
+        self.assertEqual(
+            code_formats(["A0091", None, "a0091", "A0"]),
+            ["RGL/A0/091", "", "RGL/A0/091", ""],
+        )  # test a whole batch
         # self.assertIsNone(code_format(''))  # test with an empty string
         # self.assertIsNone(code_format(None))  # test with None
+
+
+class EmployeeResolverTest(TestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(username="user{0}".format(i), password="password")
+            for i in range(3)
+        ]
+        for user in self.users[:2]:
+            Employee.objects.create(
+                user=user,
+                firstname=user.username,
+                lastname="Doe",
+                birthday="1990-01-01",
+            )
+
+    def test_for_users_single_query(self):
+        with self.assertNumQueries(1):
+            employees = Employee.objects.for_users(self.users)
+        self.assertEqual(set(employees), {self.users[0].id, self.users[1].id})
+        self.assertEqual(Employee.objects.for_user(self.users[2]), None)
+
+    def test_resolver_caches_per_request(self):
+        resolver = EmployeeResolver(self.users[0])
+        with self.assertNumQueries(1):
+            self.assertEqual(resolver.current.firstname, "user0")
+            resolver.current
+            resolver.get(self.users[0].id)
+        with self.assertNumQueries(1):  # only the misses are fetched
+            employees = resolver.get_many(self.users)
+        self.assertIsNone(employees[self.users[2].id])
+        with self.assertNumQueries(0):
+            resolver.get(self.users[2])
+
+    def test_attach_leaves(self):
+        leaves = [
+            Leave.objects.create(
+                user=user,
+                startdate=datetime.date(2023, 7, 24),
+                enddate=datetime.date(2023, 7, 28),
+            )
+            for user in self.users
+        ]
+        leaves = list(Leave.objects.select_related("user"))
+        with self.assertNumQueries(1):
+            EmployeeResolver().attach(leaves)
+            pretty = [leave.pretty_leave for leave in leaves]
+        self.assertIn("user0 Doe - sick", pretty)
+
+    def test_leave_list_queries_do_not_grow(self):
+        User.objects.create_user(
+            "admin", password="password", is_staff=True, is_superuser=True
+        )
+        self.client.login(username="admin", password="password")
+        for user in self.users:
+            Leave.objects.create(
+                user=user,
+                startdate=datetime.date(2023, 7, 24),
+                enddate=datetime.date(2023, 7, 28),
+            )
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(reverse("dashboard:leaveslist"))
+        for user in self.users:
+            Leave.objects.create(
+                user=user,
+                startdate=datetime.date(2023, 8, 24),
+                enddate=datetime.date(2023, 8, 28),
+            )
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(reverse("dashboard:leaveslist"))
+        self.assertContains(response, "user1 Doe")
+        self.assertEqual(len(few), len(many))
+
+
+class EmployeeSearchTest(TestCase):
+    def setUp(self):
+        self.sales = Department.objects.create(name="Sales")
+        self.manager = Role.objects.create(name="Manager")
+        self.john = self.employee("John", "Doe", "A0091", self.sales)
+        self.johanna = self.employee("Johanna", "Smith", "B0092")
+        self.joe = self.employee("Zoë", "Johnson", "C0093", role=self.manager)
+        self.admin = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+
+    def employee(self, firstname, lastname, employeeid, department=None, role=None):
+        return Employee.objects.create(
+            user=User.objects.create_user(firstname.lower(), password="password"),
+            firstname=firstname,
+            lastname=lastname,
+            employeeid=employeeid,
+            birthday=datetime.date(1990, 1, 1),
+            department=department,
+            role=role,
+        )
+
+    def test_prefix_search_ranked(self):
+        # exact first name beats prefixes of first and last names
+        self.assertEqual(search("john"), [self.john, self.joe])
+        self.assertEqual(search("jo"), [self.john, self.johanna, self.joe])
+
+    def test_every_term_must_match(self):
+        self.assertEqual(search("jo do"), [self.john])
+        self.assertEqual(search("jo sales"), [self.john])
+        self.assertEqual(search("jo nobody"), [])
+        self.assertEqual(search("  ,, "), [])
+
+    def test_accents_and_employee_id(self):
+        self.assertEqual(search("zoe"), [self.joe])
+        self.assertEqual(search("ZOË"), [self.joe])
+        self.assertEqual(search("RGL/B0/092"), [self.johanna])
+        self.assertEqual(search("rglb0"), [self.johanna])
+
+    def test_department_and_role_renames_reindex(self):
+        self.sales.name = "Marketing"
+        self.sales.save()
+        self.manager.name = "Director"
+        self.manager.save()
+        self.assertEqual(search("sales"), [])
+        self.assertEqual(search("market"), [self.john])
+        self.assertEqual(search("direct"), [self.joe])
+
+    def test_deleted_employee_not_found(self):
+        self.john.is_deleted = True
+        self.john.save()
+        self.assertEqual(search("john"), [self.joe])
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "sqlite query plan")
+    def test_search_uses_token_index(self):
+        plan = search_ranks("jo do").explain()
+        self.assertIn("employee_search_token_idx", plan)
+        self.assertNotIn("SCAN employee_employee", plan)
+
+    def test_typeahead_endpoint(self):
+        self.client.login(username="admin", password="password")
+        response = self.client.get(reverse("dashboard:employeesearch"), {"q": "jo"})
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([result["id"] for result in results][:1], [self.john.id])
+        self.assertEqual(results[0]["department"], "Sales")
+        self.assertEqual(
+            results[0]["url"], reverse("dashboard:employeeinfo", args=[self.john.id])
+        )
+
+        self.client.login(username="john", password="password")
+        response = self.client.get(reverse("dashboard:employeesearch"), {"q": "jo"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_employees_page_search(self):
+        self.client.login(username="admin", password="password")
+        response = self.client.get(reverse("dashboard:employees"), {"search": "smith"})
+        self.assertEqual(list(response.context["employees"]), [self.johanna])
+        self.assertContains(response, "Johanna Smith")
+
+        # best match first, not newest first
+        response = self.client.get(reverse("dashboard:employees"), {"search": "jo"})
+        self.assertEqual(
+            list(response.context["employees"]), [self.john, self.johanna, self.joe]
+        )
+
+
+class EmployeeNameTest(TestCase):
+    def setUp(self):
+        for firstname, lastname in [
+            ("Zoë", "Adams"),
+            ("john", "Doe"),
+            ("Joan", "Bell"),
+        ]:
+            Employee.objects.create(
+                user=User.objects.create_user(firstname, password="password"),
+                firstname=firstname,
+                lastname=lastname,
+                birthday=datetime.date(1990, 1, 1),
+            )
+
+    def test_names_stored_on_save(self):
+        employee = Employee.objects.get(firstname="Zoë")
+        self.assertEqual(employee.fullname, "Zoë Adams")
+        self.assertEqual(employee.sortname, "zoe adams")
+        self.assertEqual(str(employee), "Zoë Adams")
+
+        employee.lastname = "Brown"
+        employee.save()
+        self.assertEqual(
+            Employee.objects.filter(sortname="zoe brown").get().get_full_name,
+            "Zoë Brown",
+        )
+
+    def test_name_startswith(self):
+        self.assertEqual(
+            [e.firstname for e in Employee.objects.name_startswith("JO")],
+            ["Joan", "john"],
+        )
+        self.assertEqual(
+            [e.firstname for e in Employee.objects.name_startswith("zoe a")], ["Zoë"]
+        )
+        self.assertEqual(Employee.objects.name_startswith("").count(), 3)
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "sqlite query plan")
+    def test_name_startswith_uses_index(self):
+        plan = Employee.objects.name_startswith("jo").explain()
+        # sqlite has no pattern ops -> the ordering index serves the range too
+        self.assertIn("USING INDEX employee_name_order_idx (sortname>?", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_users_list_sorted_by_name(self):
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+        response = self.client.get(reverse("accounts:users"), {"starts": "jo"})
+        self.assertEqual(
+            [e.firstname for e in response.context["employees"]], ["Joan", "john"]
+        )
+
+
+class EmployeeThumbnailTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def upload(self, name="photo.png", size=(400, 300)):
+        buffer = io.BytesIO()
+        Image.new("RGB", size, "red").save(buffer, format="PNG")
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+    def create(self, username, image):
+        return Employee.objects.create(
+            user=User.objects.create_user(username, password="password"),
+            firstname=username,
+            lastname="Doe",
+            birthday=datetime.date(1990, 1, 1),
+            image=image,
+        )
+
+    def test_variants_built_on_upload(self):
+        employee = self.create("jane", self.upload())
+        self.assertEqual(employee.thumbnail_source, employee.image.name)
+        for label, edge in SIZES.items():
+            for fmt in ("webp", "jpeg"):
+                path = os.path.join(
+                    self.media_root, variant_name(employee.image.name, label, fmt)
+                )
+                with Image.open(path) as image:
+                    self.assertEqual(image.size, (edge, edge))
+                    self.assertEqual(image.format, fmt.upper())
+        self.assertTrue(employee.thumbnails["small"]["webp"].endswith("_64.webp"))
+        self.assertTrue(employee.thumbnails["medium"]["jpeg"].endswith("_256.jpg"))
+
+    def test_broken_upload_falls_back_to_original(self):
+        employee = self.create("john", SimpleUploadedFile("file.png", b"not an image"))
+        self.assertEqual(employee.thumbnail_source, "")
+        self.assertEqual(employee.thumbnails["small"]["webp"], employee.image.url)
+
+    def test_backfill_command(self):
+        employees = [self.create(name, self.upload()) for name in ("ann", "bob")]
+        Employee.objects.update(thumbnail_source="")
+        shutil.rmtree(os.path.join(self.media_root, "thumbs"))
+
+        call_command("build_thumbnails", processes=2, stdout=io.StringIO())
+        for employee in employees:
+            employee.refresh_from_db()
+            self.assertEqual(employee.thumbnail_source, employee.image.name)
+            path = variant_name(employee.image.name, "medium", "webp")
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, path)))
+
+    def test_profile_image_include(self):
+        employee = self.create("kate", self.upload())
+        html = render_to_string(
+            "includes/profile_image.html", {"employee": employee, "size": "medium"}
+        )
+        self.assertIn('type="image/webp"', html)
+        self.assertIn("_256.webp", html)
+        self.assertIn("_256.jpg", html)
+
+
+class EmployeeOnboardingTest(TestCase):
+    HEADER = "username,firstname,lastname,birthday,department,role,employeeid\n"
+
+    def setUp(self):
+        Department.objects.create(name="Finance")
+        Role.objects.create(name="Accountant")
+        User.objects.create_user("taken", password="password")
+
+    def write(self, content, suffix=".csv"):
+        f = tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False)
+        f.write(content)
+        f.close()
+        self.addCleanup(os.remove, f.name)
+        return f.name
+
+    def test_command_creates_batch(self):
+        rows = "".join(
+            "user{0},First{0},Last,1990-01-0{1},finance,Accountant,a00{0:02d}\n".format(
+                number, number % 9 + 1
+            )
+            for number in range(30)
+        )
+        out = io.StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command(
+                "onboard_employees",
+                self.write(self.HEADER + rows),
+                batch_size=10,
+                stdout=out,
+            )
+        self.assertIn("30 employees created", out.getvalue())
+        # a fixed number of queries per batch, not per row
+        self.assertLess(len(queries), 3 * 15)
+
+        employee = Employee.objects.get(user__username="user7")
+        self.assertEqual(employee.employeeid, "RGL/A0/007")
+        self.assertEqual(employee.department.name, "Finance")
+        self.assertEqual(employee.role.name, "Accountant")
+        self.assertEqual(employee.sortname, "first7 last")
+        self.assertFalse(employee.user.has_usable_password())
+        self.assertEqual(search("first7")[0], employee)
+
+    def test_bad_rows_reported_without_aborting(self):
+        rows = (
+            "ann,Ann,Lee,1990-01-01,,,A0001\n"
+            "taken,Tom,Lee,1990-01-01,,,\n"
+            "bob,Bob,Lee,01/01/1990,,,\n"
+            "cid,Cid,Lee,1990-01-01,Sales,,\n"
+            "dan,Dan,Lee,1990-01-01,,,a0001\n"
+            "ann,Ann,Again,1990-01-01,,,\n"
+            "eve,Eve,Lee,1990-01-01,,,\n"
+        )
+        err = io.StringIO()
+        call_command(
+            "onboard_employees",
+            self.write(self.HEADER + rows),
+            stdout=io.StringIO(),
+            stderr=err,
+        )
+        self.assertEqual(
+            sorted(Employee.objects.values_list("firstname", flat=True)),
+            ["Ann", "Eve"],
+        )
+        for message in (
+            "line 3: username 'taken' is taken",
+            "line 4: birthday must be YYYY-MM-DD",
+            "line 5: unknown department 'Sales'",
+            "line 6: employee id 'RGL/A0/001' is taken",
+            "line 7: username 'ann' is taken",
+        ):
+            self.assertIn(message, err.getvalue())
+
+    def test_dry_run(self):
+        out = io.StringIO()
+        call_command(
+            "onboard_employees",
+            self.write(self.HEADER + "ann,Ann,Lee,1990-01-01,,,\n"),
+            dry_run=True,
+            stdout=out,
+        )
+        self.assertIn("1 employees would be created", out.getvalue())
+        self.assertFalse(User.objects.filter(username="ann").exists())
+
+    def test_endpoint_json(self):
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+        response = self.client.post(
+            reverse("dashboard:employeesonboard"),
+            [
+                {
+                    "username": "ann",
+                    "firstname": "Ann",
+                    "lastname": "Lee",
+                    "birthday": "1990-01-01",
+                    "department": "Finance",
+                },
+                {"username": "bob", "firstname": "Bob", "lastname": "Lee"},
+            ],
+            content_type="application/json",
+        )
+        self.assertEqual(
+            response.json(),
+            {
+                "created": 1,
+                "errors": [{"line": 2, "message": "birthday must be YYYY-MM-DD"}],
+            },
+        )
+
+    def test_endpoint_csv_upload(self):
+        User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.login(username="admin", password="password")
+        upload = SimpleUploadedFile(
+            "staff.csv", (self.HEADER + "ann,Ann,Lee,1990-01-01,,,\n").encode()
+        )
+        response = self.client.post(
+            reverse("dashboard:employeesonboard"), {"file": upload}
+        )
+        self.assertEqual(response.json(), {"created": 1, "errors": []})
+
+        missing = SimpleUploadedFile("staff.csv", b"username\nann\n")
+        response = self.client.post(
+            reverse("dashboard:employeesonboard"), {"file": missing}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_endpoint_requires_admin(self):
+        response = self.client.post(reverse("dashboard:employeesonboard"))
+        self.assertEqual(response.status_code, 403)
+
+
+class EmployeePurgeTest(TestCase):
+    def setUp(self):
+        self.department = Department.objects.create(name="Finance")
+        self.employees = []
+        for name in ("ann", "bob", "cid"):
+            user = User.objects.create_user(name, password="password")
+            employee = Employee.objects.create(
+                user=user,
+                firstname=name.title(),
+                lastname="Lee",
+                birthday=datetime.date(1990, 1, 1),
+                department=self.department,
+            )
+            Leave.objects.create(
+                user=user,
+                startdate=datetime.date(2023, 3, 1),
+                enddate=datetime.date(2023, 3, 2),
+                leavetype="sick",
+                status="approved",
+            )
+            self.employees.append(employee)
+
+    def delete(self, employee, days_ago):
+        employee.is_deleted = True
+        employee.save()
+        Employee.objects.all_employees().filter(pk=employee.pk).update(
+            deleted=timezone.now() - datetime.timedelta(days=days_ago)
+        )
+
+    def test_deleted_timestamp(self):
+        ann = self.employees[0]
+        ann.is_deleted = True
+        ann.save()
+        self.assertIsNotNone(ann.deleted)
+        ann.is_deleted = False
+        ann.save()
+        self.assertIsNone(ann.deleted)
+
+    def test_purge_moves_long_deleted(self):
+        ann, bob, cid = self.employees
+        self.delete(ann, 400)
+        self.delete(bob, 30)
+        out = io.StringIO()
+        call_command("purge_employees", batch_size=1, stdout=out)
+        self.assertIn("Archived 1 employees and 1 leaves", out.getvalue())
+
+        archived = EmployeeArchive.objects.get()
+        self.assertEqual(
+            (archived.id, archived.fullname, archived.department),
+            (ann.id, "Ann Lee", "Finance"),
+        )
+        self.assertFalse(Employee.objects.all_employees().filter(pk=ann.pk).exists())
+        self.assertTrue(Employee.objects.all_employees().filter(pk=bob.pk).exists())
+        self.assertEqual(LeaveArchive.objects.get().user, ann.user)
+        self.assertEqual(
+            sorted(Leave.objects.values_list("user__username", flat=True)),
+            ["bob", "cid"],
+        )
+
+    def test_user_with_other_record_keeps_leaves(self):
+        ann = self.employees[0]
+        Employee.objects.create(
+            user=ann.user,
+            firstname="Ann",
+            lastname="Lee",
+            birthday=datetime.date(1990, 1, 1),
+        )
+        self.delete(ann, 400)
+        call_command("purge_employees", stdout=io.StringIO())
+        self.assertEqual(EmployeeArchive.objects.count(), 1)
+        self.assertEqual(LeaveArchive.objects.count(), 0)
+
+    def test_dry_run(self):
+        self.delete(self.employees[0], 400)
+        out = io.StringIO()
+        call_command("purge_employees", dry_run=True, stdout=out)
+        self.assertIn("1 employees and 1 leaves would be archived", out.getvalue())
+        self.assertEqual(Employee.objects.all_employees().count(), 3)
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "sqlite query plan")
+    def test_manager_filters_use_partial_indexes(self):
+        self.assertIn("employee_active_idx", Employee.objects.all().explain())
+        self.assertIn(
+            "employee_blocked_idx",
+            Employee.objects.all_blocked_employees().order_by("sortname").explain(),
+        )
+        self.assertIn(
+            "employee_deleted_idx",
+            Employee.objects.all_employees()
+            .filter(is_deleted=True, deleted__lt=timezone.now())
+            .explain(),
+        )
+
+
+class EmployeeBirthdayTest(TestCase):
+    def setUp(self):
+        for name, birthday in [
+            ("ann", datetime.date(1990, 12, 30)),
+            ("bob", datetime.date(1985, 1, 2)),
+            ("cid", datetime.date(1992, 1, 20)),
+            ("dan", datetime.date(1988, 12, 10)),
+            ("eve", datetime.date(1996, 2, 29)),
+        ]:
+            Employee.objects.create(
+                user=User.objects.create_user(name, password="password"),
+                firstname=name.title(),
+                lastname="Lee",
+                birthday=birthday,
+            )
+
+    def names(self, employees):
+        return [employee.firstname for employee in employees]
+
+    def test_key_stored_on_save(self):
+        employee = Employee.objects.get(firstname="Ann")
+        self.assertEqual(employee.birthday_key, 1230)
+        employee.birthday = "1990-07-04"
+        employee.save()
+        self.assertEqual(Employee.objects.get(pk=employee.pk).birthday_key, 704)
+
+    def test_upcoming_wraps_into_january(self):
+        upcoming = Employee.objects.upcoming_birthdays(
+            7, today=datetime.date(2023, 12, 28)
+        )
+        self.assertEqual(self.names(upcoming), ["Ann", "Bob"])
+        upcoming = Employee.objects.upcoming_birthdays(
+            70, today=datetime.date(2022, 12, 28)
+        )
+        self.assertEqual(self.names(upcoming), ["Ann", "Bob", "Cid", "Eve"])
+
+    def test_upcoming_without_wrap(self):
+        upcoming = Employee.objects.upcoming_birthdays(
+            30, today=datetime.date(2023, 1, 1)
+        )
+        self.assertEqual(self.names(upcoming), ["Bob", "Cid"])
+        # february 29th birthdays still show in years without one
+        upcoming = Employee.objects.upcoming_birthdays(
+            2, today=datetime.date(2023, 2, 28)
+        )
+        self.assertEqual(self.names(upcoming), ["Eve"])
+
+    def test_birthdays_in_month(self):
+        self.assertEqual(
+            self.names(Employee.objects.birthdays_in_month(12)), ["Dan", "Ann"]
+        )
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "sqlite query plan")
+    def test_upcoming_uses_index(self):
+        for today in (datetime.date(2023, 3, 1), datetime.date(2023, 12, 28)):
+            plan = Employee.objects.upcoming_birthdays(7, today=today).explain()
+            self.assertIn("employee_birthday_idx", plan)
+
+    def test_birthdays_page(self):
+        self.client.login(username="ann", password="password")
+        response = self.client.get(reverse("dashboard:birthdays"), {"days": "366"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["upcoming"]), 5)
+        self.assertContains(response, "Next 366 days")
+
+
+class EmployeeLookupTest(TestCase):
+    def setUp(self):
+        self.finance = Department.objects.create(name="Finance")
+        Department.objects.create(name="Audit")
+        self.manager = Role.objects.create(name="Manager")
+
+    def test_form_choices_cached(self):
+        with self.assertNumQueries(2):
+            str(EmployeeCreateForm()["department"])
+            str(EmployeeCreateForm()["role"])
+        with self.assertNumQueries(0):
+            html = str(EmployeeCreateForm()["department"])
+            str(EmployeeCreateForm()["role"])
+        # Meta.ordering is kept
+        self.assertLess(html.index("Audit"), html.index("Finance"))
+
+    def test_field_validates_from_cache(self):
+        field = EmployeeCreateForm().fields["role"]
+        lookups.roles()
+        with self.assertNumQueries(0):
+            self.assertEqual(field.clean(str(self.manager.pk)), self.manager)
+            with self.assertRaises(ValidationError):
+                field.clean("999")
+
+    def test_save_and_delete_invalidate(self):
+        self.assertEqual([d.name for d in lookups.departments()], ["Audit", "Finance"])
+        self.finance.name = "Accounts"
+        self.finance.save()
+        self.assertEqual([d.name for d in lookups.departments()], ["Accounts", "Audit"])
+        self.finance.delete()
+        self.assertEqual([d.name for d in lookups.departments()], ["Audit"])
+
+    def test_version_bump_from_another_process(self):
+        lookups.departments()
+        # another worker saved a department -> only the shared version moved
+        Department.objects.filter(pk=self.finance.pk).update(name="Accounts")
+        self.assertEqual(lookups.get(Department, self.finance.pk).name, "Finance")
+        lookups.bump()
+        self.assertEqual(lookups.get(Department, self.finance.pk).name, "Accounts")
+
+    def test_version_never_expires_on_file_cache(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location)
+        backend = "django.core.cache.backends.filebased.FileBasedCache"
+        with override_settings(
+            CACHES={"default": {"BACKEND": backend, "LOCATION": location}}
+        ):
+            lookups.get_version()
+            lookups.bump()
+            version = lookups.get_version()
+            # well past the default 300s timeout
+            later = time.time() + 3600
+            with patch("django.core.cache.backends.filebased.time.time") as now:
+                now.return_value = later
+                self.assertEqual(lookups.get_version(), version)
+
+    def test_get(self):
+        self.assertEqual(lookups.get(Role, str(self.manager.pk)), self.manager)
+        self.assertIsNone(lookups.get(Role, ""))
+        self.assertIsNone(lookups.get(Role, None))
+        self.assertIsNone(lookups.get(Role, 999))
+
+
+class EmployeeIdAllocatorTest(TestCase):
+    def create(self, username, employeeid=None):
+        return Employee.objects.create(
+            user=User.objects.create_user(username, password="password"),
+            firstname=username,
+            lastname="Lee",
+            birthday=datetime.date(1990, 1, 1),
+            employeeid=employeeid,
+        )
+
+    def test_allocate_blocks(self):
+        self.assertEqual(allocate(), ["RGL/A0/001"])
+        self.assertEqual(allocate(3), ["RGL/A0/002", "RGL/A0/003", "RGL/A0/004"])
+        self.assertEqual(allocate(prefix="b1"), ["RGL/B1/001"])
+
+    def test_blank_id_allocated_on_create(self):
+        self.assertEqual(self.create("ann").employeeid, "RGL/A0/001")
+        self.assertEqual(self.create("bob").employeeid, "RGL/A0/002")
+
+    def test_typed_ids_move_the_counter(self):
+        self.create("ann")
+        self.assertEqual(self.create("bob", "a0050").employeeid, "RGL/A0/050")
+        self.assertEqual(self.create("cid").employeeid, "RGL/A0/051")
+
+    def test_new_series_starts_after_ids_in_use(self):
+        EmployeeArchive.objects.create(
+            id=99, firstname="Old", lastname="Lee", employeeid="RGL/B2/070"
+        )
+        self.assertEqual(allocate(prefix="B2"), ["RGL/B2/071"])
+
+    def test_duplicate_id_rejected(self):
+        self.create("ann", "A0007")
+        with self.assertRaises(IntegrityError):
+            self.create("bob", "RGL/A0/007")
+
+    def test_edit_keeps_id(self):
+        employee = self.create("ann")
+        employee.firstname = "Anne"
+        employee.save()
+        self.assertEqual(Employee.objects.get(pk=employee.pk).employeeid, "RGL/A0/001")
+
+
+class EmployeeIdFormTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(admin)
+        self.role = Role.objects.create(name="Clerk")
+        self.department = Department.objects.create(name="Sales")
+        self.taken = Employee.objects.create(
+            user=User.objects.create_user("ann", password="password"),
+            firstname="Ann",
+            lastname="Lee",
+            birthday=datetime.date(1990, 1, 1),
+            employeeid="A0007",
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def data(self, username, employeeid):
+        buffer = io.BytesIO()
+        Image.new("RGB", (10, 10), "red").save(buffer, format="PNG")
+        return {
+            "user": User.objects.create_user(username, password="password").pk,
+            "image": SimpleUploadedFile("photo.png", buffer.getvalue()),
+            "firstname": username,
+            "lastname": "Lee",
+            "birthday": "1990-01-01",
+            "department": self.department.pk,
+            "role": self.role.pk,
+            "startdate": "2020-01-01",
+            "employeetype": "Full-Time",
+            "employeeid": employeeid,
+        }
+
+    def test_create_with_taken_id(self):
+        response = self.client.post(
+            reverse("dashboard:employeecreate"), self.data("bob", "a0007")
+        )
+        self.assertRedirects(response, reverse("dashboard:employeecreate"))
+        messages = [str(m) for m in response.wsgi_request._messages]
+        self.assertEqual(messages, ["Employee ID RGL/A0/007 is already in use"])
+        self.assertFalse(Employee.objects.filter(firstname="bob").exists())
+
+    def test_create_with_free_id(self):
+        response = self.client.post(
+            reverse("dashboard:employeecreate"), self.data("bob", "a0008")
+        )
+        self.assertRedirects(
+            response, reverse("dashboard:employees"), fetch_redirect_response=False
+        )
+        self.assertEqual(Employee.objects.get(firstname="bob").employeeid, "RGL/A0/008")
+
+    def test_edit_to_taken_id(self):
+        employee = Employee.objects.create(
+            user=User.objects.create_user("cid", password="password"),
+            firstname="Cid",
+            lastname="Lee",
+            birthday=datetime.date(1990, 1, 1),
+        )
+        url = reverse("dashboard:edit", args=[employee.pk])
+        response = self.client.post(url, self.data("dan", "RGL/A0/007"))
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        employee.refresh_from_db()
+        self.assertEqual(employee.firstname, "Cid")
+        self.assertNotEqual(employee.employeeid, "RGL/A0/007")
+
+    def test_edit_keeps_own_id(self):
+        url = reverse("dashboard:edit", args=[self.taken.pk])
+        response = self.client.post(url, self.data("eve", "RGL/A0/007"))
+        self.assertRedirects(
+            response, reverse("dashboard:employees"), fetch_redirect_response=False
+        )
+        self.taken.refresh_from_db()
+        self.assertEqual(self.taken.employeeid, "RGL/A0/007")
+
+
+class EmployeeIdConcurrencyTest(TransactionTestCase):
+    def test_parallel_workers_never_share_ids(self):
+        allocated, lock = [], threading.Lock()
+
+        def worker(block):
+            try:
+                for _ in range(15):
+                    while True:
+                        try:
+                            ids = allocate(block)
+                            break
+                        except OperationalError:
+                            # the in-memory sqlite test database refuses a locked
+                            # table at once instead of waiting like postgres does,
+                            # a refused allocate rolled back whole -> try again
+                            continue
+                    with lock:
+                        allocated.extend(ids)
+            finally:
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=worker, args=(block,)) for block in (1, 2, 3) * 3
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        total = 15 * (1 + 2 + 3) * 3
+        self.assertEqual(len(allocated), total)
+        self.assertEqual(len(set(allocated)), total)
+        # no gaps either -> every allocation was all or nothing
+        self.assertEqual(
+            sorted(allocated), ["RGL/A0/{0:03d}".format(n) for n in range(1, total + 1)]
+        )
@@ -1,10 +1,36 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
 from datetime import date, timedelta
-from leave.models import SICK, Leave
+from io import StringIO
+from django.core.management import call_command
+from employee.models import Employee
+from leave.models import (
+    CASUAL,
+    DAYS,
+    LEAVE_TYPE,
+    SICK,
+    Leave,
+    LeaveArchive,
+    LeaveBalance,
+    LeaveOverlapError,
+)
 from leave.forms import LeaveCreationForm
+from leave.pagination import keyset_paginate
+from leave.quota import get_quota, get_quotas
+from django.utils import timezone
+from leave.utility import (
+    bulk_working_days,
+    queryset_working_days,
+    total_working_days,
+    working_days,
+)
 import datetime
+import os
+import tempfile
 import unittest
+from unittest.mock import patch
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 
 
 class LeaveModelTest(TestCase):
@@ -22,8 +48,16 @@ class LeaveModelTest(TestCase):
 
     # Test 1: Check if the correct number of leave days is calculated
     def test_leave_days(self):
+        self.leave.startdate = date(2023, 7, 24)  # Monday
+        self.leave.enddate = date(2023, 7, 28)  # back on Friday
         self.assertEqual(self.leave.leave_days, 4)
 
+    # Test 1b: Check that weekends are not counted as leave days
+    def test_leave_days_skip_weekend(self):
+        self.leave.startdate = date(2023, 7, 27)  # Thursday
+        self.leave.enddate = date(2023, 8, 1)  # back on Tuesday
+        self.assertEqual(self.leave.leave_days, 3)
+
     # Test 2: Check if the leave is approved correctly
     def test_approve_leave(self):
         self.leave.approve_leave
@@ -114,3 +148,690 @@ class LeaveCreationFormTest(TestCase):
         form = LeaveCreationForm(data=form_data)
         self.assertFalse(form.is_valid())
         self.assertEqual(form.errors["enddate"], ["Selected dates are wrong"])
+
+
+@unittest.skipUnless(
+    connection.vendor == "sqlite", "query plan text is sqlite specific"
+)
+class LeaveQueryPlanTest(TestCase):
+    """
+    Every LeaveManager query must be answered through an index, never a full scan.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="planuser", password="12345")
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        self.assertNotRegex(plan, r"SCAN leave_leave(?! USING)", plan)
+        self.assertIn("USING INDEX", plan, plan)
+
+    def test_all_pending_leaves_plan(self):
+        self.assertUsesIndex(Leave.objects.all_pending_leaves())
+
+    def test_all_cancel_leaves_plan(self):
+        self.assertUsesIndex(Leave.objects.all_cancel_leaves())
+
+    def test_all_rejected_leaves_plan(self):
+        self.assertUsesIndex(Leave.objects.all_rejected_leaves())
+
+    def test_all_approved_leaves_plan(self):
+        self.assertUsesIndex(Leave.objects.all_approved_leaves())
+
+    def test_current_year_leaves_plan(self):
+        self.assertUsesIndex(Leave.objects.current_year_leaves())
+
+    def test_user_leaves_plan(self):
+        self.assertUsesIndex(Leave.objects.filter(user=self.user))
+        self.assertNotIn(
+            "TEMP B-TREE", Leave.objects.filter(user=self.user).explain()
+        )  # ordering served by the index
+
+
+class WorkingDaysTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="12345")
+
+    def test_working_days_holidays(self):
+        monday, next_monday = date(2023, 12, 25), date(2024, 1, 1)
+        self.assertEqual(working_days(monday, next_monday, holidays=[]), 5)
+        self.assertEqual(working_days(monday, next_monday, holidays=[monday]), 4)
+
+    def test_working_days_weekmask(self):
+        # six day working week
+        self.assertEqual(
+            working_days(date(2023, 7, 24), date(2023, 7, 31), weekmask="1111110"), 6
+        )
+
+    def test_working_days_invalid_dates(self):
+        self.assertEqual(working_days(date(2023, 7, 28), date(2023, 7, 24)), 0)
+        self.assertEqual(working_days(None, date(2023, 7, 24)), 0)
+
+    def test_bulk_working_days(self):
+        counts = bulk_working_days(
+            [date(2023, 7, 24), date(2023, 7, 27), None],
+            [date(2023, 7, 28), date(2023, 8, 1), None],
+        )
+        self.assertEqual(counts.tolist(), [4, 3, 0])
+
+    def test_queryset_working_days(self):
+        first = Leave.objects.create(
+            user=self.user, startdate=date(2023, 7, 24), enddate=date(2023, 7, 31)
+        )
+        second = Leave.objects.create(
+            user=self.user, startdate=date(2023, 7, 27), enddate=date(2023, 8, 1)
+        )
+        with self.assertNumQueries(1):
+            days = queryset_working_days(Leave.objects.all())
+        self.assertEqual(days, {first.id: 5, second.id: 3})
+        self.assertEqual(total_working_days(Leave.objects.all()), 8)
+
+
+class LeaveBalanceTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.leave = Leave.objects.create(
+            user=self.user,
+            startdate=date(2023, 7, 24),
+            enddate=date(2023, 7, 28),
+            leavetype=SICK,
+        )
+
+    def get_balance(self):
+        return LeaveBalance.objects.get(user=self.user, year=2023, leavetype=SICK)
+
+    def test_approve_books_days(self):
+        self.leave.approve_leave
+        self.assertEqual(self.get_balance().used, 4)
+        self.assertEqual(self.get_balance().remaining, DAYS - 4)
+
+    def test_unapprove_gives_days_back(self):
+        self.leave.approve_leave
+        self.leave.unapprove_leave
+        self.assertEqual(self.get_balance().used, 0)
+
+    def test_cancel_and_reject_of_approved_leave(self):
+        self.leave.approve_leave
+        self.leave.leaves_cancel
+        self.assertEqual(self.get_balance().used, 0)
+        self.leave.approve_leave
+        self.leave.reject_leave
+        self.assertEqual(self.get_balance().used, 0)
+
+    def test_reject_pending_leave_books_nothing(self):
+        self.leave.reject_leave
+        self.assertFalse(LeaveBalance.objects.exists())
+
+    def test_remaining_lookup(self):
+        self.assertEqual(LeaveBalance.objects.remaining(self.user, 2023, SICK), DAYS)
+        self.leave.approve_leave
+        with self.assertNumQueries(1):
+            remaining = LeaveBalance.objects.remaining(self.user, 2023, SICK)
+        self.assertEqual(remaining, DAYS - 4)
+
+    def test_form_rejects_request_over_balance(self):
+        LeaveBalance.objects.create(
+            user=self.user, year=date.today().year + 1, leavetype=SICK, used=DAYS - 1
+        )
+        monday = date(date.today().year + 1, 1, 1)
+        monday += timedelta(days=-monday.weekday() % 7)
+        form_data = {
+            "startdate": monday,
+            "enddate": monday + timedelta(days=4),
+            "leavetype": SICK,
+        }
+        form = LeaveCreationForm(data=form_data, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn("1 day(s) remaining", str(form.errors))
+
+    def test_form_counts_pending_days(self):
+        year = date.today().year + 1
+        LeaveBalance.objects.create(
+            user=self.user, year=year, leavetype=SICK, used=DAYS - 6
+        )
+        monday = date(year, 1, 1)
+        monday += timedelta(days=-monday.weekday() % 7)
+        # 4 working days pending, not booked in the ledger yet
+        Leave.objects.create(
+            user=self.user,
+            startdate=monday,
+            enddate=monday + timedelta(days=4),
+            leavetype=SICK,
+        )
+        self.assertEqual(get_quota(self.user, year).days_left(SICK), 2)
+        form_data = {
+            "startdate": monday + timedelta(weeks=1),
+            "enddate": monday + timedelta(weeks=1, days=3),
+            "leavetype": SICK,
+        }
+        form = LeaveCreationForm(data=form_data, user=self.user)
+        self.assertFalse(form.is_valid())
+        self.assertIn("2 day(s) remaining", str(form.errors))
+
+    def test_reconcile_balances_command(self):
+        self.leave.approve_leave
+        LeaveBalance.objects.all().update(used=99)
+        Leave.objects.create(
+            user=self.user,
+            startdate=date(2023, 8, 1),
+            enddate=date(2023, 8, 3),
+            leavetype=SICK,
+            status="approved",
+            is_approved=True,
+        )
+        call_command("reconcile_balances", stdout=StringIO())
+        self.assertEqual(self.get_balance().used, 6)
+
+    def test_reconcile_balances_keeps_archived_years(self):
+        self.leave.approve_leave
+        call_command("archive_leaves", before=2024, stdout=StringIO())
+        self.assertFalse(Leave.objects.exists())
+        call_command("reconcile_balances", stdout=StringIO())
+        self.assertEqual(self.get_balance().used, 4)
+
+
+class LeaveTransitionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.leave = Leave.objects.create(
+            user=self.user,
+            startdate=date(2023, 7, 24),
+            enddate=date(2023, 7, 28),
+            leavetype=SICK,
+        )
+
+    def test_transition_is_conditional_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(
+                Leave.objects.transition(self.leave.pk, "pending", "rejected")
+            )
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]["sql"]
+        self.assertTrue(sql.startswith("UPDATE"))
+        self.assertNotIn("reason", sql)  # only status, is_approved and updated
+        self.assertFalse(Leave.objects.transition(self.leave.pk, "pending", "approved"))
+
+    def test_stale_instance_loses(self):
+        other = Leave.objects.get(pk=self.leave.pk)
+        self.assertTrue(self.leave.approve_leave)
+        self.assertFalse(other.reject_leave)  # other admin still sees pending
+        other.refresh_from_db()
+        self.assertEqual(other.status, "approved")
+        balance = LeaveBalance.objects.get(user=self.user, year=2023, leavetype=SICK)
+        self.assertEqual(balance.used, 4)  # booked once
+
+    def test_bulk_transition_skips_rows_moved_after_read(self):
+        other = Leave.objects.create(
+            user=self.user,
+            startdate=date(2023, 8, 7),
+            enddate=date(2023, 8, 9),
+            leavetype=SICK,
+        )
+        manager = type(Leave.objects)
+        without_overlaps = manager.without_overlaps
+
+        def approved_meanwhile(self_, rows, to_status):
+            # another admin approves the leave after the bulk action read it
+            Leave.objects.get(pk=self.leave.pk).approve_leave
+            return without_overlaps(self_, rows, to_status)
+
+        with patch.object(manager, "without_overlaps", approved_meanwhile):
+            results = Leave.objects.bulk_transition(
+                [self.leave.pk, other.pk], "rejected"
+            )
+        self.assertEqual(results, {self.leave.pk: "skipped", other.pk: "updated"})
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, "approved")
+        balance = LeaveBalance.objects.get(user=self.user, year=2023, leavetype=SICK)
+        self.assertEqual(balance.used, 4)
+
+    def test_uncancel_and_unreject(self):
+        self.leave.leaves_cancel
+        self.assertTrue(self.leave.uncancel_leave)
+        self.assertEqual(self.leave.status, "pending")
+        self.leave.reject_leave
+        self.assertTrue(self.leave.unreject_leave)
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, "pending")
+        with self.assertRaises(ValueError):
+            self.leave.unreject_leave
+
+
+class LeaveOverlapTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.monday = date.today() + timedelta(days=7 - date.today().weekday())
+        self.leave = Leave.objects.create(
+            user=self.user,
+            startdate=self.monday,
+            enddate=self.monday + timedelta(days=4),
+        )
+
+    def get_form(self, start, end, user=None):
+        form_data = {
+            "startdate": self.monday + timedelta(days=start),
+            "enddate": self.monday + timedelta(days=end),
+            "leavetype": SICK,
+        }
+        return LeaveCreationForm(data=form_data, user=user or self.user)
+
+    def test_overlapping_request_rejected(self):
+        form = self.get_form(2, 8)
+        self.assertFalse(form.is_valid())
+        self.assertIn("already have a leave booked", str(form.errors))
+
+    def test_back_to_back_request_allowed(self):
+        # enddate is the day back at work, so a leave may start on it
+        self.assertTrue(self.get_form(4, 6).is_valid())
+
+    def test_cancelled_leave_frees_dates(self):
+        self.leave.leaves_cancel
+        self.assertTrue(self.get_form(2, 8).is_valid())
+
+    def test_other_user_not_affected(self):
+        other = User.objects.create_user(username="other", password="12345")
+        self.assertTrue(self.get_form(2, 8, user=other).is_valid())
+
+    def book_over_cancelled(self):
+        self.leave.leaves_cancel
+        return Leave.objects.create(
+            user=self.user,
+            startdate=self.monday + timedelta(days=2),
+            enddate=self.monday + timedelta(days=8),
+        )
+
+    def test_uncancel_into_booked_dates_refused(self):
+        self.book_over_cancelled()
+        with self.assertRaises(LeaveOverlapError):
+            self.leave.uncancel_leave
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, "cancelled")
+
+    def test_bulk_uncancel_into_booked_dates_skipped(self):
+        other = self.book_over_cancelled()
+        freed = Leave.objects.create(
+            user=self.user,
+            startdate=self.monday + timedelta(days=14),
+            enddate=self.monday + timedelta(days=16),
+            status="cancelled",
+        )
+        twin = Leave.objects.create(
+            user=self.user,
+            startdate=self.monday + timedelta(days=15),
+            enddate=self.monday + timedelta(days=17),
+            status="cancelled",
+        )
+        results = Leave.objects.bulk_transition(
+            [self.leave.pk, freed.pk, twin.pk, other.pk], "approved"
+        )
+        self.assertEqual(
+            results,
+            {
+                self.leave.pk: "skipped",
+                freed.pk: "updated",
+                twin.pk: "skipped",
+                other.pk: "updated",
+            },
+        )
+
+    def test_concurrent_booking_reported_as_overlap(self):
+        self.leave.leaves_cancel
+        # postgres: another request booked the dates after the probe
+        error = IntegrityError("leave_no_overlap_excl")
+        with patch.object(type(Leave.objects), "transition", side_effect=error):
+            with self.assertRaises(LeaveOverlapError):
+                self.leave.uncancel_leave
+        self.assertEqual(self.leave.status, "cancelled")
+
+    def test_resolve_overlaps_command(self):
+        self.leave.approve_leave
+        # booked before overlaps were blocked -> written without the form check
+        later = Leave.objects.bulk_create(
+            [
+                Leave(
+                    user=self.user,
+                    startdate=self.monday + timedelta(days=2),
+                    enddate=self.monday + timedelta(days=8),
+                    leavetype=SICK,
+                ),
+                Leave(
+                    user=self.user,
+                    startdate=self.monday + timedelta(days=20),
+                    enddate=self.monday + timedelta(days=14),
+                    leavetype=SICK,
+                ),
+            ]
+        )
+        ids = [leave.pk for leave in later]
+        self.assertEqual(Leave.objects.conflicting(), ids)
+
+        out = StringIO()
+        call_command("resolve_leave_overlaps", dry_run=True, stdout=out)
+        self.assertIn("2 leaves would be cancelled", out.getvalue())
+        self.assertEqual(Leave.objects.filter(status="cancelled").count(), 0)
+
+        out = StringIO()
+        call_command("resolve_leave_overlaps", stdout=out)
+        self.assertIn("Cancelled 2 overlapping leaves", out.getvalue())
+        self.assertEqual(
+            set(Leave.objects.filter(status="cancelled").values_list("id", flat=True)),
+            set(ids),
+        )
+        self.assertEqual(Leave.objects.conflicting(), [])
+        self.leave.refresh_from_db()
+        self.assertEqual(self.leave.status, "approved")
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "sqlite query plan")
+    def test_overlap_probe_uses_index(self):
+        plan = Leave.objects.overlapping(
+            self.user, self.monday, self.monday + timedelta(days=3)
+        ).explain()
+        self.assertIn("leave_user_dates_idx", plan)
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        Leave.objects.bulk_create(
+            [Leave(user=self.user, status="approved") for _ in range(7)]
+        )
+        # same created timestamp for every row -> id must break the ties
+        Leave.objects.update(created=timezone.now())
+        self.ids = list(
+            Leave.objects.order_by("-created", "-id").values_list("id", flat=True)
+        )
+
+    def test_walk_forward_and_back(self):
+        first = keyset_paginate(Leave.objects.all_approved_leaves(), per_page=3)
+        self.assertEqual([leave.id for leave in first], self.ids[:3])
+        self.assertFalse(first.has_previous)
+
+        second = keyset_paginate(
+            Leave.objects.all_approved_leaves(), first.next_token, per_page=3
+        )
+        third = keyset_paginate(
+            Leave.objects.all_approved_leaves(), second.next_token, per_page=3
+        )
+        self.assertEqual([leave.id for leave in second], self.ids[3:6])
+        self.assertEqual([leave.id for leave in third], self.ids[6:])
+        self.assertFalse(third.has_next)
+
+        back = keyset_paginate(
+            Leave.objects.all_approved_leaves(), third.previous_token, per_page=3
+        )
+        self.assertEqual([leave.id for leave in back], self.ids[3:6])
+        back = keyset_paginate(
+            Leave.objects.all_approved_leaves(), back.previous_token, per_page=3
+        )
+        self.assertEqual([leave.id for leave in back], self.ids[:3])
+        self.assertFalse(back.has_previous)
+
+    def test_page_is_one_query_without_count(self):
+        first = keyset_paginate(Leave.objects.filter(user=self.user), per_page=3)
+        with CaptureQueriesContext(connection) as queries:
+            keyset_paginate(
+                Leave.objects.filter(user=self.user), first.next_token, per_page=3
+            )
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("COUNT", queries[0]["sql"])
+
+    def test_tampered_token_starts_over(self):
+        page = keyset_paginate(
+            Leave.objects.all_approved_leaves(), "not-a-token", per_page=3
+        )
+        self.assertEqual([leave.id for leave in page], self.ids[:3])
+
+
+class LeaveArchiveTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        this_year = date.today().year
+        for year in (this_year - 3, this_year - 2, this_year - 1, this_year):
+            Leave.objects.create(
+                user=self.user,
+                startdate=date(year, 3, 6),
+                enddate=date(year, 3, 10),
+                status="approved",
+            )
+        self.this_year = this_year
+
+    def test_archive_closed_years(self):
+        call_command("archive_leaves", batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            sorted(Leave.objects.values_list("startdate__year", flat=True)),
+            [self.this_year - 1, self.this_year],
+        )
+        self.assertEqual(LeaveArchive.objects.count(), 2)
+        self.assertEqual(Leave.objects.current_year_leaves().count(), 1)
+
+    def test_dry_run_moves_nothing(self):
+        out = StringIO()
+        call_command("archive_leaves", dry_run=True, stdout=out)
+        self.assertIn("2 leaves would be archived", out.getvalue())
+        self.assertEqual(Leave.objects.count(), 4)
+
+    def test_history_reads_both_tables(self):
+        call_command("archive_leaves", before=self.this_year, stdout=StringIO())
+        self.assertEqual(Leave.objects.count(), 1)
+        rows = Leave.objects.history("id", "startdate", user=self.user)
+        self.assertEqual(len(rows), 4)
+        archived = LeaveArchive.objects.get(startdate__year=self.this_year - 3)
+        self.assertEqual(archived.status, "approved")
+
+
+class LeaveQuotaTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        self.year = date.today().year + 1
+        self.monday = date(self.year, 1, 1) + timedelta(
+            days=7 - date(self.year, 1, 1).weekday()
+        )
+
+    def book(self, user, requests, status="pending"):
+        for week in range(requests):
+            start = self.monday + timedelta(weeks=week)
+            Leave.objects.create(
+                user=user,
+                startdate=start,
+                enddate=start + timedelta(days=1),
+                leavetype=SICK,
+                status=status,
+            )
+
+    def test_quota_counts_active_requests(self):
+        self.book(self.user, 3)
+        self.book(self.user, 2, status="cancelled")
+        quota = get_quota(self.user, self.year)
+        self.assertEqual(quota.total_requests, 3)
+        self.assertEqual(quota.remaining_requests, 4)
+        self.assertEqual(quota.requests, {SICK: 3})
+        self.assertTrue(quota.can_apply())
+
+    def test_quota_reached(self):
+        self.book(self.user, 7)
+        self.assertFalse(get_quota(self.user, self.year).can_apply())
+        self.assertFalse(Leave.objects.first().can_apply_leave)
+
+        start = self.monday + timedelta(weeks=10)
+        form = LeaveCreationForm(
+            data={
+                "startdate": start,
+                "enddate": start + timedelta(days=1),
+                "leavetype": SICK,
+            },
+            user=self.user,
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("limit of 7 leave requests", str(form.errors))
+
+    def test_many_users_one_query(self):
+        users = [self.user] + [
+            User.objects.create_user(username="user%d" % i, password="12345")
+            for i in range(5)
+        ]
+        for count, user in enumerate(users):
+            self.book(user, count)
+        with self.assertNumQueries(1):
+            quotas = get_quotas(users, [self.year, self.year - 1])
+        self.assertEqual(len(quotas), 12)
+        for count, user in enumerate(users):
+            self.assertEqual(quotas[(user.pk, self.year)].total_requests, count)
+            self.assertEqual(quotas[(user.pk, self.year - 1)].total_requests, 0)
+
+
+class LeaveImportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="testuser", password="12345")
+        User.objects.create_user(username="other", password="12345")
+        self.csv_file = tempfile.NamedTemporaryFile(
+            "w", suffix=".csv", delete=False, newline=""
+        )
+        self.csv_file.write(
+            "username,leavetype,startdate,enddate,status,reason\n"
+            "testuser,sick,2023-01-02,2023-01-06,approved,flu\n"
+            "testuser,Casual Leave,2023-02-06,2023-02-08,,\n"
+            "other,study,2023-03-06,2023-03-10,rejected,\n"
+            "ghost,sick,2023-01-02,2023-01-06,,\n"
+            "other,holiday,2023-01-02,2023-01-06,,\n"
+            "other,sick,2023-01-06,2023-01-02,,\n"
+            "other,sick,02/01/2023,2023-01-06,,\n"
+        )
+        self.csv_file.close()
+        self.addCleanup(os.remove, self.csv_file.name)
+
+    def run_import(self, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_leaves", self.csv_file.name, stdout=out, stderr=err, **options
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_import(self):
+        out, err = self.run_import(batch_size=2)
+        self.assertIn("3 leaves imported, 4 rows skipped", out)
+        self.assertIn("rows/sec", out)
+        for message in (
+            "line 5: unknown user 'ghost'",
+            "line 6: unknown leave type 'holiday'",
+            "line 7: end date is before start date",
+            "line 8: dates must be YYYY-MM-DD",
+        ):
+            self.assertIn(message, err)
+
+        casual = Leave.objects.get(leavetype="casual")
+        self.assertEqual((casual.user, casual.status), (self.user, "pending"))
+        self.assertTrue(Leave.objects.get(reason="flu").is_approved)
+        self.assertEqual(LeaveBalance.objects.get(user=self.user, year=2023).used, 4)
+
+    def test_overlaps_skipped_and_created_kept(self):
+        Leave.objects.create(
+            user=self.user,
+            startdate=date(2023, 1, 4),
+            enddate=date(2023, 1, 5),
+            leavetype=SICK,
+        )
+        with open(self.csv_file.name, "w", newline="") as f:
+            f.write(
+                "username,leavetype,startdate,enddate,status,created\n"
+                "testuser,sick,2023-01-02,2023-01-06,approved,2022-12-20\n"
+                "other,sick,2023-01-02,2023-01-06,pending,2022-12-21T08:15:00\n"
+                "other,casual,2023-01-05,2023-01-09,pending,\n"
+                "other,casual,2023-01-05,2023-01-09,rejected,\n"
+                "other,sick,2023-01-09,2023-01-10,pending,yesterday\n"
+            )
+        out, err = self.run_import()
+        self.assertIn("2 leaves imported, 3 rows skipped", out)
+        self.assertIn("line 2: overlaps another leave of the user", err)
+        self.assertIn("line 4: overlaps another leave of the user", err)
+        self.assertIn("line 6: created must be", err)
+        imported = Leave.objects.get(user__username="other", status="pending")
+        self.assertEqual(
+            imported.created,
+            datetime.datetime(2022, 12, 21, 8, 15, tzinfo=datetime.timezone.utc),
+        )
+        rejected = Leave.objects.get(status="rejected")
+        self.assertEqual(rejected.created.date(), date.today())
+
+    def test_dry_run_writes_nothing(self):
+        out, err = self.run_import(dry_run=True)
+        self.assertIn("3 leaves would be imported", out)
+        self.assertFalse(Leave.objects.exists())
+        self.assertFalse(LeaveBalance.objects.exists())
+
+
+class LeaveRolloverTest(TestCase):
+    def setUp(self):
+        self.full = self.employee("full", Employee.FULL_TIME, date(2015, 6, 1))
+        self.part = self.employee("part", Employee.PART_TIME, None)
+        # joins in April of the new year -> 9 of 12 months
+        self.new = self.employee("new", Employee.FULL_TIME, date(2024, 4, 15))
+        self.later = self.employee("later", Employee.FULL_TIME, date(2025, 1, 1))
+
+        LeaveBalance.objects.create(
+            user=self.full.user, year=2023, leavetype=CASUAL, used=20
+        )
+        LeaveBalance.objects.create(
+            user=self.part.user, year=2023, leavetype=CASUAL, entitled=15, used=13
+        )
+        # approved leave of the new year is already booked -> used is kept
+        LeaveBalance.objects.create(
+            user=self.full.user, year=2024, leavetype=SICK, used=3
+        )
+
+    def employee(self, username, employeetype, startdate):
+        return Employee.objects.create(
+            user=User.objects.create_user(username=username, password="12345"),
+            firstname=username,
+            lastname="Doe",
+            birthday=date(1990, 1, 1),
+            employeetype=employeetype,
+            startdate=startdate,
+        )
+
+    def balance(self, employee, leavetype):
+        return LeaveBalance.objects.get(
+            user=employee.user, year=2024, leavetype=leavetype
+        )
+
+    def test_rollover(self):
+        out = StringIO()
+        call_command("rollover_leave", year=2023, stdout=out)
+        self.assertIn("Closed 2023: 20 balances for 2024 written", out.getvalue())
+
+        casual = self.balance(self.full, CASUAL)
+        # 10 days unused, capped at 5
+        self.assertEqual((casual.entitled, casual.carried), (DAYS, 5))
+        self.assertEqual(casual.remaining, DAYS + 5)
+        self.assertEqual(self.balance(self.full, SICK).carried, 0)
+        self.assertEqual(self.balance(self.full, SICK).used, 3)
+
+        part = self.balance(self.part, CASUAL)
+        self.assertEqual((part.entitled, part.carried), (DAYS // 2, 2))
+        # 30 * 9 / 12 = 22.5 -> half days round up
+        self.assertEqual(self.balance(self.new, CASUAL).entitled, 23)
+        self.assertEqual(self.balance(self.later, SICK).entitled, 0)
+        self.assertEqual(
+            LeaveBalance.objects.remaining(self.full.user, 2024, CASUAL), DAYS + 5
+        )
+
+    def test_rollover_without_leave_carries_cap(self):
+        # no ledger row for 2023 -> nothing used, the full cap is carried
+        idle = self.employee("idle", Employee.FULL_TIME, date(2010, 1, 1))
+        call_command("rollover_leave", year=2023, stdout=StringIO())
+        self.assertEqual(self.balance(idle, CASUAL).carried, 5)
+        self.assertEqual(self.balance(idle, SICK).carried, 0)
+        # joined after 2023 -> had nothing to carry
+        self.assertEqual(self.balance(self.new, CASUAL).carried, 0)
+
+    def test_rollover_is_repeatable(self):
+        call_command("rollover_leave", year=2023, stdout=StringIO())
+        # savepoint, one INSERT .. SELECT per leave type, release
+        with self.assertNumQueries(2 + len(LEAVE_TYPE)):
+            call_command("rollover_leave", year=2023, stdout=StringIO())
+        self.assertEqual(LeaveBalance.objects.filter(year=2024).count(), 20)
+
+    def test_dry_run_writes_nothing(self):
+        out = StringIO()
+        call_command("rollover_leave", year=2023, dry_run=True, stdout=out)
+        self.assertIn("20 balances for 2024 would be written", out.getvalue())
+        self.assertEqual(LeaveBalance.objects.filter(year=2024).count(), 1)
@@ -0,0 +1,221 @@
+import datetime
+import socketserver
+import threading
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from leave.models import Leave, LeaveNotification
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    # just enough SMTP for smtplib -> EHLO, MAIL, RCPT, DATA, RSET, QUIT
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 localhost ready")
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == "QUIT":
+                self.reply("221 bye")
+                return
+            if command == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 OK")
+            elif command == "RCPT":
+                if any(address in line for address in server.refused):
+                    self.reply("550 no such user")
+                else:
+                    self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 end with .")
+                data = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if data_line in (b".\r\n", b""):
+                        break
+                    data.append(data_line)
+                server.messages.append(b"".join(data).decode())
+                self.reply("250 queued")
+            else:
+                self.reply("250 OK")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, refused=()):
+        super().__init__(("127.0.0.1", 0), SMTPHandler)
+        self.connections = 0
+        self.messages = []
+        self.refused = refused
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class LeaveNotificationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("john", "john@example.com", "johnpassword")
+        self.monday = datetime.date(2031, 3, 3)
+
+    def create_leaves(self, count, user=None):
+        return [
+            Leave.objects.create(
+                user=user or self.user,
+                startdate=self.monday + datetime.timedelta(weeks=week),
+                enddate=self.monday + datetime.timedelta(weeks=week, days=2),
+            )
+            for week in range(count)
+        ]
+
+    def send(self, server, **options):
+        out, err = StringIO(), StringIO()
+        with override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=server.port,
+            EMAIL_USE_TLS=False,
+        ):
+            call_command("send_notifications", stdout=out, stderr=err, **options)
+        return out.getvalue()
+
+    def test_transition_queues_without_sending(self):
+        leave = self.create_leaves(1)[0]
+        self.assertTrue(leave.approve_leave)
+        notification = LeaveNotification.objects.get()
+        self.assertEqual(notification.leave, leave)
+        self.assertEqual(notification.recipient, "john@example.com")
+        self.assertIn("approved", notification.subject)
+        self.assertEqual(notification.status, LeaveNotification.QUEUED)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_bulk_transition_queues_each_leave(self):
+        nomail = User.objects.create_user("nomail", "", "johnpassword")
+        leaves = self.create_leaves(3) + self.create_leaves(1, user=nomail)
+        Leave.objects.bulk_transition([leave.pk for leave in leaves], "rejected")
+        self.assertEqual(
+            sorted(LeaveNotification.objects.values_list("leave_id", flat=True)),
+            [leave.pk for leave in leaves[:3]],
+        )
+
+    def test_lost_transition_queues_nothing(self):
+        leave = self.create_leaves(1)[0]
+        stale = Leave.objects.get(pk=leave.pk)
+        self.assertTrue(leave.approve_leave)
+        self.assertFalse(stale.set_status("rejected"))
+        self.assertEqual(LeaveNotification.objects.count(), 1)
+
+    def test_worker_drains_over_one_connection(self):
+        for leave in self.create_leaves(5):
+            leave.approve_leave
+        server = SMTPStandIn()
+        try:
+            out = self.send(server, batch_size=2)
+        finally:
+            server.stop()
+        self.assertIn("Sent 5 notifications", out)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(len(server.messages), 5)
+        self.assertFalse(
+            LeaveNotification.objects.exclude(status=LeaveNotification.SENT).exists()
+        )
+
+    def test_refused_recipient_backs_off(self):
+        bounce = User.objects.create_user("bounce", "bounce@example.com", "x")
+        self.create_leaves(1)[0].approve_leave
+        self.create_leaves(1, user=bounce)[0].approve_leave
+        server = SMTPStandIn(refused=["bounce@example.com"])
+        try:
+            self.send(server, backoff=60)
+            retry = LeaveNotification.objects.get(recipient="bounce@example.com")
+            self.assertEqual(retry.status, LeaveNotification.QUEUED)
+            self.assertEqual(retry.attempts, 1)
+            self.assertGreater(
+                retry.next_attempt, timezone.now() + datetime.timedelta(seconds=50)
+            )
+            self.assertEqual(len(server.messages), 1)
+
+            # not due yet -> nothing is sent again
+            self.assertIn("Sent 0 notifications", self.send(server))
+
+            LeaveNotification.objects.filter(pk=retry.pk).update(
+                next_attempt=timezone.now()
+            )
+            self.send(server, max_attempts=2)
+        finally:
+            server.stop()
+        retry.refresh_from_db()
+        self.assertEqual(retry.status, LeaveNotification.FAILED)
+        self.assertEqual(retry.attempts, 2)
+
+    def test_server_down_retries_later(self):
+        self.create_leaves(1)[0].approve_leave
+        server = SMTPStandIn()
+        server.stop()
+        out = self.send(server)
+        self.assertIn("Sent 0 notifications, 1 to retry", out)
+        notification = LeaveNotification.objects.get()
+        self.assertEqual(notification.status, LeaveNotification.QUEUED)
+        self.assertEqual(notification.attempts, 1)
+
+    def test_claimed_rows_marked_sending(self):
+        for leave in self.create_leaves(2):
+            leave.approve_leave
+        seen = []
+
+        def send(message):
+            seen.append(set(LeaveNotification.objects.values_list("status", flat=True)))
+            return 1
+
+        server = SMTPStandIn()
+        try:
+            with patch.object(EmailMessage, "send", autospec=True, side_effect=send):
+                out = self.send(server)
+        finally:
+            server.stop()
+        self.assertIn("Sent 2 notifications", out)
+        self.assertEqual(seen, [{LeaveNotification.SENDING}] * 2)
+        self.assertFalse(
+            LeaveNotification.objects.exclude(status=LeaveNotification.SENT).exists()
+        )
+
+    def test_stale_claim_sent_again(self):
+        self.create_leaves(1)[0].approve_leave
+        notification = LeaveNotification.objects.get()
+        server = SMTPStandIn()
+        try:
+            # claimed by a worker that is still within its claim -> left alone
+            LeaveNotification.objects.update(
+                status=LeaveNotification.SENDING,
+                next_attempt=timezone.now() + datetime.timedelta(minutes=10),
+            )
+            self.assertIn("Sent 0 notifications", self.send(server))
+
+            # the worker died -> due again once the claim ran out
+            LeaveNotification.objects.update(
+                next_attempt=timezone.now() - datetime.timedelta(seconds=1)
+            )
+            self.assertIn("Sent 1 notifications", self.send(server))
+        finally:
+            server.stop()
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, LeaveNotification.SENT)
+        self.assertEqual(len(server.messages), 1)